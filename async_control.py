@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from lulu_pcol_sim import sim
+from step_metrics import MetricsRecorder
+
+class AsyncControlLoop():
+
+    """Fixed rate control loop based on asyncio.
+    While the P system step k is computed, the sensor state for step k+1 is already being read from the bridge, and the
+    outputs of step k are sent without waiting for the bridge. All bridge calls are executed (in order) on a single I/O
+    thread, because the bridge connection is not meant to be used concurrently. As a consequence, the sensor readings used
+    by step k+1 are taken before the outputs of step k are applied (one tick of sensor latency).
+
+    A tick that ends after its deadline is counted as a deadline miss and the next tick starts immediately (missed ticks
+    are not executed later).
+
+    The bridge calls executed on the I/O thread are timed in a MetricsRecorder that is added to the StepMetrics of the
+    controller by the loop, when the call is awaited: the sensor reads are attributed to the step that uses them and the
+    output writes of step k to step k+1 (the step during which they complete)."""
+
+    def __init__(self, controller, tickRate, maxSteps = 0):
+        """
+        :controller: the SwarmController that executes the control steps
+        :tickRate: the number of control steps per second
+        :maxSteps: stop after this number of steps (0 = run until the P system stops)"""
+        self.controller = controller
+        self.period = 1.0 / tickRate
+        self.maxSteps = maxSteps
+        self.nrTicks = 0 # nr of executed ticks
+        self.nrDeadlineMisses = 0 # nr of ticks that ended after their deadline
+        self.maxLateness = 0.0 # the largest amount of time (s) by which a deadline was missed
+        self.computeTime = 0.0 # total time (s) spent computing control steps
+        self.startTime = None
+        self.endTime = None
+    # end __init__()
+
+    def timedCall(self, function, *args):
+        """Execute a SwarmIO call on the I/O thread, with its bridge calls timed in a new MetricsRecorder
+
+        :returns: (result of the call, MetricsRecorder or None if the controller has no metrics)"""
+        if (self.controller.metrics is None):
+            return function(*args), None
+        recorder = MetricsRecorder()
+        return function(*args, metrics = recorder), recorder
+    # end timedCall()
+
+    def replay(self, recorder):
+        """Add the durations timed on the I/O thread to the metrics of the controller (on the loop thread)"""
+        if (recorder is not None):
+            recorder.replay(self.controller.metrics)
+    # end replay()
+
+    async def run(self):
+        """Run the control loop until the P system stops or maxSteps steps have been executed"""
+        loop = asyncio.get_running_loop()
+        swarmIO = self.controller.swarmIO
+        executor = ThreadPoolExecutor(max_workers = 1)
+
+        self.startTime = loop.time()
+        deadline = self.startTime + self.period
+        pendingInputs = loop.run_in_executor(executor, self.timedCall, swarmIO.fetchInputs)
+        pendingOutputs = None
+        try:
+            while (self.maxSteps == 0 or self.controller.simStepNr < self.maxSteps):
+                states, recorder = await pendingInputs
+                pendingInputs = None
+                self.replay(recorder)
+                swarmIO.applyInputs(states)
+                # prefetch the sensor state of the next step while the current step is computed (unless this is the last step)
+                if (self.maxSteps == 0 or self.controller.simStepNr + 1 < self.maxSteps):
+                    pendingInputs = loop.run_in_executor(executor, self.timedCall, swarmIO.fetchInputs)
+
+                computeStart = loop.time()
+                sim_result = self.controller.computeStep()
+                self.computeTime += loop.time() - computeStart
+                # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+                if (sim_result != sim.SimStepResult.finished):
+                    logging.warning("Exiting loop")
+                    break
+
+                # flush the outputs without waiting for the bridge
+                if (pendingOutputs is not None):
+                    self.replay((await pendingOutputs)[1])
+                pendingOutputs = loop.run_in_executor(executor, self.timedCall, swarmIO.sendOutputs, swarmIO.collectOutputs())
+                self.nrTicks += 1
+                if (self.controller.metrics is not None):
+                    self.controller.metrics.endStep()
+
+                now = loop.time()
+                if (now > deadline):
+                    self.nrDeadlineMisses += 1
+                    self.maxLateness = max(self.maxLateness, now - deadline)
+                    logging.debug("Tick %d missed its deadline by %.1f ms" % (self.nrTicks, (now - deadline) * 1000))
+                    deadline = now + self.period
+                else:
+                    await asyncio.sleep(deadline - now)
+                    deadline += self.period
+        finally:
+            if (pendingOutputs is not None):
+                self.replay((await pendingOutputs)[1])
+                # the output writes of the last step complete after its end
+                if (self.controller.metrics is not None):
+                    self.controller.metrics.endStep()
+            if (pendingInputs is not None):
+                await pendingInputs
+            executor.shutdown()
+            self.endTime = loop.time()
+    # end run()
+
+    def printStats(self):
+        """Print the timing statistics of the loop"""
+        duration = self.endTime - self.startTime
+        print("\nAsyncControlLoop statistics:")
+        print("ticks = %d, target period = %.1f ms, mean period = %.1f ms" % (self.nrTicks, self.period * 1000,
+            duration / self.nrTicks * 1000 if self.nrTicks else 0))
+        print("mean compute time = %.1f ms" % (self.computeTime / self.nrTicks * 1000 if self.nrTicks else 0))
+        print("deadline misses = %d (%.1f%%), max lateness = %.1f ms" % (self.nrDeadlineMisses,
+            100.0 * self.nrDeadlineMisses / self.nrTicks if self.nrTicks else 0, self.maxLateness * 1000))
+    # end printStats()
+# end class AsyncControlLoop
@@ -0,0 +1,51 @@
+"""Compare the startup time and resident memory of the two Pcolony cloning methods (deepcopy vs cloneColony)
+
+usage: python benchmarks/bench_clone.py input_file config_file [nrRobots ...]
+
+Each measurement runs in a separate (forked) process, so the memory used by one method does not affect the other"""
+import os
+import sys
+import time
+import logging
+import multiprocessing
+import contextlib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+from lulu_pcol_sim import sim
+
+def residentMemory():
+    """Return the current resident set size of this process (in bytes, Linux only)"""
+    with open("/proc/self/statm") as file_in:
+        return int(file_in.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+# end residentMemory()
+
+def measure(conn, inputFile, configFile, nrRobots, deepcopyClones):
+    """Build the swarm robots and send (startup_time, rss_increase) to the parent process"""
+    pObj = sim.readInputFile(inputFile)
+    config = lulu_kilobot.scaleConfig(lulu_kilobot.readConfigFile(configFile), nrRobots)
+    rssBefore = residentMemory()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        robots = lulu_kilobot.createSwarmRobots(pObj, config, deepcopyClones)
+    duration = time.perf_counter() - start
+    conn.send((duration, residentMemory() - rssBefore))
+    conn.close()
+# end measure()
+
+if (__name__ == "__main__"):
+    logging.basicConfig(level = logging.WARNING)
+    if (len(sys.argv) < 3):
+        print(__doc__)
+        exit(1)
+
+    sizes = [int(arg) for arg in sys.argv[3:]] or [10, 100, 1000]
+    context = multiprocessing.get_context("fork")
+    print("%8s  %-10s  %10s  %12s" % ("robots", "method", "time (s)", "RSS (MiB)"))
+    for nrRobots in sizes:
+        for method, deepcopyClones in (("deepcopy", True), ("shared", False)):
+            parentConn, childConn = context.Pipe()
+            process = context.Process(target = measure, args = (childConn, sys.argv[1], sys.argv[2], nrRobots, deepcopyClones))
+            process.start()
+            duration, rss = parentConn.recv()
+            process.join()
+            print("%8d  %-10s  %10.3f  %12.1f" % (nrRobots, method, duration, rss / 2.0**20))
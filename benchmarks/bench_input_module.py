@@ -0,0 +1,125 @@
+"""Micro-benchmark of Kilobot.procInputModule() with 10, 100 and 1000 neighbours
+
+usage: python benchmarks/bench_input_module.py [nrNeighbours ...]
+
+Every step the msg_distance agent receives a d_all, d_min, d_next and one d_uid request for each neighbour.
+The current procInputModule() (compiled dispatch, neighbour index) is compared with the original implementation (legacyProcInputModule)"""
+import os
+import sys
+import time
+import random
+import collections
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+
+class BenchAgent():
+
+    """Minimal stand-in for a Pcolony agent"""
+
+    def __init__(self):
+        self.obj = collections.Counter()
+# end class BenchAgent
+
+class BenchColony():
+
+    """Minimal stand-in for a Pcolony that contains only the input module agents"""
+
+    def __init__(self):
+        self.B = ['msg_distance']
+        self.agents = {'msg_distance': BenchAgent()}
+# end class BenchColony
+
+class LegacyRobot():
+
+    """The Kilobot attributes used by legacyProcInputModule()"""
+
+    def __init__(self, colony):
+        self.colony = colony
+        self.raw_input_state = {}
+        self.distances = {}
+        self.distances_prev = {}
+        self.neighbour_ids = []
+        self.neighbour_index = 0
+# end class LegacyRobot
+
+def legacyProcInputModule(robot, paramDistanceThreshold = 55):
+    """The msg_distance part of the original procInputModule() (object names are parsed and formatted at every step)"""
+    for uid, d in robot.raw_input_state["distances"].items():
+        if (uid in robot.distances):
+            robot.distances_prev[uid] = robot.distances[uid]
+            robot.distances[uid] = d
+        else:
+            robot.distances[uid] = robot.distances_prev[uid] = d
+
+    for o in list(robot.colony.agents['msg_distance'].obj):
+        if (o.startswith("d_") or o.startswith("v_")):
+            cmd = o.split('_')[0]
+            uid = o.split('_')[1]
+            del robot.colony.agents['msg_distance'].obj[o]
+            if (cmd == 'd'):
+                if (uid == "all"):
+                    dist_big = True
+                    for uid, d in robot.distances.items():
+                        if (d <= paramDistanceThreshold):
+                            dist_big = False
+                            break
+                    if (dist_big):
+                        robot.colony.agents['msg_distance'].obj["B_all"] = 1
+                    else:
+                        robot.colony.agents['msg_distance'].obj["S_all"] = 1
+                elif (uid == "next"):
+                    robot.neighbour_ids = list(robot.distances.keys())
+                    if (len(robot.neighbour_ids) > 0):
+                        if (robot.neighbour_index >= len(robot.neighbour_ids)):
+                            robot.neighbour_index = 0
+                        if (robot.distances[robot.neighbour_ids[robot.neighbour_index]] <= paramDistanceThreshold):
+                            robot.colony.agents['msg_distance'].obj["S_%d" % robot.neighbour_ids[robot.neighbour_index]] = 1
+                        else:
+                            robot.colony.agents['msg_distance'].obj["B_%d" % robot.neighbour_ids[robot.neighbour_index]] = 1
+                        robot.neighbour_index += 1
+                    else:
+                        robot.colony.agents['msg_distance'].obj["B_all"] = 1
+                elif (uid == "min"):
+                    if (len(robot.distances) > 0):
+                        robot.neighbour_index = min(robot.distances, key=robot.distances.get)
+                        if (robot.distances[robot.neighbour_index] <= paramDistanceThreshold):
+                            robot.colony.agents['msg_distance'].obj["S_%d" % robot.neighbour_index] = 1
+                        else:
+                            robot.colony.agents['msg_distance'].obj["B_%d" % robot.neighbour_index] = 1
+                    else:
+                        robot.colony.agents['msg_distance'].obj["B_all"] = 1
+                else:
+                    uid = int(uid)
+                    if (uid in robot.distances and robot.distances[uid] <= paramDistanceThreshold):
+                        robot.colony.agents['msg_distance'].obj["S_%d" % uid] = 1
+                    else:
+                        robot.colony.agents['msg_distance'].obj["B_%d" % uid] = 1
+# end legacyProcInputModule()
+
+def run(nrNeighbours, robot, procInput, nrSteps):
+    """Run nrSteps input module steps and return the average duration of a step (in seconds)"""
+    rng = random.Random(nrNeighbours)
+    requests = ["d_all", "d_min", "d_next"] + ["d_%d" % uid for uid in range(1, nrNeighbours + 1)]
+    states = [{"distances": {uid: rng.randint(30, 100) for uid in range(1, nrNeighbours + 1)}, "light": 0} for i in range(10)]
+    msgObj = robot.colony.agents['msg_distance'].obj
+
+    duration = 0.0
+    for step in range(nrSteps):
+        msgObj.clear()
+        msgObj.update(requests)
+        robot.raw_input_state = states[step % len(states)]
+        start = time.perf_counter()
+        procInput(robot)
+        duration += time.perf_counter() - start
+    return duration / nrSteps
+# end run()
+
+if (__name__ == "__main__"):
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    print("%12s  %14s  %14s  %8s" % ("neighbours", "legacy (us)", "compiled (us)", "speedup"))
+    for nrNeighbours in sizes:
+        nrSteps = max(20, 20000 // nrNeighbours)
+        lulu_kilobot.generateReplySymbols(range(nrNeighbours + 1))
+        legacy = run(nrNeighbours, LegacyRobot(BenchColony()), legacyProcInputModule, nrSteps)
+        compiled = run(nrNeighbours, lulu_kilobot.Kilobot(0, BenchColony()), lambda robot: robot.procInputModule(), nrSteps)
+        print("%12d  %14.1f  %14.1f  %7.2fx" % (nrNeighbours, legacy * 1e6, compiled * 1e6, legacy / compiled))
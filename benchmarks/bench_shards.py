@@ -0,0 +1,60 @@
+"""Throughput of a Pswarm split into shards (local controller processes with their own KinematicBridge)
+
+Each shard simulates its robots in its own arena (the robots of different shards never sense each other), so n shards run
+n independent sub-swarms that interact only through the global environment: they are not a partition of one swarm of the
+same size, and the measurements are not a scaling efficiency of one swarm. To keep the arenas comparable, every shard gets
+--robots robots (the same density and the same sensing and P system work per robot), and the aggregate throughput of n
+sub-swarms is compared with the throughput of the reference shard count.
+
+usage: python benchmarks/bench_shards.py [scenario] [--shards=1,2,4] [--robots=N] [--steps=N] [--max-lag=N] [--seed=N]
+
+:scenario: name of a Pswarm scenario from input_pairs/ (default = pswarm_10_robots_disperse)
+:--shards: comma separated list of shard counts (the first one is the reference)
+:--robots: number of robots of each shard (the nrRobots of the config is scaled using scaleConfig())
+:--steps: number of control steps executed for each measurement
+:--max-lag: maximum number of steps a shard can be ahead of the slowest one (0 = step-lock)
+
+throughput ratio = (robot steps / s with n shards) / (robot steps / s with the reference shard count)"""
+import os
+import sys
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lulu_kilobot import getOptionValue
+from swarm_shards import ShardCoordinator
+from run_benchmarks import findScenarios
+
+if (__name__ == "__main__"):
+    scenarios = findScenarios()
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or ["pswarm_10_robots_disperse"]
+    if (names[0] not in scenarios or scenarios[names[0]][1] is None):
+        print("Unknown Pswarm scenario %s, available scenarios: %s" % (names[0],
+            ", ".join(name for name, files in scenarios.items() if files[1] is not None)))
+        exit(1)
+    inputFile, configFile = scenarios[names[0]]
+    shardCounts = [int(count) for count in getOptionValue("shards", "1,2,4").split(",")]
+    nrRobots = getOptionValue("robots", 250, int)
+    nrSteps = getOptionValue("steps", 100, int)
+    maxLag = getOptionValue("max-lag", 0, int)
+    options = {"offline": True, "seed": getOptionValue("seed", 0, int), "batched": True, "deltaOutputs": False, "keepAlive": 0,
+            "defineDefaultMotion": True, "deepcopy": False, "lazyWildcards": False, "eventDriven": False,
+            "neighbourCapacity": None, "fullClearDistances": False, "startupTimeout": 30.0,
+            "startupPoll": 0.5, "startupProceed": False, "sceneBatch": None}
+    # the controller logs every distance clear as a warning
+    logging.basicConfig(level = logging.ERROR)
+
+    print("%6s %8s %6s %10s %12s %14s %10s" % ("shards", "robots", "steps", "startup(s)", "duration(s)", "robot steps/s",
+        "throughput"))
+    reference = None
+    for nrShards in shardCounts:
+        coordinator = ShardCoordinator(maxLag = maxLag)
+        coordinator.startLocalShards(nrShards, quiet = True)
+        coordinator.acceptShards(nrShards)
+        coordinator.setup(inputFile, configFile, options, nrRobots * nrShards)
+        coordinator.run(nrSteps)
+        coordinator.close()
+        summary = coordinator.summary()
+        if (reference is None):
+            reference = summary
+        print("%6d %8d %6d %10.3f %12.3f %14.1f %9.2fx" % (nrShards, summary["nrRobots"], summary["nrSteps"],
+            max(coordinator.startupTime), summary["duration"], summary["robotStepsPerSecond"],
+            summary["robotStepsPerSecond"] / reference["robotStepsPerSecond"]))
@@ -0,0 +1,160 @@
+"""Memory used by the robot objects of a swarm: per instance attributes (original Kilobot) vs SwarmState arrays
+
+usage: python benchmarks/bench_swarm_state.py [nrRobots ...] [--neighbours=N] [--updates=N] [--seed=N]
+
+:--neighbours: number of distance readings received by each robot at each update (default 8)
+:--updates: number of sensor updates stored before the measurement (default 3)
+
+The memory allocated while creating the robots, storing the distance and light readings of every update and setting their
+output state is measured with tracemalloc. Each update gives every robot readings from a random set of neighbours, so
+the distance histories hold the current and previous distances of several neighbours.
+The layouts compared are:
+    original        the Kilobot class and the distance / light storage of procInputModule() before SwarmState
+    SwarmState      Kilobot views over a SwarmState, with the distance history in a NeighbourIndex per robot
+    SensorArrays    Kilobot views over a SwarmState, with the distance history in SwarmSensorArrays (--vectorized,
+                    requires numpy)
+The readings (raw_input_state dictionaries returned by the bridge) are created before the measurement and the Pcolonies
+are not included (all the robots use the same placeholder colony)"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+from lulu_kilobot import getOptionValue
+from swarm_state import SwarmState
+from vrep_bridge import vrep_bridge
+
+class LegacyKilobot():
+
+    """The per instance attributes of the original Kilobot class"""
+
+    def __init__(self, uid, pcolony):
+        self.uid = uid # the unique id of the robot
+        self.colony = pcolony # reference to the Pcolony used to control this robot
+        self.raw_input_state = {} # dictionary of raw sensor values
+        self.output_state = {
+                "motion" : vrep_bridge.Motion.stop, # motion (vrep_bridge.Motion) motion type
+                "led_rgb" : [0, 0, 0] # light [r, g, b] with values between 0-2
+                } # dictionary of output states
+        self.distances = {} # dictionary of the most recent distance measurements = {robot_uid: distance}
+        self.distances_prev = {} # dictionary of previous distance measurements = {robot_uid: distance}
+        self.light = -1 # current light intensity
+        self.light_prev = -1 # previous light intensity
+        self.known_robots = [] # list of known (friend) robot IDs
+        self.neighbour_ids = [] # list of robot IDs that I have recently received a msg from
+        self.neighbour_index = 0 # current position on neighbour_ids[]
+    # end __init__()
+
+    def storeInputs(self):
+        """The storage of the sensor readings done by the original procInputModule()"""
+        for uid, d in self.raw_input_state["distances"].items():
+            # if I already have a distance from this robot
+            if (uid in self.distances):
+                # update previous distances
+                self.distances_prev[uid] = self.distances[uid]
+                # store the new distance
+                self.distances[uid] = d
+            # if this is the first time I receive a measurement from this robot
+            else:
+                self.distances[uid] = self.distances_prev[uid] = d
+
+        # if this is not the first light intensity measurement
+        if (self.light != -1):
+            self.light_prev = self.light
+            self.light = self.raw_input_state["light"]
+        # this is the first time I receive a light intensity measurement
+        else:
+            self.light = self.light_prev = self.raw_input_state["light"]
+        # the original d_next request rebuilds the neighbour list from the distances
+        self.neighbour_ids = list(self.distances.keys())
+    # end storeInputs()
+# end class LegacyKilobot
+
+def createReadings(nrRobots, nrNeighbours, nrUpdates, seed):
+    """Return the raw input states of every update: list of {robot_uid: raw_input_state}"""
+    rng = random.Random(seed)
+    # the neighbours of a robot are drawn from the robots around it, so the same ones are measured again
+    nearby = min(2 * nrNeighbours, nrRobots - 1)
+    return [{uid: {"distances": {(uid + 1 + offset) % nrRobots: float(rng.randint(30, 90)) for offset in rng.sample(range(nearby),
+            min(nrNeighbours, nearby))}, "light": rng.randint(0, 40)} for uid in range(nrRobots)} for update in range(nrUpdates)]
+# end createReadings()
+
+def createLegacy(readings):
+    """Create the robots using the original per instance attributes and store the readings"""
+    robots = [LegacyKilobot(uid, None) for uid in range(len(readings[0]))]
+    for inputs in readings:
+        for robot in robots:
+            robot.raw_input_state = inputs[robot.uid]
+            robot.storeInputs()
+    for robot in robots:
+        robot.output_state["motion"] = vrep_bridge.Motion.forward
+        robot.output_state["led_rgb"] = [0, 2, 0]
+    return robots
+# end createLegacy()
+
+def createSwarmState(readings):
+    """Create the robots as views over a SwarmState and store the readings in their NeighbourIndex"""
+    state = SwarmState(len(readings[0]))
+    robots = [lulu_kilobot.Kilobot(uid, None, state) for uid in range(len(readings[0]))]
+    for inputs in readings:
+        for robot in robots:
+            robot.raw_input_state = inputs[robot.uid]
+            robot.neighbours.update(robot.raw_input_state["distances"])
+            robot.light_prev = robot.light if robot.light != -1 else robot.raw_input_state["light"]
+            robot.light = robot.raw_input_state["light"]
+    for robot in robots:
+        robot.motion = vrep_bridge.Motion.forward
+        robot.led_rgb = [0, 2, 0]
+    return robots
+# end createSwarmState()
+
+def createSensorArrays(readings):
+    """Create the robots as views over a SwarmState and store the readings in SwarmSensorArrays"""
+    from swarm_sensors import SwarmSensorArrays
+    state = SwarmState(len(readings[0]))
+    robots = [lulu_kilobot.Kilobot(uid, None, state) for uid in range(len(readings[0]))]
+    arrays = SwarmSensorArrays(len(robots))
+    for robot in robots:
+        robot.sensorView = arrays.view(robot.uid)
+    for inputs in readings:
+        for robot in robots:
+            robot.raw_input_state = inputs[robot.uid]
+        arrays.update(robots)
+    for robot in robots:
+        robot.motion = vrep_bridge.Motion.forward
+        robot.led_rgb = [0, 2, 0]
+    return robots, arrays
+# end createSensorArrays()
+
+def measure(create, readings):
+    """Return (allocated_bytes, duration) of create(readings)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    robots = create(readings)
+    duration = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del robots
+    return allocated, duration
+# end measure()
+
+if (__name__ == "__main__"):
+    sizes = [int(arg) for arg in sys.argv[1:] if not arg.startswith("--")] or [1000, 10000, 100000]
+    nrNeighbours = getOptionValue("neighbours", 8, int)
+    nrUpdates = getOptionValue("updates", 3, int)
+    layouts = [("original", createLegacy), ("SwarmState", createSwarmState)]
+    try:
+        import numpy
+        layouts.append(("SensorArrays", createSensorArrays))
+    except ImportError:
+        print("numpy is not installed, the SensorArrays layout is skipped")
+
+    print("%d readings / robot / update, %d updates" % (nrNeighbours, nrUpdates))
+    print("%10s  %-12s  %12s  %14s  %10s" % ("robots", "layout", "memory (MiB)", "bytes / robot", "time (s)"))
+    for nrRobots in sizes:
+        readings = createReadings(nrRobots, nrNeighbours, nrUpdates, getOptionValue("seed", 0, int))
+        for layout, create in layouts:
+            allocated, duration = measure(create, readings)
+            print("%10d  %-12s  %12.2f  %14.1f  %10.3f" % (nrRobots, layout, allocated / 2.0**20, allocated / nrRobots, duration))
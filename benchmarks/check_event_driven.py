@@ -0,0 +1,151 @@
+"""Equivalence check of the --event-driven stepping (EventScheduler) against the stepping of every robot at every step
+
+usage: python benchmarks/check_event_driven.py [scenario ...] [--robots=N] [--steps=N] [--seed=N]
+
+:scenario: name of a Pswarm scenario from input_pairs/ (default = the scenarios whose Pcolonies finish and go quiescent)
+:--robots: swarm size (the nrRobots of the config is scaled using scaleConfig(), default = the nrRobots of the config)
+:--steps: maximum number of control steps compared
+:--seed: seed of the KinematicBridge and of the random generator used by the simulator
+
+Two checks are executed for every scenario:
+    - the Pcolonies of the Pswarm stepped one by one in the pObj.C order (as done by EventScheduler) must reach the same
+      state and step results as Pswarm.runSimulationStep(), starting from the same seed
+    - a SwarmController with an EventScheduler must produce, at every step, the same step result, the same output state
+      for every robot and the same Pcolony / global environment state as a SwarmController that steps every robot
+Exits with status 1 at the first difference."""
+import os
+import sys
+import random
+import logging
+import contextlib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+from lulu_kilobot import getOptionValue
+from kinematic_bridge import KinematicBridge
+from event_scheduler import EventScheduler
+from parallel_swarm import combineSimResults
+from run_benchmarks import findScenarios
+from lulu_pcol_sim import sim
+
+# scenarios with a finite number of steps, so the Pcolonies become quiescent before the end of the check
+DEFAULT_SCENARIOS = ["pswarm_3_straight_30_steps", "pswarm_5_robots_2_straight_1_left_2_right_30_steps"]
+
+def swarmState(pObj):
+    """Return a comparable copy of the state of a Pswarm (global environment, environment and agent multisets of every Pcolony)"""
+    return (dict(pObj.global_env), {name: (dict(colony.env), [dict(agent.obj) for agent in colony.agents.values()])
+        for name, colony in pObj.colonies.items()})
+# end swarmState()
+
+def checkColonyOrder(inputFile, nrSteps, seed):
+    """Compare the Pcolonies of a Pswarm stepped one by one in the pObj.C order with Pswarm.runSimulationStep()
+
+    :returns: the description of the first difference (None if there is none)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        pswarm = sim.readInputFile(inputFile)
+        stepped = sim.readInputFile(inputFile)
+    pswarmRandom = random.Random(seed)
+    steppedRandom = random.Random(seed)
+
+    for step in range(nrSteps):
+        random.setstate(pswarmRandom.getstate())
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            expected = pswarm.runSimulationStep()
+        pswarmRandom.setstate(random.getstate())
+
+        random.setstate(steppedRandom.getstate())
+        results = []
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name in stepped.C:
+                results.append(stepped.colonies[name].runSimulationStep())
+        steppedRandom.setstate(random.getstate())
+
+        if (combineSimResults(results) != expected):
+            return "step %d: result %s != %s" % (step, combineSimResults(results), expected)
+        if (swarmState(stepped) != swarmState(pswarm)):
+            return "step %d: the Pswarm states differ" % step
+        if (pswarmRandom.getstate() != steppedRandom.getstate()):
+            return "step %d: the random generator states differ" % step
+        if (expected != sim.SimStepResult.finished):
+            break
+    return None
+# end checkColonyOrder()
+
+def runController(inputFile, configFile, nrRobots, nrSteps, seed, eventDriven):
+    """Run a SwarmController on the KinematicBridge and record the result of every step
+
+    :returns: (list of (sim_result, {robot_uid: output_state}, swarm state) for each step, EventScheduler or None)"""
+    random.seed(seed)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        pObj = sim.readInputFile(inputFile)
+        config = lulu_kilobot.readConfigFile(configFile)
+        if (nrRobots is not None):
+            config = lulu_kilobot.scaleConfig(config, nrRobots)
+        bridge = KinematicBridge(seed = seed)
+        bridge.spawnRobots(nr = config.nrRobots - 1, spawnType = config.spawnType)
+        lulu_kilobot.generateReplySymbols(range(config.nrRobots))
+        robots = lulu_kilobot.createSwarmRobots(pObj, config)
+        lulu_kilobot.loadKnownRobotIds(bridge, robots)
+
+        controller = lulu_kilobot.SwarmController(pObj, robots, lulu_kilobot.SwarmIO(bridge, robots), config)
+        if (eventDriven):
+            controller.scheduler = EventScheduler(pObj, robots)
+        steps = []
+        while (controller.simStepNr < nrSteps):
+            sim_result = controller.step()
+            steps.append((sim_result, {robot.uid: robot.output_state for robot in robots}, swarmState(pObj)))
+            # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+            if (sim_result != sim.SimStepResult.finished):
+                break
+        controller.close()
+    return steps, controller.scheduler
+# end runController()
+
+def checkEventDriven(inputFile, configFile, nrRobots, nrSteps, seed):
+    """Compare a SwarmController with an EventScheduler with a SwarmController that steps every robot
+
+    :returns: (description of the first difference or None, EventScheduler of the event driven run)"""
+    expectedSteps, scheduler = runController(inputFile, configFile, nrRobots, nrSteps, seed, eventDriven = False)
+    steps, scheduler = runController(inputFile, configFile, nrRobots, nrSteps, seed, eventDriven = True)
+    if (len(steps) != len(expectedSteps)):
+        return "%d steps executed instead of %d" % (len(steps), len(expectedSteps)), scheduler
+    for step, ((sim_result, outputs, state), (expectedResult, expectedOutputs, expectedState)) in enumerate(zip(steps, expectedSteps)):
+        if (sim_result != expectedResult):
+            return "step %d: result %s != %s" % (step, sim_result, expectedResult), scheduler
+        for uid in expectedOutputs:
+            if (outputs[uid] != expectedOutputs[uid]):
+                return "step %d robot %d: output %s != %s" % (step, uid, outputs[uid], expectedOutputs[uid]), scheduler
+        if (state != expectedState):
+            return "step %d: the Pswarm states differ" % step, scheduler
+    return None, scheduler
+# end checkEventDriven()
+
+if (__name__ == "__main__"):
+    # the controller logs every distance clear as a warning
+    logging.basicConfig(level = logging.ERROR)
+    scenarios = findScenarios()
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or DEFAULT_SCENARIOS
+    for name in names:
+        if (name not in scenarios or scenarios[name][1] is None):
+            print("Unknown Pswarm scenario %s, available scenarios: %s" % (name, ", ".join(
+                scenarioName for scenarioName, (inputFile, configFile) in scenarios.items() if configFile is not None)))
+            exit(1)
+    nrRobots = getOptionValue("robots", None, int)
+    nrSteps = getOptionValue("steps", 60, int)
+    seed = getOptionValue("seed", 0, int)
+
+    for name in names:
+        inputFile, configFile = scenarios[name]
+        difference = checkColonyOrder(inputFile, nrSteps, seed)
+        if (difference is not None):
+            print("%s: Pcolonies stepped one by one differ from Pswarm.runSimulationStep(), %s" % (name, difference))
+            exit(1)
+        difference, scheduler = checkEventDriven(inputFile, configFile, nrRobots, nrSteps, seed)
+        if (difference is not None):
+            print("%s: --event-driven differs from the stepping of every robot, %s" % (name, difference))
+            exit(1)
+        print("%s: --event-driven matches the stepping of every robot (%d Pcolony steps skipped of %d, %d input module "
+            "executions skipped of %d)" % (name, scheduler.nrColonySkipped, scheduler.nrColonySteps, scheduler.nrInputSkipped,
+            scheduler.nrRobotSteps))
+        if (scheduler.nrColonySkipped == 0):
+            print("%s: warning, no Pcolony became quiescent during the %d steps, the skipped steps were not exercised" % (name,
+                nrSteps))
@@ -0,0 +1,86 @@
+"""Equivalence check of the --vectorized sensor processing (SwarmSensorArrays / SensorView) against NeighbourIndex
+
+usage: python benchmarks/check_vectorized.py [--robots=N] [--steps=N] [--max-age=N] [--capacity=N] [--seed=N]
+
+Random integer distance readings (with many ties, neighbours that appear, disappear and come back, and periodic clears)
+are given to one NeighbourIndex per robot and to a SwarmSensorArrays. After every update, all the queries used by
+Kilobot.procInputModule() (order, minNeighbour, anySmall, isSmall, variation, distances) must return the same result.
+Exits with status 1 at the first difference."""
+import os
+import sys
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from neighbour_index import NeighbourIndex
+from swarm_sensors import SwarmSensorArrays
+
+class CheckRobot():
+
+    """The Kilobot attributes read by SwarmSensorArrays.update()"""
+
+    def __init__(self, uid):
+        self.uid = uid
+        self.raw_input_state = {"distances": {}, "light": 0}
+# end class CheckRobot
+
+def getOptionValue(name, default):
+    """Return the integer value of option --name=value or default"""
+    for arg in sys.argv[1:]:
+        if (arg.startswith("--%s=" % name)):
+            return int(arg.split("=", 1)[1])
+    return default
+# end getOptionValue()
+
+def compare(uid, index, view, threshold):
+    """Return the description of the first query that differs between a NeighbourIndex and a SensorView (None if all match)"""
+    if (index.order != view.order):
+        return "order %s != %s" % (index.order, view.order)
+    if (index.minNeighbour() != view.minNeighbour()):
+        return "minNeighbour %s != %s" % (index.minNeighbour(), view.minNeighbour())
+    if (index.anySmall(threshold) != view.anySmall(threshold)):
+        return "anySmall %s != %s" % (index.anySmall(threshold), view.anySmall(threshold))
+    if (index.distances != view.distances or list(index.distances) != list(view.distances)):
+        return "distances %s != %s" % (index.distances, view.distances)
+    for other in range(view.arrays.nrRobots):
+        if (index.isSmall(other, threshold) != view.isSmall(other, threshold)):
+            return "isSmall(%d)" % other
+        if (index.variation(other) != view.variation(other)):
+            return "variation(%d) %d != %d" % (other, index.variation(other), view.variation(other))
+    return None
+# end compare()
+
+if (__name__ == "__main__"):
+    nrRobots = getOptionValue("robots", 30)
+    nrSteps = getOptionValue("steps", 300)
+    maxAge = getOptionValue("max-age", 3)
+    capacity = getOptionValue("capacity", 0)
+    threshold = 55
+    rng = random.Random(getOptionValue("seed", 0))
+
+    robots = [CheckRobot(uid) for uid in range(nrRobots)]
+    indexes = [NeighbourIndex(threshold, capacity = capacity, maxAge = maxAge) for uid in range(nrRobots)]
+    arrays = SwarmSensorArrays(nrRobots, maxAge, capacity)
+    views = [arrays.view(uid) for uid in range(nrRobots)]
+
+    nrQueries = 0
+    for step in range(nrSteps):
+        if (step % 50 == 49):
+            for uid in range(nrRobots):
+                indexes[uid].clear()
+                views[uid].clear()
+        for robot in robots:
+            # a few neighbours, in random order, with coarse distances so that ties are frequent
+            neighbours = rng.sample([uid for uid in range(nrRobots) if uid != robot.uid], rng.randint(0, min(8, nrRobots - 1)))
+            robot.raw_input_state = {"distances": {uid: rng.choice((40, 50, 55, 60, 70)) for uid in neighbours},
+                    "light": rng.randint(0, 40)}
+            indexes[robot.uid].update(robot.raw_input_state["distances"])
+        arrays.update(robots)
+        arrays.classify(20, threshold)
+
+        for uid in range(nrRobots):
+            difference = compare(uid, indexes[uid], views[uid], threshold)
+            nrQueries += 1
+            if (difference is not None):
+                print("Step %d robot %d: %s" % (step, uid, difference))
+                exit(1)
+    print("SwarmSensorArrays matches NeighbourIndex: %d robots, %d steps, maxAge = %d, capacity = %d (%d robot comparisons)" % (
+        nrRobots, nrSteps, maxAge, capacity, nrQueries))
@@ -0,0 +1,184 @@
+"""Headless parameter sweep of a Pswarm scenario, executed on a pool of processes against the offline KinematicBridge
+
+usage: python benchmarks/parameter_sweep.py scenario [--light-threshold=20,40] [--distance-threshold=45,55]
+    [--clear-distances=5,10] [--spawn-type=circular,ox_plus] [--robots=10,100] [--seeds=0-9] [--steps=N]
+    [--dispersion-distance=MM] [--until-dispersed] [--workers=N] [--output=path]
+
+:scenario: name of a Pswarm scenario from input_pairs/
+:--light-threshold: comma separated list of paramLightThreshold values (default 20)
+:--distance-threshold: comma separated list of paramDistanceThreshold values (default 55)
+:--clear-distances: comma separated list of clearDistancesStepNr values, the number of steps after which a neighbour that
+    was not measured again is forgotten (default = the value from the config file)
+:--spawn-type: comma separated list of spawn type names (default = the spawn type from the config file)
+:--robots: comma separated list of swarm sizes (default = the nrRobots from the config file, scaled using scaleConfig())
+:--seeds: comma separated list of seeds or seed ranges (ex 0-9,20) of the KinematicBridge and of the simulator (default 0)
+:--steps: maximum number of control steps of each run (default 500)
+:--dispersion-distance: the swarm is dispersed when no two robots are closer than this distance (mm)
+    (default = the paramDistanceThreshold of the run)
+:--until-dispersed: stop a run as soon as the swarm is dispersed
+:--workers: number of worker processes (default = number of CPUs)
+:--output: path of the json lines file that receives the result of each run as soon as it finishes
+    (default = sweep_results.jsonl)
+
+The runs are the cartesian product of all the parameter lists. Each result line contains the parameters of the run and:
+steps (executed control steps), stepsToDispersion (first step after which the swarm was dispersed, None if it never was),
+minDistance (smallest distance between two robots measured before the last step), collisions (KinematicBridge blocked movements),
+stepsPerSecond, result (SimStepResult name of the last step) or error."""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import itertools
+import contextlib
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+from lulu_kilobot import getOptionValue
+from kinematic_bridge import KinematicBridge
+from lulu_pcol_sim import sim
+from vrep_bridge import vrep_bridge
+from run_benchmarks import findScenarios
+
+def parseList(text, valueType = int):
+    """Convert a comma separated list (ex 1,2,5-8) into a list of values. Ranges are allowed only for integer values"""
+    values = []
+    for item in text.split(","):
+        if (valueType == int and "-" in item):
+            first, last = item.split("-", 1)
+            values.extend(range(int(first), int(last) + 1))
+        else:
+            values.append(valueType(item))
+    return values
+# end parseList()
+
+def swarmMinDistance(robots):
+    """Return the smallest distance measured by the robots during the last step (None if no robot measured a distance)"""
+    distances = [min(robot.raw_input_state["distances"].values()) for robot in robots if robot.raw_input_state["distances"]]
+    return min(distances) if distances else None
+# end swarmMinDistance()
+
+def runExperiment(run):
+    """Execute one run of the sweep in the current (worker) process
+
+    :run: dictionary of run parameters (scenario, inputFile, configFile, lightThreshold, distanceThreshold, clearDistances,
+        spawnType, robots, seed, steps, dispersionDistance, untilDispersed)
+    :returns: the run dictionary, completed with the measured metrics"""
+    result = dict(run)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            random.seed(run["seed"])
+            pObj = sim.readInputFile(run["inputFile"])
+            if (type(pObj) != sim.Pswarm):
+                raise ValueError("The parameter sweep needs a Pswarm scenario")
+            config = lulu_kilobot.readConfigFile(run["configFile"])
+            if (run["robots"] is not None):
+                config = lulu_kilobot.scaleConfig(config, run["robots"])
+            if (run["clearDistances"] is not None):
+                config.clearDistancesStepNr = run["clearDistances"]
+            if (run["spawnType"] is not None):
+                config.spawnType = vrep_bridge.SpawnTypeNames[run["spawnType"]]
+            result["robots"] = config.nrRobots
+
+            bridge = KinematicBridge(seed = run["seed"])
+            bridge.spawnRobots(nr = config.nrRobots - 1, spawnType = config.spawnType)
+            lulu_kilobot.generateReplySymbols(range(config.nrRobots))
+            robots = lulu_kilobot.createSwarmRobots(pObj, config)
+            lulu_kilobot.loadKnownRobotIds(bridge, robots)
+            controller = lulu_kilobot.SwarmController(pObj, robots, lulu_kilobot.SwarmIO(bridge, robots), config)
+            controller.paramLightThreshold = run["lightThreshold"]
+            controller.paramDistanceThreshold = run["distanceThreshold"]
+            dispersionDistance = run["dispersionDistance"] if run["dispersionDistance"] is not None else run["distanceThreshold"]
+
+            stepsToDispersion = None
+            minDistance = None
+            sim_result = sim.SimStepResult.finished
+            start = time.perf_counter()
+            while (controller.simStepNr < run["steps"]):
+                # the distances read at the start of a step are the result of the previous step
+                controller.swarmIO.readInputs()
+                minDistance = swarmMinDistance(robots)
+                if (minDistance is None or minDistance >= dispersionDistance):
+                    if (stepsToDispersion is None):
+                        stepsToDispersion = controller.simStepNr
+                    if (run["untilDispersed"]):
+                        break
+                else:
+                    # the swarm has to stay dispersed
+                    stepsToDispersion = None
+                sim_result = controller.computeStep()
+                # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+                if (sim_result != sim.SimStepResult.finished):
+                    break
+                controller.swarmIO.writeOutputs()
+            duration = time.perf_counter() - start
+            controller.close()
+
+        result["steps"] = controller.simStepNr
+        result["stepsToDispersion"] = stepsToDispersion
+        result["minDistance"] = minDistance
+        result["collisions"] = bridge.nrCollisions
+        result["stepsPerSecond"] = controller.simStepNr / duration if duration > 0 else 0.0
+        result["result"] = [name for name in ("finished", "no_more_executables", "error")
+                if getattr(sim.SimStepResult, name) == sim_result][0]
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+# end runExperiment()
+
+def initWorker():
+    """Initialize a worker process of the pool"""
+    # the controller logs every distance clear as a warning
+    logging.basicConfig(level = logging.ERROR)
+# end initWorker()
+
+if (__name__ == "__main__"):
+    scenarios = findScenarios()
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if (len(names) < 1 or names[0] not in scenarios or scenarios[names[0]][1] is None):
+        print("Expected a Pswarm scenario, available scenarios: %s" % ", ".join(name for name, files in scenarios.items()
+            if files[1] is not None))
+        exit(1)
+    inputFile, configFile = scenarios[names[0]]
+
+    grid = {
+            "lightThreshold": parseList(getOptionValue("light-threshold", "20")),
+            "distanceThreshold": parseList(getOptionValue("distance-threshold", "55")),
+            "clearDistances": parseList(getOptionValue("clear-distances", "")) if getOptionValue("clear-distances", None) else [None],
+            "spawnType": parseList(getOptionValue("spawn-type", ""), str) if getOptionValue("spawn-type", None) else [None],
+            "robots": parseList(getOptionValue("robots", "")) if getOptionValue("robots", None) else [None],
+            "seed": parseList(getOptionValue("seeds", "0")),
+            }
+    for spawnType in grid["spawnType"]:
+        if (spawnType is not None and spawnType not in vrep_bridge.SpawnTypeNames):
+            print("Unknown spawn type %s, available spawn types: %s" % (spawnType, ", ".join(vrep_bridge.SpawnTypeNames)))
+            exit(1)
+    runs = []
+    for values in itertools.product(*grid.values()):
+        run = dict(zip(grid.keys(), values))
+        run.update({"scenario": names[0], "inputFile": inputFile, "configFile": configFile, "steps": getOptionValue("steps", 500, int),
+            "dispersionDistance": getOptionValue("dispersion-distance", None, float), "untilDispersed": '--until-dispersed' in sys.argv})
+        runs.append(run)
+
+    outputPath = getOptionValue("output", "sweep_results.jsonl")
+    nrWorkers = getOptionValue("workers", os.cpu_count() or 1, int)
+    print("Running %d runs of %s on %d worker processes, results are written to %s" % (len(runs), names[0], nrWorkers, outputPath))
+    print("%5s %8s %8s %8s %8s %10s %6s %8s %10s %10s %10s" % ("run", "light", "distance", "clear", "robots", "spawn", "seed",
+        "steps", "dispersed", "collisions", "steps/s"))
+
+    start = time.perf_counter()
+    # spawn gives every worker a new interpreter (like run_benchmarks.py), the runs do not share any module state
+    context = multiprocessing.get_context("spawn")
+    with open(outputPath, "w") as file_out, context.Pool(nrWorkers, initializer = initWorker) as pool:
+        for nr, result in enumerate(pool.imap_unordered(runExperiment, runs)):
+            # every result is written as soon as its run finishes
+            file_out.write(json.dumps(result) + "\n")
+            file_out.flush()
+            if ("error" in result):
+                print("%5d  %s" % (nr, result["error"]))
+                continue
+            print("%5d %8d %8d %8s %8d %10s %6d %8d %10s %10d %10.1f" % (nr, result["lightThreshold"], result["distanceThreshold"],
+                result["clearDistances"], result["robots"], result["spawnType"], result["seed"], result["steps"],
+                result["stepsToDispersion"], result["collisions"], result["stepsPerSecond"]))
+    print("\n%d runs in %.1f s" % (len(runs), time.perf_counter() - start))
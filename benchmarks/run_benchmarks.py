@@ -0,0 +1,176 @@
+"""Reproducible benchmark of the controller over the input_pairs scenarios at growing swarm sizes
+
+usage: python benchmarks/run_benchmarks.py [scenario ...] [--sizes=10,100,1000] [--steps=N] [--seed=N] [--output=path]
+    [--compare=path]
+
+:scenario: name of a scenario from input_pairs/ (default = all scenarios)
+:--sizes: comma separated list of swarm sizes (the nrRobots of each Pswarm config is scaled using scaleConfig())
+:--steps: number of control steps executed for each measurement
+:--seed: seed of the KinematicBridge and of the random generator used by the simulator
+:--output: path of the json file that receives the results (default = benchmark_results.json)
+:--compare: path of a json file produced by a previous run; the steps / second of both runs are compared
+
+Each (scenario, size) measurement runs in a new process against the offline KinematicBridge, so the peak RSS of one
+measurement is not affected by the others. Pcolony scenarios (single robot) are measured only once."""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import resource
+import subprocess
+import contextlib
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import lulu_kilobot
+from lulu_kilobot import getOptionValue
+from kinematic_bridge import KinematicBridge
+from step_metrics import Histogram, StepMetrics
+from lulu_pcol_sim import sim
+
+INPUT_PAIRS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "input_pairs")
+
+def findScenarios(path = INPUT_PAIRS_PATH):
+    """Return the scenarios of the input_pairs directory
+
+    :returns: dictionary {scenario_name: (input_file, config_file or None)}"""
+    scenarios = {}
+    for name in sorted(os.listdir(path)):
+        fullPath = os.path.join(path, name)
+        if (os.path.isdir(fullPath)):
+            files = {fileName.split(".")[0]: os.path.join(fullPath, fileName) for fileName in os.listdir(fullPath)}
+            if ("input" in files and "config" in files):
+                scenarios[name] = (files["input"], files["config"])
+        elif (name.startswith("pcolony")):
+            scenarios[os.path.splitext(name)[0]] = (fullPath, None)
+    return scenarios
+# end findScenarios()
+
+def gitVersion():
+    """Return the git description of the checked out version (or None if it is not available)"""
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd = INPUT_PAIRS_PATH,
+                stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+# end gitVersion()
+
+def measure(conn, inputFile, configFile, nrRobots, nrSteps, seed):
+    """Build the swarm, run nrSteps control steps and send the measurements (dictionary) to the parent process"""
+    # the controller logs every distance clear as a warning
+    logging.basicConfig(level = logging.ERROR)
+    random.seed(seed)
+    result = {"nrRobots": 1 if configFile is None else nrRobots, "startup": {}}
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            pObj = sim.readInputFile(inputFile)
+            config = None
+            if (configFile is not None):
+                config = lulu_kilobot.scaleConfig(lulu_kilobot.readConfigFile(configFile), nrRobots)
+            result["startup"]["parse"] = time.perf_counter() - start
+
+            bridge = KinematicBridge(seed = seed)
+            if (config is None):
+                robots = [lulu_kilobot.Kilobot(0, pObj)]
+            else:
+                bridge.spawnRobots(nr = config.nrRobots - 1, spawnType = config.spawnType)
+                lulu_kilobot.generateReplySymbols(range(config.nrRobots))
+                robots = lulu_kilobot.createSwarmRobots(pObj, config, timings = result["startup"])
+                lulu_kilobot.loadKnownRobotIds(bridge, robots)
+            result["startup"]["total"] = time.perf_counter() - start
+
+            metrics = StepMetrics()
+            controller = lulu_kilobot.SwarmController(pObj, robots, lulu_kilobot.SwarmIO(bridge, robots), config,
+                    metrics = metrics)
+            stepDurations = Histogram()
+            start = time.perf_counter()
+            while (controller.simStepNr < nrSteps):
+                stepStart = time.perf_counter()
+                sim_result = controller.step()
+                stepDurations.add(time.perf_counter() - stepStart)
+                # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+                if (sim_result != sim.SimStepResult.finished):
+                    break
+            duration = time.perf_counter() - start
+            controller.close()
+
+        result["steps"] = controller.simStepNr
+        result["steps_per_second"] = controller.simStepNr / duration if duration > 0 else 0.0
+        result["step_latency"] = stepDurations.summary()
+        result["phases"] = {phase: summary for scope, phase, summary in metrics.rows() if scope == "step"}
+        result["collisions"] = bridge.nrCollisions
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+
+    # ru_maxrss is expressed in KiB on Linux
+    result["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    conn.send(result)
+    conn.close()
+# end measure()
+
+def compareResults(previous, current):
+    """Print the steps / second of the measurements that are present in both runs"""
+    previousSpeed = {(r["scenario"], r["nrRobots"]): r.get("steps_per_second") for r in previous["results"]}
+    print("\nComparison with %s:" % previous.get("version"))
+    print("%-55s %8s %12s %12s %8s" % ("scenario", "robots", "before", "after", "ratio"))
+    for r in current["results"]:
+        before = previousSpeed.get((r["scenario"], r["nrRobots"]))
+        after = r.get("steps_per_second")
+        if (before and after):
+            print("%-55s %8d %12.1f %12.1f %7.2fx" % (r["scenario"], r["nrRobots"], before, after, after / before))
+# end compareResults()
+
+if (__name__ == "__main__"):
+    scenarios = findScenarios()
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or list(scenarios.keys())
+    for name in names:
+        if (name not in scenarios):
+            print("Unknown scenario %s, available scenarios: %s" % (name, ", ".join(scenarios)))
+            exit(1)
+    sizes = [int(size) for size in getOptionValue("sizes", "10,100,1000").split(",")]
+    nrSteps = getOptionValue("steps", 100, int)
+    seed = getOptionValue("seed", 0, int)
+    outputPath = getOptionValue("output", "benchmark_results.json")
+
+    # a new interpreter for each measurement (fork would inherit the peak RSS of this process)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print("%-55s %8s %6s %10s %10s %10s %10s %10s" % ("scenario", "robots", "steps", "startup(s)", "steps/s",
+        "p50 (ms)", "p99 (ms)", "RSS (MiB)"))
+    for name in names:
+        inputFile, configFile = scenarios[name]
+        for nrRobots in (sizes if configFile is not None else [1]):
+            parentConn, childConn = context.Pipe()
+            process = context.Process(target = measure, args = (childConn, inputFile, configFile, nrRobots, nrSteps, seed))
+            process.start()
+            result = parentConn.recv()
+            process.join()
+            result["scenario"] = name
+            results.append(result)
+            if ("error" in result):
+                print("%-55s %8d  %s" % (name, result["nrRobots"], result["error"]))
+                continue
+            print("%-55s %8d %6d %10.3f %10.1f %10.3f %10.3f %10.1f" % (name, result["nrRobots"], result["steps"],
+                result["startup"]["total"], result["steps_per_second"], result["step_latency"]["p50"] * 1000,
+                result["step_latency"]["p99"] * 1000, result["peak_rss"] / 2.0**20))
+
+    report = {
+            "version": gitVersion(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "steps": nrSteps,
+            "seed": seed,
+            "results": results,
+            }
+    with open(outputPath, "w") as file_out:
+        json.dump(report, file_out, indent = 2)
+    print("\nResults saved to %s" % outputPath)
+
+    comparePath = getOptionValue("compare", None)
+    if (comparePath is not None):
+        with open(comparePath) as file_in:
+            compareResults(json.load(file_in), report)
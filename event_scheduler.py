@@ -0,0 +1,119 @@
+import logging
+from lulu_pcol_sim import sim
+from parallel_swarm import combineSimResults
+
+class EventScheduler():
+
+    """Event driven stepping of the robots of a Pcolony / Pswarm: only the robots that can change state are serviced.
+    A Pcolony that executed nothing during a step (SimStepResult.no_more_executables) stays quiescent until its state can
+    change, i.e. until the global environment changes. While it is quiescent its agents receive no new requests, so the input
+    module publishes nothing, the Pcolony is not stepped and the output module (idempotent) is not executed.
+    The input module is skipped only if the same raw input state has already been applied twice (the current and previous
+    measurements are then equal and one more update would not change them) and no neighbour is waiting to expire.
+
+    The Pcolonies are stepped one by one (in the pObj.C order), so the result is identical to stepping every Pcolony
+    at every step, provided that a Pcolony without executable programs does not use the random generator."""
+
+    def __init__(self, pObj, robots):
+        """
+        :pObj: the Pcolony or Pswarm
+        :robots: list of Kilobot objects"""
+        self.pObj = pObj
+        self.robots = robots
+        if (type(pObj) == sim.Pswarm):
+            self.colonyNames = list(pObj.C)
+            colonyName = {id(colony): name for name, colony in pObj.colonies.items()}
+            self.colonyRobot = {colonyName[id(robot.colony)]: robot for robot in robots}
+        else:
+            self.colonyNames = [None]
+            self.colonyRobot = {None: robots[0]}
+        self.robotColony = {robot.uid: name for name, robot in self.colonyRobot.items()} # dictionary {robot_uid: colony_name}
+        self.lastResult = {name: None for name in self.colonyNames} # dictionary {colony_name: SimStepResult of its last step}
+        self.lastInput = {} # dictionary {robot_uid: last applied raw_input_state}
+        self.nrApplied = {robot.uid: 0 for robot in robots} # dictionary {robot_uid: nr of consecutive applications of lastInput}
+        self.envChanged = True # True if the global environment changed during the last step
+
+        self.nrRobotSteps = 0 # nr of robot steps (robots x steps)
+        self.nrColonySteps = 0 # nr of Pcolony steps (Pcolonies x steps)
+        self.nrInputSkipped = 0 # nr of skipped input module executions
+        self.nrColonySkipped = 0 # nr of skipped Pcolony steps
+    # end __init__()
+
+    def step(self, clearDistances = False, defineDefaultMotion = True, paramLightThreshold = 20, paramDistanceThreshold = 55,
+            stepArbiter = None):
+        """Execute one control step using the current Kilobot.raw_input_state of all robots.
+        The results are stored in Kilobot.output_state
+
+        :clearDistances: clear the distance history of all robots after the Pcolony step
+        :defineDefaultMotion: passed to Kilobot.procOutputModule()
+        :stepArbiter: callable that executes the Pcolony step function it receives (see SwarmController.stepArbiter)
+        :returns: the sim.SimStepResult of the P system step"""
+        noMoreExecutables = sim.SimStepResult.no_more_executables
+        envChanged = self.envChanged
+        lastResult = self.lastResult
+
+        # input module
+        for robot in self.robots:
+            uid = robot.uid
+            raw_input_state = robot.raw_input_state
+            if (raw_input_state != self.lastInput.get(uid)):
+                self.lastInput[uid] = raw_input_state
+                self.nrApplied[uid] = 0
+            quiescent = not envChanged and lastResult[self.robotColony[uid]] == noMoreExecutables
+            # the swarm level SwarmSensorArrays are updated for all robots, the input module only answers requests
+            if (quiescent and (robot.sensorView is not None or (self.nrApplied[uid] >= 2 and robot.neighbours.isSettled()))):
+                self.nrInputSkipped += 1
+                continue
+            robot.procInputModule(paramLightThreshold, paramDistanceThreshold)
+            self.nrApplied[uid] += 1
+
+        # Pcolony step
+        active = [name for name in self.colonyNames if envChanged or lastResult[name] != noMoreExecutables]
+        self.nrColonySkipped += len(self.colonyNames) - len(active)
+        stepped = [self.colonyRobot[name] for name in active if name in self.colonyRobot]
+
+        def stepColonies():
+            # the global environment can be replaced by the stepArbiter before the step is executed again
+            globalEnv = getattr(self.pObj, "global_env", None)
+            globalEnvBefore = globalEnv.copy() if globalEnv is not None else None
+            for name in active:
+                if (name is None):
+                    lastResult[name] = self.pObj.runSimulationStep()
+                else:
+                    lastResult[name] = self.pObj.colonies[name].runSimulationStep()
+                    self.pObj.simResult[name] = lastResult[name]
+            self.envChanged = globalEnv is not None and self.pObj.global_env != globalEnvBefore
+            return combineSimResults(lastResult.values())
+
+        if (stepArbiter is None):
+            sim_result = stepColonies()
+        else:
+            sim_result = stepArbiter(stepColonies)
+        self.nrRobotSteps += len(self.robots)
+        self.nrColonySteps += len(self.colonyNames)
+        logging.debug("EventScheduler stepped the Pcolonies of %d of %d robots" % (len(stepped), len(self.robots)))
+
+        # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+        if (sim_result != sim.SimStepResult.finished):
+            return sim_result
+
+        if (clearDistances):
+            for robot in self.robots:
+                robot.clearDistances()
+                # the distance history has to be rebuilt by two applications of the input
+                self.nrApplied[robot.uid] = 0
+
+        # output module (the output state of a quiescent robot does not change)
+        for robot in stepped:
+            robot.procOutputModule(defineDefaultMotion)
+
+        return sim_result
+    # end step()
+
+    def printStats(self):
+        """Print the number of skipped input module executions and Pcolony steps"""
+        print("\nEventScheduler: %d robot steps, %d input module executions skipped (%.1f%%), %d Pcolony steps skipped (%.1f%%)" % (
+            self.nrRobotSteps, self.nrInputSkipped, 100.0 * self.nrInputSkipped / self.nrRobotSteps if self.nrRobotSteps else 0,
+            self.nrColonySkipped, 100.0 * self.nrColonySkipped / self.nrColonySteps if self.nrColonySteps else 0))
+    # end printStats()
+# end class EventScheduler
@@ -0,0 +1,189 @@
+import logging
+import math
+import random
+from vrep_bridge import vrep_bridge # for Motion, Led_rgb, SpawnType
+
+class KinematicBridge():
+
+    """Headless, in-process stand-in for vrep_bridge.VrepBridge.
+    Simulates Kilobot differential motion, a light gradient and inter-robot IR distances without a running V-REP instance.
+    Neighbour queries use a uniform spatial grid (cell size = communication range) so that a getStates() call is O(N) instead of O(N^2)."""
+
+    def __init__(self, seed = 0, commRange = 100.0, robotDiameter = 33.0, forwardStep = 1.0, turnStep = math.radians(4.5),
+            lightSource = (0.0, 0.0), lightIntensity = 255.0, lightScale = 500.0, spacing = 60.0):
+        """
+        :seed: seed of the random generator (used for the initial headings of the robots)
+        :commRange: maximum distance (mm) at which two robots can measure the distance between them
+        :robotDiameter: diameter of a Kilobot (mm), used for collision detection
+        :forwardStep: distance (mm) travelled by a robot during one control step with Motion.forward
+        :turnStep: rotation (rad) performed by a robot during one control step with Motion.left / Motion.right
+        :lightSource: (x, y) position of the light source
+        :lightIntensity: light intensity measured right next to the light source
+        :lightScale: distance (mm) at which the measured light intensity halves
+        :spacing: distance (mm) between two neighbour robots at spawn time"""
+        self.random = random.Random(seed)
+        self.commRange = commRange
+        self.robotDiameter = robotDiameter
+        self.forwardStep = forwardStep
+        self.turnStep = turnStep
+        self.lightSource = lightSource
+        self.lightIntensity = lightIntensity
+        self.lightScale = lightScale
+        self.spacing = spacing
+
+        # robot state (indexed by uid), the robot with uid 0 is always present (just like the first robot of a V-REP scene)
+        self.x = [0.0]
+        self.y = [0.0]
+        self.theta = [self.random.uniform(-math.pi, math.pi)]
+        self.motion = [vrep_bridge.Motion.stop]
+        self.led_rgb = [[0, 0, 0]]
+
+        self.grid = {} # dictionary {(cell_x, cell_y): [robot_uid, ...]}
+        self.gridDirty = True # True if the robots have moved since the last grid update
+        self.nrCollisions = 0 # nr of movements that were blocked because they would have caused a collision
+    # end __init__()
+
+    def spawnRobots(self, nr = 1, spawnType = vrep_bridge.SpawnType.ox_plus):
+        """Add nr robots to the simulated arena, next to the robots that are already present
+
+        :nr: number of robots to spawn
+        :spawnType: vrep_bridge.SpawnType used to determine the placement of the robots"""
+        total = len(self.x) + nr
+        for uid in range(len(self.x), total):
+            if (spawnType == getattr(vrep_bridge.SpawnType, "circular", None)):
+                # place all robots on a circle that allows spacing between neighbours
+                radius = max(self.spacing * total / (2 * math.pi), self.spacing)
+                angle = 2 * math.pi * uid / total
+                x, y = radius * math.cos(angle), radius * math.sin(angle)
+            else:
+                # place robots on a square grid along the positive OX axis
+                columns = max(int(math.ceil(math.sqrt(total))), 1)
+                x, y = self.spacing * (uid % columns), self.spacing * (uid // columns)
+            self.x.append(x)
+            self.y.append(y)
+            self.theta.append(self.random.uniform(-math.pi, math.pi))
+            self.motion.append(vrep_bridge.Motion.stop)
+            self.led_rgb.append([0, 0, 0])
+        self.gridDirty = True
+        logging.info("KinematicBridge spawned %d robots (total = %d)" % (nr, total))
+    # end spawnRobots()
+
+    def removeRobots(self):
+        """Remove all spawned robots from the arena (the robot with uid 0 is kept)"""
+        for attribute in (self.x, self.y, self.theta, self.motion, self.led_rgb):
+            del attribute[1:]
+        self.gridDirty = True
+    # end removeRobots()
+
+    def getKnownRobotIds(self, uid):
+        """Return the list of robot IDs known (friend) to robot uid: the robots within communication range, whose IR
+        broadcast robot uid can receive (uses the spatial grid, so the cost does not depend on the size of the swarm)
+
+        :uid: the unique id of the robot
+        :returns: sorted list of robot uids"""
+        return sorted(self.getNeighbours(uid, self.commRange))
+    # end getKnownRobotIds()
+
+    def getAllKnownRobotIds(self, uids):
+        """Batched variant of getKnownRobotIds()
+
+        :returns: dictionary {robot_uid: list of robot uids}"""
+        return {uid: self.getKnownRobotIds(uid) for uid in uids}
+    # end getAllKnownRobotIds()
+
+    def updateGrid(self):
+        """Rebuild the spatial grid used for neighbour queries"""
+        self.grid = {}
+        cellSize = self.commRange
+        for uid in range(len(self.x)):
+            self.grid.setdefault((int(math.floor(self.x[uid] / cellSize)), int(math.floor(self.y[uid] / cellSize))), []).append(uid)
+        self.gridDirty = False
+    # end updateGrid()
+
+    def getNeighbours(self, uid, maxDistance, refresh = True):
+        """Return the neighbours of robot uid that are closer than maxDistance (maxDistance <= commRange)
+
+        :refresh: rebuild the grid if robots have moved since the last update. Robots move much less than a grid cell
+            during one control step, so a stale grid is still accurate enough for collision checks
+        :returns: dictionary {robot_uid: distance}"""
+        if (refresh and self.gridDirty):
+            self.updateGrid()
+        x, y = self.x[uid], self.y[uid]
+        cellX, cellY = int(math.floor(x / self.commRange)), int(math.floor(y / self.commRange))
+        result = {}
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in self.grid.get((cellX + dx, cellY + dy), ()):
+                    if (other == uid):
+                        continue
+                    d = math.hypot(self.x[other] - x, self.y[other] - y)
+                    if (d <= maxDistance):
+                        result[other] = d
+        return result
+    # end getNeighbours()
+
+    def getState(self, uid):
+        """Return the raw input state of robot uid, in the same format as vrep_bridge.VrepBridge.getState()
+
+        :returns: dictionary {"distances": {robot_uid: distance}, "light": light_intensity}"""
+        distances = {other: int(round(d)) for other, d in self.getNeighbours(uid, self.commRange).items()}
+        d = math.hypot(self.x[uid] - self.lightSource[0], self.y[uid] - self.lightSource[1])
+        light = int(self.lightIntensity / (1.0 + d / self.lightScale))
+        return {"distances": distances, "light": light}
+    # end getState()
+
+    def getStates(self, uids):
+        """Batched variant of getState()
+
+        :returns: dictionary {robot_uid: raw_input_state}"""
+        return {uid: self.getState(uid) for uid in uids}
+    # end getStates()
+
+    def setState(self, uid, motion, led_rgb):
+        """Apply a motion and led command to robot uid and advance the robot by one control step.
+        Only robot uid is advanced, so when commands are sent only to some of the robots (delta encoded outputs) setStates()
+        must be used instead"""
+        self.motion[uid] = motion
+        self.led_rgb[uid] = led_rgb
+        self.move(uid)
+    # end setState()
+
+    def setStates(self, outputs):
+        """Batched variant of setState(). The robots that are not present in outputs keep executing their last motion command
+        (like a Kilobot that does not receive a new command), so all the robots are advanced by one control step
+
+        :outputs: dictionary {robot_uid: (motion, led_rgb)}"""
+        for uid, (motion, led_rgb) in outputs.items():
+            self.motion[uid] = motion
+            self.led_rgb[uid] = led_rgb
+        for uid in range(len(self.x)):
+            self.move(uid)
+    # end setStates()
+
+    def move(self, uid):
+        """Advance robot uid by one control step, according to its current motion command"""
+        motion = self.motion[uid]
+        if (motion == vrep_bridge.Motion.stop):
+            return
+
+        if (motion == vrep_bridge.Motion.left):
+            self.theta[uid] += self.turnStep
+            return
+        elif (motion == vrep_bridge.Motion.right):
+            self.theta[uid] -= self.turnStep
+            return
+
+        # Motion.forward
+        newX = self.x[uid] + self.forwardStep * math.cos(self.theta[uid])
+        newY = self.y[uid] + self.forwardStep * math.sin(self.theta[uid])
+        oldX, oldY = self.x[uid], self.y[uid]
+        self.x[uid], self.y[uid] = newX, newY
+        # block the movement if it would bring the robot into contact with another robot
+        for other, d in self.getNeighbours(uid, self.robotDiameter, refresh = False).items():
+            if (d < math.hypot(self.x[other] - oldX, self.y[other] - oldY)):
+                self.x[uid], self.y[uid] = oldX, oldY
+                self.nrCollisions += 1
+                return
+        self.gridDirty = True
+    # end move()
+# end class KinematicBridge
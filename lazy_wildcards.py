@@ -0,0 +1,147 @@
+import logging
+import collections
+from copy import deepcopy # for deepcopy (value not reference as = does for objects)
+
+def isWildcard(value):
+    """Return True if value is a wildcard object name (ex S_*)"""
+    return isinstance(value, str) and value.endswith("*")
+# end isWildcard()
+
+def isWildcardProgram(program):
+    """Return True if at least one rule of the program uses a wildcard object"""
+    return any(isWildcard(value) for rule in program.rules for value in vars(rule).values())
+# end isWildcardProgram()
+
+class TrackedMultiset(collections.Counter):
+
+    """Counter that records the objects added to it (keys that were not present), so that the new objects of a large
+    multiset (ex a Pcolony environment that contains all the id_* known robot IDs) can be found without examining all of it"""
+
+    def __init__(self, *args, **kwargs):
+        self.added = [] # list of objects added since the last takeAdded()
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if (key not in self):
+            self.added.append(key)
+        super().__setitem__(key, value)
+
+    def takeAdded(self):
+        """Return the list of objects added since the last call and start a new list"""
+        added, self.added = self.added, []
+        return added
+    # end takeAdded()
+# end class TrackedMultiset
+
+class LazyWildcards():
+
+    """Keeps the wildcard programs of a Pcolony symbolic instead of expanding them for every robot of the swarm.
+    The wildcard objects are indexed by prefix (ex S_* -> 'S_') and the programs are materialized for a suffix (robot uid)
+    only when an object with that prefix and suffix appears at runtime. This way the size of the Pcolony depends on the
+    number of robots it actually interacts with, not on the size of the swarm.
+
+    A suffix is materialized when a matching object appears in an agent multiset or is added to the environment after the
+    first update. Objects that are already present in the environment at the first update (ex the id_* known robot IDs)
+    do not trigger materialization, so programs that only require such objects will not be expanded.
+
+    The Pcolony environment is replaced with a TrackedMultiset, so each update examines only the objects added to it since
+    the previous update instead of the whole environment. The agent multisets and the swarm global_env are small and are
+    examined completely."""
+
+    def __init__(self, colony, suffixes):
+        """
+        :colony: the Pcolony whose wildcard programs are handled by this object
+        :suffixes: list of valid suffixes (the uids of the other robots, as strings)"""
+        self.colony = colony
+        self.suffixes = set(suffixes) # set of valid suffixes
+        self.templates = {} # dictionary {agent_name: [wildcard_program, ...]}
+        self.prefixes = set() # set of wildcard object prefixes (ex {'S_', 'B_', 'id_'})
+        self.alphabetTemplates = [] # list of wildcard alphabet objects (ex ['S_*', 'B_*'])
+        self.materialized = set() # set of suffixes for which the programs have been materialized
+        self.examined = None # set of object names that have already been examined (initialized with the environment at the first update)
+
+        for agentName, agent in colony.agents.items():
+            self.templates[agentName] = [program for program in agent.programs if isWildcardProgram(program)]
+            # the agent keeps only the concrete programs
+            agent.programs = [program for program in agent.programs if not isWildcardProgram(program)]
+            for program in self.templates[agentName]:
+                for rule in program.rules:
+                    self.prefixes.update(value[:-1] for value in vars(rule).values() if isWildcard(value))
+
+        self.alphabetTemplates = [obj for obj in colony.A if isWildcard(obj)]
+        colony.A = [obj for obj in colony.A if not isWildcard(obj)]
+        self.prefixes.update(obj[:-1] for obj in self.alphabetTemplates)
+        # longer prefixes first, so that the suffix of an object is determined by the most specific prefix
+        self.prefixList = sorted(self.prefixes, key = len, reverse = True)
+
+        logging.debug("LazyWildcards: %d wildcard programs, prefixes = %s" % (sum(len(t) for t in self.templates.values()), self.prefixList))
+    # end __init__()
+
+    def suffixOf(self, obj):
+        """Return the valid suffix of a wildcard object name (ex '5' for S_5) or None"""
+        for prefix in self.prefixList:
+            if (obj.startswith(prefix)):
+                suffix = obj[len(prefix):]
+                if (suffix in self.suffixes):
+                    return suffix
+        return None
+    # end suffixOf()
+
+    def materialize(self, suffix):
+        """Create the concrete programs and alphabet objects for the given suffix
+
+        :suffix: the suffix that replaces the * of the wildcard objects"""
+        for agentName, templates in self.templates.items():
+            for template in templates:
+                program = deepcopy(template)
+                for rule in program.rules:
+                    for attribute, value in vars(rule).items():
+                        if (isWildcard(value)):
+                            setattr(rule, attribute, value[:-1] + suffix)
+                self.colony.agents[agentName].programs.append(program)
+        self.colony.A.extend(obj[:-1] + suffix for obj in self.alphabetTemplates)
+        self.materialized.add(suffix)
+    # end materialize()
+
+    def update(self):
+        """Materialize the programs for all the new suffixes that appear in the Pcolony (called before each Pcolony step)"""
+        env = self.colony.env
+        multisets = [agent.obj for agent in self.colony.agents.values()]
+        parentSwarm = getattr(self.colony, "parentSwarm", None)
+        if (parentSwarm is not None):
+            multisets.append(parentSwarm.global_env)
+
+        if (isinstance(env, TrackedMultiset)):
+            # only the objects added to the environment since the previous update (and still present)
+            candidates = [obj for obj in env.takeAdded() if obj not in self.examined and obj in env]
+        else:
+            # first update (or the environment was replaced): the environment is examined once and tracked from now on
+            env = self.colony.env = TrackedMultiset(env)
+            env.takeAdded()
+            candidates = list(env)
+            # the objects present in the environment before the first step are never examined
+            if (self.examined is None):
+                self.examined = set(env)
+                if (parentSwarm is not None):
+                    self.examined.update(parentSwarm.global_env)
+                candidates = []
+
+        for multiset in multisets:
+            # only objects that have not been seen before are examined
+            candidates.extend(multiset.keys() - self.examined)
+
+        newSuffixes = set()
+        for obj in candidates:
+            if (obj in self.examined):
+                continue
+            self.examined.add(obj)
+            suffix = self.suffixOf(obj)
+            if (suffix is not None and suffix not in self.materialized):
+                newSuffixes.add(suffix)
+
+        # sorted to obtain the same program order regardless of set iteration order
+        for suffix in sorted(newSuffixes, key = lambda s: (len(s), s)):
+            logging.debug("LazyWildcards: materializing suffix %s" % suffix)
+            self.materialize(suffix)
+    # end update()
+# end class LazyWildcards
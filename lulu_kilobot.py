@@ -3,190 +3,363 @@ import colorlog # colors log output
 from vrep_bridge import vrep_bridge # for getState, setState
 from lulu_pcol_sim import sim
 import sys # for argv, stdout
-from copy import deepcopy # for deepcopy (value not reference as = does for objects)
+import random # for seed
+import asyncio # for asyncio.run
+from copy import copy, deepcopy # for copy (shallow) and deepcopy (value not reference as = does for objects)
+from kinematic_bridge import KinematicBridge # headless stand-in for vrep_bridge.VrepBridge
+from vrep_batch import BatchedVrepBridge # batched calls for vrep_bridge.VrepBridge
+from parallel_swarm import ParallelSwarm # parallel stepping of Pcolonies
+from lazy_wildcards import LazyWildcards # runtime expansion of wildcard programs
+from neighbour_index import NeighbourIndex # incremental distance index
+from swarm_state import SwarmState, OutputStateView, stateAttribute # structure of arrays storage of the robot state
+from async_control import AsyncControlLoop # fixed rate control loop
+from step_metrics import StepMetrics # timing of the control step phases
+from time import perf_counter, sleep # for timing the control step phases, polling the bridge
+from sensor_trace import TraceRecorder, ReplayBridge # recording and replay of the sensor readings
+from startup_cache import StartupCache, DEFAULT_CACHE_DIR # snapshot of the prepared P system
+from event_scheduler import EventScheduler # event driven stepping
+
+LAUNCH_TIME = perf_counter() # reference time of the launch to first step measurement (import of this module)
+
+# msg_distance request types
+REQUEST_D_ALL = 0 # d_all - is any robot closer than the threshold?
+REQUEST_D_NEXT = 1 # d_next - distance from the next neighbour (round robin)
+REQUEST_D_MIN = 2 # d_min - distance from the closest neighbour
+REQUEST_D_UID = 3 # d_uid - distance from robot uid
+REQUEST_V_UID = 4 # v_uid - distance variation for robot uid
+
+requestTable = {} # dictionary {object_name: (request_type, uid) or None} of already parsed msg_distance objects
+
+def parseRequest(obj):
+    """Parse a msg_distance object name into a request
+
+    :obj: the object name (ex d_all, d_5, v_3)
+    :returns: (request_type, uid) tuple (uid is None for d_all / d_next / d_min) or None if obj is not a request"""
+    if (not (obj.startswith("d_") or obj.startswith("v_"))):
+        return None
+    cmd, arg = obj.split('_')[0:2]
+    if (cmd == 'd' and arg == "all"):
+        return (REQUEST_D_ALL, None)
+    elif (cmd == 'd' and arg == "next"):
+        return (REQUEST_D_NEXT, None)
+    elif (cmd == 'd' and arg == "min"):
+        return (REQUEST_D_MIN, None)
+    elif (not arg.isdigit()):
+        logging.warning("Unknown msg_distance request %s" % obj)
+        return None
+    elif (cmd == 'd'):
+        return (REQUEST_D_UID, int(arg))
+    else:
+        return (REQUEST_V_UID, int(arg))
+# end parseRequest()
+
+# indexes of the reply symbols returned by getReplySymbols()
+REPLY_S, REPLY_B, REPLY_V_M, REPLY_V_P, REPLY_V_0 = range(5)
+
+# The reply objects are not given integer symbol ids: the multisets and rules of lulu_pcol_sim are keyed by object name, so
+# an id would have to be translated back to its name before every multiset access. The names are instead built once per
+# robot and interned (sys.intern), so the control step does no string formatting and the hash of each name is cached.
+
+replySymbols = {} # dictionary {robot_uid: (S_uid, B_uid, V_uid_m, V_uid_p, V_uid_0)}
+
+def generateReplySymbols(uids):
+    """Pre-generate the msg_distance reply object names for the given robots
+
+    :uids: iterable of robot uids"""
+    for uid in uids:
+        replySymbols[uid] = tuple(sys.intern(name % uid) for name in ("S_%d", "B_%d", "V_%d_m", "V_%d_p", "V_%d_0"))
+# end generateReplySymbols()
+
+def getReplySymbols(uid):
+    """Return the msg_distance reply object names for robot uid (REPLY_* are the indexes in the returned tuple)"""
+    try:
+        return replySymbols[uid]
+    except KeyError:
+        generateReplySymbols((uid,))
+        return replySymbols[uid]
+# end getReplySymbols()
 
 class Kilobot():
 
-    """Class used to store the state of a Kilobot robot for use in a controller that used Pcolonies."""
-
-    def __init__(self, uid, pcolony):
-        self.uid = uid # the unique id of the robot 
-        self.colony = pcolony # reference to the Pcolony used to control this robot
-        self.raw_input_state = {} # dictionary of raw sensor values
-        self.output_state = {
-                "motion" : vrep_bridge.Motion.stop, # motion (vrep_bridge.Motion) motion type
-                "led_rgb" : [0, 0, 0] # light [r, g, b] with values between 0-2
-                } # dictionary of output states
-        self.distances = {} # dictionary of the most recent distance measurements = {robot_uid: distance}
-        self.distances_prev = {} # dictionary of previous distance measurements = {robot_uid: distance}
-        self.light = -1 # current light intensity
-        self.light_prev = -1 # previous light intensity
-        self.known_robots = [] # list of known (friend) robot IDs
-        self.neighbour_ids = [] # list of robot IDs that I have recently received a msg from
-        self.neighbour_index = 0 # current position on neighbour_ids[]
+    """Class used to store the state of a Kilobot robot for use in a controller that used Pcolonies.
+    The state is stored in a SwarmState (shared by all the robots of a swarm), the Kilobot object is only a view over it."""
+
+    __slots__ = ("uid", "state", "index")
+
+    raw_input_state = stateAttribute("raw_input_state", "dictionary of raw sensor values")
+    neighbours = stateAttribute("neighbours", "index of the most recent and previous distance measurements")
+    sensorView = stateAttribute("sensorView", "SensorView of the swarm level SwarmSensorArrays (None if the readings are processed per robot)")
+    known_robots = stateAttribute("known_robots", "list of known (friend) robot IDs")
+    neighbour_index = stateAttribute("neighbour_index", "current position on neighbour_ids[]")
+    lazyWildcards = stateAttribute("lazyWildcards", "LazyWildcards object used instead of the eager wildcard expansion (None if not used)")
+    lightSensorAgent = stateAttribute("lightSensorAgent", "the light_sensor agent of the Pcolony (None if it is not defined)")
+    msgDistanceAgent = stateAttribute("msgDistanceAgent", "the msg_distance agent of the Pcolony (None if it is not defined)")
+    motionAgent = stateAttribute("motionAgent", "the motion agent of the Pcolony (None if it is not defined)")
+    ledAgent = stateAttribute("ledAgent", "the led_rgb agent of the Pcolony (None if it is not defined)")
+
+    def __init__(self, uid, pcolony, state = None, index = None):
+        """
+        :uid: the unique id of the robot
+        :pcolony: the Pcolony used to control this robot
+        :state: the SwarmState that stores the state of this robot (None = a SwarmState is created for this robot only)
+        :index: the index of this robot in state (None = uid)"""
+        if (state is None):
+            state, index = SwarmState(1), 0
+        self.uid = uid # the unique id of the robot
+        self.state = state # SwarmState that stores the state of this robot
+        self.index = uid if index is None else index # index of this robot in the SwarmState arrays
+        self.colony = pcolony
     # end __init__()
 
+    @property
+    def colony(self):
+        """Reference to the Pcolony used to control this robot"""
+        return self.state.colony[self.index]
+
+    @colony.setter
+    def colony(self, colony):
+        self.state.colony[self.index] = colony
+        self.bindAgents()
+
+    def bindAgents(self):
+        """Store direct references to the input and output module agents of the Pcolony, so that the control step does not
+        search them by name (called every time the Pcolony of the robot is assigned)"""
+        colony = self.colony
+        agents = {} if colony is None else {agentName: colony.agents[agentName] for agentName in colony.B
+                if agentName in ('light_sensor', 'msg_distance', 'motion', 'led_rgb')}
+        self.lightSensorAgent = agents.get('light_sensor')
+        self.msgDistanceAgent = agents.get('msg_distance')
+        self.motionAgent = agents.get('motion')
+        self.ledAgent = agents.get('led_rgb')
+    # end bindAgents()
+
+    @property
+    def motion(self):
+        """Motion (vrep_bridge.Motion) motion type"""
+        return self.state.motions[self.state.motion[self.index]]
+
+    @motion.setter
+    def motion(self, motion):
+        self.state.motion[self.index] = self.state.motionCode[motion]
+
+    @property
+    def led_rgb(self):
+        """Light [r, g, b] with values between 0-2"""
+        return list(self.state.led_rgb[3 * self.index:3 * self.index + 3])
+
+    @led_rgb.setter
+    def led_rgb(self, led_rgb):
+        self.state.led_rgb[3 * self.index:3 * self.index + 3] = bytes(led_rgb)
+
+    @property
+    def output_state(self):
+        """Dictionary of output states = {"motion": motion, "led_rgb": [r, g, b]}"""
+        return OutputStateView(self)
+
+    @output_state.setter
+    def output_state(self, output_state):
+        self.motion = output_state["motion"]
+        self.led_rgb = output_state["led_rgb"]
+
+    @property
+    def sensors(self):
+        """The object that answers the distance queries (SensorView if set, NeighbourIndex otherwise)"""
+        return self.sensorView if self.sensorView is not None else self.neighbours
+
+    @property
+    def distances(self):
+        """Dictionary of the most recent distance measurements = {robot_uid: distance}"""
+        return self.sensors.distances
+
+    @property
+    def distances_prev(self):
+        """Dictionary of previous distance measurements = {robot_uid: distance}"""
+        return self.sensors.distances_prev
+
+    @property
+    def light(self):
+        """Current light intensity (read from the SensorView if set)"""
+        sensorView = self.sensorView
+        return self.state.light[self.index] if sensorView is None else sensorView.light
+
+    @light.setter
+    def light(self, light):
+        self.state.light[self.index] = light
+
+    @property
+    def light_prev(self):
+        """Previous light intensity (read from the SensorView if set)"""
+        sensorView = self.sensorView
+        return self.state.light_prev[self.index] if sensorView is None else sensorView.light_prev
+
+    @light_prev.setter
+    def light_prev(self, light_prev):
+        self.state.light_prev[self.index] = light_prev
+
+    @property
+    def neighbour_ids(self):
+        """List of robot IDs that I have recently received a msg from"""
+        return self.sensors.order
+
+    def clearDistances(self):
+        """Clear the distance history (all neighbours are forgotten)"""
+        self.sensors.clear()
+    # end clearDistances()
+
     def procInputModule(self, paramLightThreshold = 20, paramDistanceThreshold = 55):
         """Process raw_state info received from sensors and populate the input module agents with significant objects
 
         :paramLightThreshold: light threshold value used to classify a light sensor reading as low or high
         :paramDistanceThreshold: distance threshold value used to classify a distance from a robot as small or big"""
 
-        for uid, d in self.raw_input_state["distances"].items():
-            # if I already have a distance from this robot
-            if (uid in self.distances):
-                # update previous distances
-                self.distances_prev[uid] = self.distances[uid]
-                # store the new distance
-                self.distances[uid] = d
-            # if this is the first time I receive a measurement from this robot
-            else:
-                self.distances[uid] = self.distances_prev[uid] = d
-
-        # if this is not the first light intensity measurement
-        if (self.light != -1):
-            self.light_prev = self.light
-            self.light = self.raw_input_state["light"]
-        # this is the first time I receive a light intensity measurement
+        sensorView = self.sensorView
+        # the readings have already been stored and classified at swarm level (SwarmSensorArrays)
+        if (sensorView is not None):
+            neighbours = sensorView
+            lightSmall = neighbours.lightSmall
+            lightVariation = neighbours.lightVariation
         else:
-            self.light = self.light_prev = self.raw_input_state["light"]
+            neighbours = self.neighbours
+            # store the new distances (the previous ones become distances_prev)
+            neighbours.update(self.raw_input_state["distances"])
+
+            light = self.raw_input_state["light"]
+            # if this is not the first light intensity measurement
+            if (self.light != -1):
+                light_prev = self.light
+            # this is the first time I receive a light intensity measurement
+            else:
+                light_prev = light
+            self.light, self.light_prev = light, light_prev
+            lightSmall = light <= paramLightThreshold
+            lightVariation = (light > light_prev) - (light < light_prev)
 
         # if the light_sensor agent is defined
-        if ('light_sensor' in self.colony.B):
+        lightAgent = self.lightSensorAgent
+        if (lightAgent is not None):
+            lightObj = lightAgent.obj
             # transfer numeric light intensity measurements to symbolic values
-            for o in self.colony.agents['light_sensor'].obj:
+            for o in list(lightObj):
                 # l == what is the current light value? (low / high)
                 if (o == 'l'):
                     # delete the request object and replace it with the reply object
                     # in order to reduce the number of sim steps needed
-                    del self.colony.agents['light_sensor'].obj[o]
+                    del lightObj[o]
 
-                    if (self.light <= paramLightThreshold):
-                        self.colony.agents['light_sensor'].obj['S'] = 1 # light intensity low
+                    if (lightSmall):
+                        lightObj['S'] = 1 # light intensity low
                     else:
-                        self.colony.agents['light_sensor'].obj['B'] = 1 # light intensity high
+                        lightObj['B'] = 1 # light intensity high
 
                 # r == what is the light variation? (decrease / increase / constant)
                 elif (o == 'r'):
                     # delete the request object and replace it with the reply object
                     # in order to reduce the number of sim steps needed
-                    del self.colony.agents['light_sensor'].obj[o]
+                    del lightObj[o]
 
-                    if (self.light < self.light_prev):
-                        self.colony.agents['light_sensor'].obj['R_m'] = 1 # light intensity decreasing
-                    elif (self.light > self.light_prev):
-                        self.colony.agents['light_sensor'].obj['R_p'] = 1 # light intensity increasing
+                    if (lightVariation < 0):
+                        lightObj['R_m'] = 1 # light intensity decreasing
+                    elif (lightVariation > 0):
+                        lightObj['R_p'] = 1 # light intensity increasing
                     else:
-                        self.colony.agents['light_sensor'].obj['R_0'] = 1 # light intensity constant
+                        lightObj['R_0'] = 1 # light intensity constant
 
         # if the msg_distance agent is defined
-        if ('msg_distance' in self.colony.B):
+        msgAgent = self.msgDistanceAgent
+        if (msgAgent is not None):
+            msgObj = msgAgent.obj
             # transfer numeric distance measurements to symbolic values
-            for o in self.colony.agents['msg_distance'].obj:
+            for o in list(msgObj):
                 # commands are directed to a certain uid (cmdName_uid) ex v_5
-                if (o.startswith("d_") or o.startswith("v_")):
-                    cmd = o.split('_')[0]
-                    uid = o.split('_')[1]
-
-                    # delete the request object and replace it with the reply object
-                    # in order to reduce the number of sim steps needed
-                    del self.colony.agents['msg_distance'].obj[o]
-
-                    # what is the current distance from robot x? (small / big)
-                    if (cmd == 'd'):
-                        # determine the minimum distance from all my neighbours
-                        if (uid == "all"):
-                            dist_big = True # consider all robots to be distant
-                            for uid, d in self.distances.items():
-                                # if one of the received distances is short
-                                if (d <= paramDistanceThreshold):
-                                    # the minimum distance is short
-                                    dist_big = False
-                                    break
-                            # if no robot was closer than the threshold
-                            if (dist_big):
-                                self.colony.agents['msg_distance'].obj["B_all"] = 1 # distance big
-                            else:
-                                self.colony.agents['msg_distance'].obj["S_all"] = 1 # distance small (at least one robot is close)
-
-                        # determine the distance from the next robot in the distances dictionary
-                        # this way command can individually test distances, without requesting individual robot IDs
-                        elif (uid == "next"):
-                            # extract current neighbour ids from the distances dictionary
-                            self.neighbour_ids = list(self.distances.keys())
-                            # if we have neighbour robots around us
-                            if (len(self.neighbour_ids) > 0):
-                                # reset neighbour_index if it exceeds the list length
-                                if (self.neighbour_index >= len(self.neighbour_ids)):
-                                    self.neighbour_index = 0
-
-                                #logging.debug("Publishing distance for robot id = %d" % self.neighbour_ids[self.neighbour_index])
-                                if (self.distances[self.neighbour_ids[self.neighbour_index]] <= paramDistanceThreshold):
-                                    self.colony.agents['msg_distance'].obj["S_%d" % self.neighbour_ids[self.neighbour_index]] = 1 # distance small
-                                    #logging.info("[procInputModule (%d)] d_next -> S_%d, distances = %s" % (self.uid, self.neighbour_ids[self.neighbour_index], self.distances))
-                                else:
-                                    self.colony.agents['msg_distance'].obj["B_%d" % self.neighbour_ids[self.neighbour_index]] = 1 # distance big
-                                    #logging.info("[procInputModule (%d)] d_next -> B_%d, distances = %s" % (self.uid, self.neighbour_ids[self.neighbour_index], self.distances))
-
-                                self.neighbour_index += 1
-
-                            # we are far away from all robots
-                            else:
-                                # publish distance big (from all robots) as response to the d_next request
-                                self.colony.agents['msg_distance'].obj["B_all"] = 1 # distance big
-                                #logging.info("[procInputModule (%d)] d_next -> B_all" % self.uid)
-
-                        # determine the minimum distance from all the robots in the current distances dictionary
-                        # this way command can individually test distances, without requesting individual robot IDs
-                        # and also react immediately if a robot is close
-                        elif (uid == "min"):
-                            # if we have neighbour robots around us
-                            if (len(self.distances) > 0):
-                                # get the key (id) of the minimum distance in the distances dictionary)
-                                self.neighbour_index = min(self.distances, key=self.distances.get)
-
-                                #logging.debug("Publishing distance for robot id = %d" % self.neighbour_index)
-                                if (self.distances[self.neighbour_index] <= paramDistanceThreshold):
-                                    self.colony.agents['msg_distance'].obj["S_%d" % self.neighbour_index] = 1 # distance small
-                                    #logging.info("[procInputModule (%d)] d_next -> S_%d, distances = %s" % (self.uid, self.neighbour_index, self.distances))
-                                else:
-                                    self.colony.agents['msg_distance'].obj["B_%d" % self.neighbour_index] = 1 # distance big
-                                    #logging.info("[procInputModule (%d)] d_next -> B_%d, distances = %s" % (self.uid, self.neighbour_index, self.distances))
-
-                            # we are far away from all robots
-                            else:
-                                # publish distance big (from all robots) as response to the d_min request
-                                self.colony.agents['msg_distance'].obj["B_all"] = 1 # distance big
-                                #logging.info("[procInputModule (%d)] d_next -> B_all" % self.uid)
-
-                        # determine the distance from a specific robot:
+                # the object name is parsed only the first time it is encountered
+                try:
+                    request = requestTable[o]
+                except KeyError:
+                    request = requestTable[o] = parseRequest(o)
+                if (request is None):
+                    continue
+                cmd, uid = request
+
+                # delete the request object and replace it with the reply object
+                # in order to reduce the number of sim steps needed
+                del msgObj[o]
+
+                # what is the current distance from robot x? (small / big)
+                # determine the minimum distance from all my neighbours
+                if (cmd == REQUEST_D_ALL):
+                    # if no robot was closer than the threshold
+                    if (not neighbours.anySmall(paramDistanceThreshold)):
+                        msgObj["B_all"] = 1 # distance big
+                    else:
+                        msgObj["S_all"] = 1 # distance small (at least one robot is close)
+
+                # determine the distance from the next robot in the distances dictionary
+                # this way command can individually test distances, without requesting individual robot IDs
+                elif (cmd == REQUEST_D_NEXT):
+                    # neighbour ids in the order of their first measurement (only appended to, so the order is stable)
+                    neighbour_ids = neighbours.order
+                    # if we have neighbour robots around us
+                    if (len(neighbour_ids) > 0):
+                        # reset neighbour_index if it exceeds the list length
+                        if (self.neighbour_index >= len(neighbour_ids)):
+                            self.neighbour_index = 0
+
+                        neighbour = neighbour_ids[self.neighbour_index]
+                        if (neighbours.isSmall(neighbour, paramDistanceThreshold)):
+                            msgObj[getReplySymbols(neighbour)[REPLY_S]] = 1 # distance small
                         else:
-                            uid = int(uid)
-                            # if I have any measurements of robot uid
-                            if (uid in self.distances):
-                                if (self.distances[uid] <= paramDistanceThreshold):
-                                    self.colony.agents['msg_distance'].obj["S_%d" % uid] = 1 # distance small
-                                elif (self.distances[uid] > paramDistanceThreshold):
-                                    self.colony.agents['msg_distance'].obj["B_%d" % uid] = 1 # distance big
-                            # there are no measurements of robot uid
-                            else:
-                                # publish distance big to not confuse agents that are waiting for info
-                                self.colony.agents['msg_distance'].obj["B_%d" % uid] = 1 # distance big
-
-                    # what is the distance variation for robot x? (decrease / increase / constant)
-                    elif (cmd == 'v'):
-                        # if I have any measurements of robot uid
-                        if (uid in self.distances):
-                            if (self.distances[uid] < self.distances_prev[uid]):
-                                self.colony.agents['msg_distance'].obj["V_%d_m" % uid] = 1 # distance decreasing
-                            elif (self.distances[uid] > self.distances_prev[uid]):
-                                self.colony.agents['msg_distance'].obj["V_%d_p" % uid] = 1 # distance increasing
-                            else:
-                                self.colony.agents['msg_distance'].obj["V_%d_0" % uid] = 1 # distance constant
-                        # there are no measurements of robot uid
+                            msgObj[getReplySymbols(neighbour)[REPLY_B]] = 1 # distance big
+
+                        self.neighbour_index += 1
+
+                    # we are far away from all robots
+                    else:
+                        # publish distance big (from all robots) as response to the d_next request
+                        msgObj["B_all"] = 1 # distance big
+
+                # determine the minimum distance from all the robots in the current distances dictionary
+                # this way command can individually test distances, without requesting individual robot IDs
+                # and also react immediately if a robot is close
+                elif (cmd == REQUEST_D_MIN):
+                    # if we have neighbour robots around us
+                    closest = neighbours.minNeighbour()
+                    if (closest is not None):
+                        # the id of the minimum distance
+                        self.neighbour_index = closest
+
+                        if (neighbours.isSmall(closest, paramDistanceThreshold)):
+                            msgObj[getReplySymbols(self.neighbour_index)[REPLY_S]] = 1 # distance small
                         else:
-                            # publish distance constant to not confuse agents that are waiting for info
-                            self.colony.agents['msg_distance'].obj["V_%d_0" % uid] = 1 # distance constant
+                            msgObj[getReplySymbols(self.neighbour_index)[REPLY_B]] = 1 # distance big
+
+                    # we are far away from all robots
+                    else:
+                        # publish distance big (from all robots) as response to the d_min request
+                        msgObj["B_all"] = 1 # distance big
+
+                # determine the distance from a specific robot:
+                elif (cmd == REQUEST_D_UID):
+                    # if I have any measurements of robot uid
+                    if (neighbours.isSmall(uid, paramDistanceThreshold)):
+                        msgObj[getReplySymbols(uid)[REPLY_S]] = 1 # distance small
+                    # there are no measurements of robot uid (publish distance big to not confuse agents that are waiting for info)
+                    else:
+                        msgObj[getReplySymbols(uid)[REPLY_B]] = 1 # distance big
+
+                # what is the distance variation for robot x? (decrease / increase / constant)
+                elif (cmd == REQUEST_V_UID):
+                    # if there are no measurements of robot uid, distance constant is published to not confuse agents that are waiting for info
+                    variation = neighbours.variation(uid)
+                    if (variation < 0):
+                        msgObj[getReplySymbols(uid)[REPLY_V_M]] = 1 # distance decreasing
+                    elif (variation > 0):
+                        msgObj[getReplySymbols(uid)[REPLY_V_P]] = 1 # distance increasing
+                    else:
+                        msgObj[getReplySymbols(uid)[REPLY_V_0]] = 1 # distance constant
+
+        # materialize the wildcard programs needed by the newly published objects
+        if (self.lazyWildcards is not None):
+            self.lazyWildcards.update()
     # end procInputModule()
 
     def procOutputModule(self, defineDefaultMotion = True):
@@ -195,35 +368,339 @@ class Kilobot():
         # this causes the robots to move in a STEPPED manner (due to the fact that the previous motion / led command 
         # is cancelled by the default command
         if (defineDefaultMotion):
-            self.output_state["motion"] = vrep_bridge.Motion.stop # default motion
-            self.output_state["led_rgb"] = [0, 0, 0] # default color (off)
+            motion = vrep_bridge.Motion.stop # default motion
+            led_rgb = [0, 0, 0] # default color (off)
+        else:
+            motion = self.motion
+            led_rgb = None # keep the current color
 
         # if the 'motion' agent is defined
-        if ('motion' in self.colony.B):
-            if ('m_0' in self.colony.agents['motion'].obj):
-                self.output_state["motion"] = vrep_bridge.Motion.stop
-            if ('m_S' in self.colony.agents['motion'].obj):
-                self.output_state["motion"] = vrep_bridge.Motion.forward
-            elif ('m_L' in self.colony.agents['motion'].obj):
-                self.output_state["motion"] = vrep_bridge.Motion.left
-            elif ('m_R' in self.colony.agents['motion'].obj):
-                self.output_state["motion"] = vrep_bridge.Motion.right
+        motionAgent = self.motionAgent
+        if (motionAgent is not None):
+            motionObj = motionAgent.obj
+            if ('m_0' in motionObj):
+                motion = vrep_bridge.Motion.stop
+            if ('m_S' in motionObj):
+                motion = vrep_bridge.Motion.forward
+            elif ('m_L' in motionObj):
+                motion = vrep_bridge.Motion.left
+            elif ('m_R' in motionObj):
+                motion = vrep_bridge.Motion.right
 
         # if the 'led_rgb' agent is defined
-        if ('led_rgb' in self.colony.B):
-            if ('c_R' in self.colony.agents["led_rgb"].obj):
-                self.output_state["led_rgb"] = vrep_bridge.Led_rgb.red
-            elif ('c_G' in self.colony.agents["led_rgb"].obj):
-                self.output_state["led_rgb"] = vrep_bridge.Led_rgb.green
-            elif ('c_B' in self.colony.agents["led_rgb"].obj):
-                self.output_state["led_rgb"] = vrep_bridge.Led_rgb.blue
-            elif ('c_W' in self.colony.agents["led_rgb"].obj):
-                self.output_state["led_rgb"] = vrep_bridge.Led_rgb.white
+        ledAgent = self.ledAgent
+        if (ledAgent is not None):
+            ledObj = ledAgent.obj
+            if ('c_R' in ledObj):
+                led_rgb = vrep_bridge.Led_rgb.red
+            elif ('c_G' in ledObj):
+                led_rgb = vrep_bridge.Led_rgb.green
+            elif ('c_B' in ledObj):
+                led_rgb = vrep_bridge.Led_rgb.blue
+            elif ('c_W' in ledObj):
+                led_rgb = vrep_bridge.Led_rgb.white
+
+        self.motion = motion
+        if (led_rgb is not None):
+            self.led_rgb = led_rgb
 
     #end procOutputModule()
 
 # end class Kilobot
 
+class SwarmIO():
+
+    """Swarm level I/O layer around a bridge object (vrep_bridge.VrepBridge or compatible).
+    All the raw input states are read using a single bridge call and all output states are applied using a single bridge call,
+    if the bridge provides the batched getStates() / setStates() calls (KinematicBridge, BatchedVrepBridge around a VrepBridge).
+    Otherwise the per robot getState() / setState() calls are used.
+    With delta encoded outputs, only the commands that differ from the last command sent to a robot are transmitted
+    (a batched bridge still receives one setStates() call per step, with only the changed commands)."""
+
+    def __init__(self, bridge, robots, batched = True, deltaOutputs = False, keepAlive = 0):
+        """
+        :bridge: the bridge used to communicate with the simulator
+        :robots: list of Kilobot objects
+        :batched: use the batched bridge calls if the bridge implements them
+        :deltaOutputs: send only the output states that changed since the last command sent to each robot
+        :keepAlive: with deltaOutputs, resend an unchanged command after this number of steps (0 = never)"""
+        self.bridge = bridge # reference to the bridge used to communicate with the simulator
+        self.robots = robots # list of Kilobot objects that are served by this I/O layer
+        self.uids = [robot.uid for robot in robots] # list of robot uids (in the same order as robots[])
+        # use the batched calls only if they are requested and the bridge implements them
+        self.batched = batched and hasattr(bridge, "getStates") and hasattr(bridge, "setStates")
+        self.metrics = None # StepMetrics used to time the bridge calls (None = no timing)
+        self.deltaOutputs = deltaOutputs
+        self.keepAlive = keepAlive
+        self.lastSent = {} # dictionary {robot_uid: (motion, led_rgb tuple, nr of the step in which it was sent)}
+        self.nrSteps = 0 # nr of sendOutputs() calls
+        self.nrWrites = 0 # total nr of transmitted output states
+        self.nrSuppressed = 0 # total nr of output states that were not transmitted because they did not change
+        self.stepWrites = 0 # nr of output states transmitted during the last step
+        self.stepSuppressed = 0 # nr of output states suppressed during the last step
+        logging.info("SwarmIO using %s bridge calls for %d robots" % ("batched" if self.batched else "per robot", len(robots)))
+    # end __init__()
+
+    def fetchInputs(self, metrics = None):
+        """Read the raw input state of every robot from the bridge
+
+        :metrics: StepMetrics or MetricsRecorder that receives the duration of the bridge calls (None = self.metrics)
+        :returns: dictionary {robot_uid: raw_input_state}"""
+        if (metrics is None):
+            metrics = self.metrics
+        if (metrics is None):
+            if (self.batched):
+                return self.bridge.getStates(self.uids)
+            else:
+                return {uid: self.bridge.getState(uid) for uid in self.uids}
+
+        if (self.batched):
+            start = perf_counter()
+            states = self.bridge.getStates(self.uids)
+            metrics.add("getState", perf_counter() - start)
+        else:
+            states = {}
+            for uid in self.uids:
+                start = perf_counter()
+                states[uid] = self.bridge.getState(uid)
+                metrics.addRobot("getState", uid, perf_counter() - start)
+        return states
+    # end fetchInputs()
+
+    def applyInputs(self, states):
+        """Store raw input states (returned by fetchInputs()) in Kilobot.raw_input_state"""
+        for robot in self.robots:
+            robot.raw_input_state = states[robot.uid]
+    # end applyInputs()
+
+    def readInputs(self):
+        """Read the raw input state of every robot and store it in Kilobot.raw_input_state"""
+        self.applyInputs(self.fetchInputs())
+    # end readInputs()
+
+    def collectOutputs(self):
+        """Return a snapshot of the output state of every robot
+
+        :returns: dictionary {robot_uid: (motion, led_rgb)}"""
+        return {robot.uid: (robot.motion, robot.led_rgb) for robot in self.robots}
+    # end collectOutputs()
+
+    def changedOutputs(self, outputs):
+        """Return the output states that differ from the last command sent to each robot (or that are due for a keep alive)
+        and record them as sent
+
+        :outputs: dictionary {robot_uid: (motion, led_rgb)}
+        :returns: dictionary {robot_uid: (motion, led_rgb)}"""
+        changed = {}
+        lastSent = self.lastSent
+        stepNr = self.nrSteps
+        keepAlive = self.keepAlive
+        for uid, (motion, led_rgb) in outputs.items():
+            led_rgb_tuple = tuple(led_rgb)
+            last = lastSent.get(uid)
+            if (last is None or last[0] != motion or last[1] != led_rgb_tuple or (keepAlive > 0 and stepNr - last[2] >= keepAlive)):
+                changed[uid] = (motion, led_rgb)
+                lastSent[uid] = (motion, led_rgb_tuple, stepNr)
+        return changed
+    # end changedOutputs()
+
+    def sendOutputs(self, outputs, metrics = None):
+        """Apply output states (returned by collectOutputs()) through the bridge
+
+        :metrics: StepMetrics or MetricsRecorder that receives the duration of the bridge calls (None = self.metrics)"""
+        if (self.deltaOutputs):
+            nrOutputs = len(outputs)
+            outputs = self.changedOutputs(outputs)
+            self.stepSuppressed = nrOutputs - len(outputs)
+            self.nrSuppressed += self.stepSuppressed
+            logging.debug("Step %d: %d output states sent, %d suppressed" % (self.nrSteps, len(outputs), self.stepSuppressed))
+        self.stepWrites = len(outputs)
+        self.nrWrites += self.stepWrites
+        self.nrSteps += 1
+
+        if (metrics is None):
+            metrics = self.metrics
+        if (self.batched):
+            start = perf_counter()
+            self.bridge.setStates(outputs)
+            if (metrics is not None):
+                metrics.add("setState", perf_counter() - start)
+        else:
+            for uid, (motion, led_rgb) in outputs.items():
+                start = perf_counter()
+                self.bridge.setState(uid, motion, led_rgb)
+                if (metrics is not None):
+                    metrics.addRobot("setState", uid, perf_counter() - start)
+    # end sendOutputs()
+
+    def writeOutputs(self):
+        """Apply the output state (motion and led) of every robot"""
+        self.sendOutputs(self.collectOutputs())
+    # end writeOutputs()
+
+    def printStats(self):
+        """Print the number of transmitted and suppressed output states"""
+        total = self.nrWrites + self.nrSuppressed
+        print("\nSwarmIO: %d steps, %d output states sent, %d suppressed (%.1f%%)" % (self.nrSteps, self.nrWrites,
+            self.nrSuppressed, 100.0 * self.nrSuppressed / total if total else 0))
+    # end printStats()
+# end class SwarmIO
+
+class SwarmController():
+
+    """Executes the control steps of a Pcolony / Pswarm: input module processing, P system step and output module processing"""
+
+    def __init__(self, pObj, robots, swarmIO, config = None, parallelSwarm = None, sensorArrays = None, metrics = None):
+        """
+        :pObj: the Pcolony or Pswarm that controls the robots
+        :robots: list of Kilobot objects
+        :swarmIO: SwarmIO object used to read / write the robot states
+        :config: Config object (only for Pswarms, None for Pcolonies)
+        :parallelSwarm: ParallelSwarm used to process the robots (None to process them in this process)
+        :sensorArrays: SwarmSensorArrays used to classify the sensor readings (None to classify them per robot)
+        :metrics: StepMetrics used to time the phases of each step (None = no timing)"""
+        self.pObj = pObj
+        self.robots = robots
+        self.swarmIO = swarmIO
+        self.config = config
+        self.parallelSwarm = parallelSwarm
+        self.sensorArrays = sensorArrays
+        self.metrics = metrics
+        swarmIO.metrics = metrics
+        self.recorder = None # TraceRecorder that records the inputs and outputs of every step (None = no recording)
+        self.defineDefaultMotion = True # False = keep the last motion / led command until the Pcolony changes it (continuous motion)
+        self.scheduler = None # EventScheduler that services only the robots that can change state (None = step all robots)
+        # callable that executes the P system step function it receives and returns its result, possibly restoring and executing
+        # it again (used by the shards of a ShardCoordinator to arbitrate global_env conflicts, None = execute it once)
+        self.stepArbiter = None
+        self.paramLightThreshold = 20 # passed to Kilobot.procInputModule()
+        self.paramDistanceThreshold = 55 # passed to Kilobot.procInputModule()
+        self.launchTime = None # perf_counter() value of the launch, used to report the launch to first step time (None = no report)
+        self.firstStepTime = None # time (s) from the launch to the end of the first step
+        self.simStepNr = 0
+        if (config is not None and config.fullClearDistances):
+            # the next distances reinitialization will take place after config.clearDistancesStepNr steps from now
+            self.nextClearStepNr = self.simStepNr + config.clearDistancesStepNr
+    # end __init__()
+
+    def classifySensors(self):
+        """Store and classify the raw input states of all robots at swarm level (if SwarmSensorArrays are used)"""
+        if (self.sensorArrays is not None):
+            start = perf_counter()
+            self.sensorArrays.update(self.robots)
+            self.sensorArrays.classify(self.paramLightThreshold, self.paramDistanceThreshold)
+            if (self.metrics is not None):
+                self.metrics.add("classify", perf_counter() - start)
+    # end classifySensors()
+
+    def computeStep(self):
+        """Execute one control step using the current Kilobot.raw_input_state of all robots.
+        The results are stored in Kilobot.output_state
+
+        :returns: the sim.SimStepResult of the P system step"""
+        clearDistances = False
+        if (self.config is not None and self.config.fullClearDistances):
+            if (self.simStepNr >= self.nextClearStepNr and self.config.clearDistancesStepNr > 0):
+                # the next distances reinitialization will take place after config.clearDistancesStepNr steps from now
+                self.nextClearStepNr = self.simStepNr + self.config.clearDistancesStepNr
+                logging.warning("CLEARING distances")
+                clearDistances = True
+            # end if clearStep
+
+        metrics = self.metrics
+        if (self.parallelSwarm is not None):
+            # input module, Pcolony step and output module are all processed by the workers
+            start = perf_counter()
+            sim_result = self.parallelSwarm.step(clearDistances, self.paramLightThreshold, self.paramDistanceThreshold)
+            if (metrics is not None):
+                metrics.add("parallelStep", perf_counter() - start)
+            if (sim_result != sim.SimStepResult.finished):
+                return sim_result
+        elif (self.scheduler is not None):
+            self.classifySensors()
+            # only the robots that can change state are serviced
+            start = perf_counter()
+            sim_result = self.scheduler.step(clearDistances, self.defineDefaultMotion, self.paramLightThreshold, self.paramDistanceThreshold,
+                    self.stepArbiter)
+            if (metrics is not None):
+                metrics.add("eventStep", perf_counter() - start)
+            if (sim_result != sim.SimStepResult.finished):
+                return sim_result
+        else:
+            self.classifySensors()
+
+            paramLightThreshold, paramDistanceThreshold = self.paramLightThreshold, self.paramDistanceThreshold
+            if (metrics is None):
+                for robot in self.robots:
+                    robot.procInputModule(paramLightThreshold, paramDistanceThreshold)
+            else:
+                for robot in self.robots:
+                    start = perf_counter()
+                    robot.procInputModule(paramLightThreshold, paramDistanceThreshold)
+                    metrics.addRobot("procInputModule", robot.uid, perf_counter() - start)
+
+            start = perf_counter()
+            if (self.stepArbiter is None):
+                sim_result = self.pObj.runSimulationStep()
+            else:
+                sim_result = self.stepArbiter(self.pObj.runSimulationStep)
+            if (metrics is not None):
+                metrics.add("runSimulationStep", perf_counter() - start)
+            # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+            if (sim_result != sim.SimStepResult.finished):
+                return sim_result
+
+            if (clearDistances):
+                for robot in self.robots:
+                    # clear the distance history every n cycles to prevent old entries from affecting the response of the
+                    # algorithms that depend on distance
+                    robot.clearDistances()
+
+            # process output module for all robots
+            if (metrics is None):
+                for robot in self.robots:
+                    robot.procOutputModule(self.defineDefaultMotion)
+            else:
+                for robot in self.robots:
+                    start = perf_counter()
+                    robot.procOutputModule(self.defineDefaultMotion)
+                    metrics.addRobot("procOutputModule", robot.uid, perf_counter() - start)
+
+        if (self.recorder is not None):
+            self.recorder.writeStep(self.robots)
+        if (self.simStepNr == 0 and self.launchTime is not None):
+            self.firstStepTime = perf_counter() - self.launchTime
+            logging.info("Launch to first step: %.3f s" % self.firstStepTime)
+            if (metrics is not None):
+                metrics.add("launchToFirstStep", self.firstStepTime)
+        self.simStepNr += 1
+        return sim_result
+    # end computeStep()
+
+    def step(self):
+        """Read the inputs of all robots, execute one control step and write the outputs of all robots
+
+        :returns: the sim.SimStepResult of the P system step"""
+        # read the raw input state of all robots
+        self.swarmIO.readInputs()
+        sim_result = self.computeStep()
+        if (sim_result == sim.SimStepResult.finished):
+            # apply the output state of all robots
+            self.swarmIO.writeOutputs()
+        if (self.metrics is not None):
+            self.metrics.endStep()
+        return sim_result
+    # end step()
+
+    def close(self):
+        """Release the resources used by the controller (worker processes) and export the final metrics"""
+        if (self.parallelSwarm is not None):
+            self.parallelSwarm.close()
+        if (self.metrics is not None and self.metrics.path is not None):
+            self.metrics.export()
+    # end close()
+# end class SwarmController
+
 class Config():
 
     """Class used to store a parsed config file. This object is used to determine the behaviour of the application at runtime"""
@@ -232,7 +709,9 @@ class Config():
         self.C = [] # list of colony names
         self.nrRobots = 0 # nr of simulated robots
         self.spawnType = vrep_bridge.SpawnType.ox_plus
-        self.clearDistancesStepNr = 10
+        self.clearDistancesStepNr = 10 # nr of steps after which a neighbour that was not measured again is forgotten
+        self.neighbourCapacity = 64 # maximum nr of neighbours in the distance history of a robot (0 = unbounded)
+        self.fullClearDistances = False # clear the whole distance history every clearDistancesStepNr steps instead
         self.nrRobotsPerColony = {} # dictionary (colony_name : nr_robots_that_will_use_this_colony}
         self.robotColony = [] # list [robot_nr] = "name_of_colony_that_will_be_used"
         self.robotName = [] # list of robot names (generated from their uid) ex ['robot_0', 'robot_1']
@@ -376,65 +855,100 @@ def readConfigFile(filename, printTokens=False):
     return config
 # end readConfigFile()
 
-##########################################################################
-#   MAIN
-formatter = colorlog.ColoredFormatter(
-        "%(log_color)s%(levelname)-8s %(message)s %(reset)s",
-        datefmt=None,
-        reset=True,
-        log_colors={
-                'DEBUG':    'cyan',
-                'INFO':     'green',
-                'WARNING':  'yellow',
-                'ERROR':    'red',
-                'CRITICAL': 'red,bg_white',
-        },
-        secondary_log_colors={},
-        style='%'
-)
-if ('--debug' in sys.argv):
-    colorlog.basicConfig(stream = sys.stdout, level = logging.DEBUG)
-else:
-    colorlog.basicConfig(stream = sys.stdout, level = logging.INFO) # default log level
-
-stream = colorlog.root.handlers[0]
-stream.setFormatter(formatter);
-
-if (len(sys.argv) < 2):
-    logging.error("Expected input file path as parameter")
-    exit(1)
-
-# read Pcolony from file
-pObj = sim.readInputFile(sys.argv[1])
-# if the p object read from the input file is a Pswarm
-if (type(pObj) == sim.Pswarm):
-    if (len(sys.argv) < 3):
-        logging.error("Expected config file path as second parameter")
-        exit(1)
-
-    config = readConfigFile(sys.argv[2])
-
-# make link with v-rep
-bridge = vrep_bridge.VrepBridge()
-
-if (type(pObj) == sim.Pcolony):
-    robot = Kilobot(0, pObj)
-else:
+def getOptionValue(name, default, valueType = str):
+    """Return the value of a --name=value command line option
+
+    :name: name of the option (without the leading --)
+    :default: value returned if the option is not present in sys.argv
+    :valueType: function used to convert the string value (ex int, float)
+    :returns: the converted value of the option or default"""
+    for arg in sys.argv[1:]:
+        if (arg.startswith("--%s=" % name)):
+            return valueType(arg.split("=", 1)[1])
+    return default
+# end getOptionValue()
+
+def scaleConfig(config, nrRobots):
+    """Change the number of robots of a Config object while keeping the ratio between the Pcolonies used by the robots.
+    Robot uid is assigned the Pcolony of robot (uid % config.nrRobots) from the original configuration
+
+    :config: Config object read from a config file
+    :nrRobots: the new number of robots
+    :returns: the scaled Config object"""
+    originalRobotColony = config.robotColony
+    config.nrRobots = nrRobots
+    config.robotName = ["robot_%d" % i for i in range(nrRobots)]
+    config.robotColony = [originalRobotColony[i % len(originalRobotColony)] for i in range(nrRobots)]
+    config.nrAsignedRobotsPerColony = {colonyName: config.robotColony.count(colonyName) for colonyName in config.C}
+    config.nrRobotsPerColony = dict(config.nrAsignedRobotsPerColony)
+    return config
+# end scaleConfig()
+
+def cloneColony(colony):
+    """Create a copy of a Pcolony that shares the structure that does not change at runtime (alphabet, agent programs and rules)
+    with the original Pcolony and owns only its mutable state (the environment and the multisets of the agents)
+
+    :colony: the Pcolony that is cloned
+    :returns: the cloned Pcolony"""
+    clone = copy(colony)
+    clone.env = colony.env.copy()
+    clone.agents = {}
+    for agentName, agent in colony.agents.items():
+        agentClone = copy(agent)
+        agentClone.obj = agent.obj.copy()
+        # the agent clone belongs to the colony clone
+        if (hasattr(agent, "colony")):
+            agentClone.colony = clone
+        clone.agents[agentName] = agentClone
+    return clone
+# end cloneColony()
+
+def ownColonyStructure(colony):
+    """Give a (cloned) Pcolony its own alphabet and program lists, before they are modified (copy on write).
+    Pcolony.processWildcards() replaces wildcard programs with new Program objects, so the Program objects can still be shared
+
+    :colony: the Pcolony that will be modified"""
+    colony.A = list(colony.A)
+    for agent in colony.agents.values():
+        agent.programs = list(agent.programs)
+# end ownColonyStructure()
+
+def createSwarmRobots(pObj, config, deepcopyClones = False, lazyWildcards = False, timings = None, uids = None):
+    """Create a Kilobot object for each robot of the swarm, clone the Pcolonies that are used by more than one robot and
+    expand the wildcards of each Pcolony
+
+    :pObj: the Pswarm read from the input file
+    :config: the Config object read from the config file
+    :deepcopyClones: create the clones using deepcopy() instead of cloneColony()
+    :lazyWildcards: keep the wildcard programs symbolic (LazyWildcards) instead of expanding them for all the robots
+    :timings: dictionary that receives the duration (s) of the "clone" and "wildcards" phases (None = no timing)
+    :uids: create only the robots with these uids (a shard of the swarm), the Pcolonies of the other robots are removed
+        from pObj (None = create all the robots)
+    :returns: list of Kilobot objects (indexed by robot uid, or in uids order for a shard)"""
+    start = perf_counter()
     # array of Kilobot objects
-    robots = [] 
+    robots = []
+    shardUids = None if uids is None else set(uids)
+    # the state of all the robots is stored in preallocated arrays
+    # the distance history entries expire one by one, unless the whole history is periodically cleared
+    state = SwarmState(config.nrRobots if uids is None else len(shardUids), config.neighbourCapacity,
+            0 if config.fullClearDistances else config.clearDistancesStepNr)
     # used to determine how many robots have been set up up so far with this colony name
     # so that the first one gets the original colony and the others get a clone
     config.nrConfiguredRobotsWithColony = {colonyName: 0 for colonyName in config.nrAsignedRobotsPerColony.keys()}
 
-    # spawn n-1 robots because 1 is already in the scene and is copied
-    bridge.spawnRobots(nr = config.nrRobots - 1, spawnType = config.spawnType)
-
     # create aditional copies of the Pcolony and assign then to each robot
     for i in range(config.nrRobots):
+        # the robots of the other shards are only counted, so that every robot gets the same Pcolony name in all shards
+        if (shardUids is not None and i not in shardUids):
+            config.nrConfiguredRobotsWithColony[config.robotColony[i]] += 1
+            if (config.nrConfiguredRobotsWithColony[config.robotColony[i]] > 1):
+                config.robotColony[i] = config.robotColony[i] + "_" + str(i)
+            continue
         # if i am the first robot that uses this Pcolony
-        if (config.nrConfiguredRobotsWithColony[config.robotColony[i]] == 0): 
+        if (config.nrConfiguredRobotsWithColony[config.robotColony[i]] == 0):
             logging.debug("Robot %d is the first to use %s Pcolony" % (i, config.robotColony[i]))
-            robots.append(Kilobot(i, pObj.colonies[config.robotColony[i]]))
+            robots.append(Kilobot(i, pObj.colonies[config.robotColony[i]], state, len(robots)))
             # increase the nr of robots configured with this colony
             config.nrConfiguredRobotsWithColony[config.robotColony[i]] += 1
         else:
@@ -442,89 +956,453 @@ else:
             # add a new Pcolony name (with uid appended)
             pObj.C.append(config.robotColony[i] + "_" + str(i))
             logging.debug("pObj.C = %s" % pObj.C)
-            # create a value copy of the colony and store it under the new name
-            pObj.colonies[pObj.C[-1]] = deepcopy(pObj.colonies[config.robotColony[i]])
+            # create a copy of the colony and store it under the new name
+            if (deepcopyClones):
+                pObj.colonies[pObj.C[-1]] = deepcopy(pObj.colonies[config.robotColony[i]])
+            else:
+                pObj.colonies[pObj.C[-1]] = cloneColony(pObj.colonies[config.robotColony[i]])
             # assign the copied Pcolony to the cloned robot
             logging.debug("Robot %i got Pcolony %s" % (i, pObj.C[-1]) )
-            robots.append(Kilobot(i, pObj.colonies[pObj.C[-1]]))
+            robots.append(Kilobot(i, pObj.colonies[pObj.C[-1]], state, len(robots)))
             # increase the nr of robots configured with this colony
             config.nrConfiguredRobotsWithColony[config.robotColony[i]] += 1
             # change the generic colony name to the real allocated one
             config.robotColony[i] = pObj.C[-1]
     #end for clones
 
+    if (shardUids is not None):
+        # the Pcolonies of the other robots are stepped by the other shards
+        usedColonies = set(config.robotColony[robot.uid] for robot in robots)
+        pObj.C = [colonyName for colonyName in pObj.C if colonyName in usedColonies]
+        pObj.colonies = {colonyName: colony for colonyName, colony in pObj.colonies.items() if colonyName in usedColonies}
+    if (timings is not None):
+        timings["clone"] = perf_counter() - start
+
     print("\n Robot - Pcolony association table:")
     print("robot_id    colony_name\n")
-    for i in range(config.nrRobots):
-        print("robot_%d    %s" % (i, config.robotColony[i]))
+    for robot in robots:
+        print("robot_%d    %s" % (robot.uid, config.robotColony[robot.uid]))
     print("\n")
 
     logging.info("Processing wildcards")
+    start = perf_counter()
 
     # expand wildcards (now that we know the total nr of robots of the swarm and their associated Pcolony)
-    for i in range(config.nrRobots):
+    for robot in robots:
         robotSuffix = [str(i) for i in range(config.nrRobots)] # ['0', '1', .. 'n']
-        robotSuffix.pop(i) # remove the current robot
+        robotSuffix.pop(robot.uid) # remove the current robot
+        if (lazyWildcards):
+            # the programs will be expanded at runtime, only for the robots that are actually encountered
+            robot.lazyWildcards = LazyWildcards(robot.colony, robotSuffix)
+            continue
+        # the wildcard expansion changes the alphabet and programs that are shared by the clones
+        if (not deepcopyClones):
+            ownColonyStructure(robot.colony)
         # perform the actual wildcard expansion
-        robots[i].colony.processWildcards(robotSuffix)
+        robot.colony.processWildcards(robotSuffix)
+    if (timings is not None):
+        timings["wildcards"] = perf_counter() - start
 
     # initialize the simResult dictionary
     pObj.simResult = {colonyName: -1 for colonyName in pObj.C}
 
-    # this delay is necessary for the robots to broadcast and receive all neighbour IDs
-    input("Press Enter to continue at least 2 seconds after starting the simulation in V-REP and pressing Run in KilobotController")
-    # request & store the known (friend) robot IDs for each robot
+    return robots
+# end createSwarmRobots()
+
+def fetchKnownRobotIds(bridge, uids):
+    """Request the known (friend) robot IDs of all robots, using a single bridge call if the bridge implements it
+
+    :bridge: the bridge used to communicate with the simulator
+    :uids: list of robot uids
+    :returns: dictionary {robot_uid: list of known robot IDs}"""
+    if (hasattr(bridge, "getAllKnownRobotIds")):
+        return bridge.getAllKnownRobotIds(uids)
+    return {uid: bridge.getKnownRobotIds(uid) for uid in uids}
+# end fetchKnownRobotIds()
+
+def waitForKnownRobotIds(bridge, uids, timeout = 30.0, interval = 0.5, nrStablePolls = 2, proceedOnTimeout = False):
+    """Poll the known robot IDs of all robots until the neighbour ID broadcast has stabilised, i.e. nrStablePolls consecutive
+    polls return the same IDs and at least one robot knows another robot, or until timeout
+
+    :bridge: the bridge used to communicate with the simulator
+    :uids: list of robot uids
+    :timeout: maximum duration (s) of the polling
+    :interval: time (s) between two polls
+    :nrStablePolls: number of consecutive polls that have to return the same IDs
+    :proceedOnTimeout: return the last received IDs if they did not stabilise before timeout (they can be incomplete or empty)
+    :returns: (dictionary {robot_uid: list of known robot IDs}, number of polls)
+    :raises TimeoutError: if the IDs did not stabilise before timeout and proceedOnTimeout is False"""
+    start = perf_counter()
+    knownIds = fetchKnownRobotIds(bridge, uids)
+    nrPolls = 1
+    nrSame = 1 # nr of consecutive polls that returned knownIds
+    while (nrSame < nrStablePolls or not (len(uids) < 2 or any(knownIds.values()))):
+        if (perf_counter() - start >= timeout):
+            if (not proceedOnTimeout):
+                raise TimeoutError("The known robot IDs did not stabilise in %.1f s" % timeout)
+            logging.warning("The known robot IDs did not stabilise in %.1f s, the last received IDs are used" % timeout)
+            break
+        sleep(interval)
+        polledIds = fetchKnownRobotIds(bridge, uids)
+        nrPolls += 1
+        nrSame = nrSame + 1 if polledIds == knownIds else 1
+        knownIds = polledIds
+    return knownIds, nrPolls
+# end waitForKnownRobotIds()
+
+def loadKnownRobotIds(bridge, robots, knownIds = None):
+    """Store the known (friend) robot IDs of each robot and publish them in the environment of its Pcolony (in a single pass)
+
+    :bridge: the bridge used to communicate with the simulator
+    :robots: list of Kilobot objects
+    :knownIds: dictionary {robot_uid: list of known robot IDs} (None = request them from the bridge)"""
+    if (knownIds is None):
+        knownIds = fetchKnownRobotIds(bridge, [robot.uid for robot in robots])
+    idSymbols = {} # dictionary {robot_id: "id_<robot_id>"}, each symbolic ID is built only once
     for robot in robots:
-        robot.known_robots = bridge.getKnownRobotIds(robot.uid)
+        robot.known_robots = known = list(knownIds[robot.uid])
+        env = robot.colony.env
         # convert numeric IDs (1, 2, 3) into symbolic IDs (id_1, id_2, id_3)
-        for id in robot.known_robots:
-            robot.colony.env["id_%d" % id] = 1 # ex. id_2 is now in the Pcolony environment
-
-simStepNr = 0
-# the next distances reinitialization will take place after config.clearDistancesStepNr steps from now
-nextClearStepNr = simStepNr + config.clearDistancesStepNr
-while (True):
-    print("\n")
-    
-    if (type(pObj) == sim.Pcolony):
-        robot.raw_input_state = bridge.getState(robot.uid)
-        robot.procInputModule()
+        for id in known:
+            symbol = idSymbols.get(id)
+            if (symbol is None):
+                symbol = idSymbols[id] = "id_%d" % id
+            env[symbol] = 1 # ex. id_2 is now in the Pcolony environment
+# end loadKnownRobotIds()
+
+def runShardedSwarm(inputFile, configFile, nrShards, nrRemoteShards, offline, maxSteps):
+    """Control a Pswarm using several shard processes coordinated by a ShardCoordinator (see main() for the options)
+
+    :inputFile: path of the Pswarm input file
+    :configFile: path of the config file
+    :nrShards: number of shard processes started on this machine
+    :nrRemoteShards: number of shard processes started on other hosts
+    :offline: the shards use the KinematicBridge instead of a V-REP connection
+    :maxSteps: stop after this number of simulation steps (0 = run until the Pswarm stops)"""
+    # the shards import this module, so the coordinator is imported only when it is needed
+    from swarm_shards import ShardCoordinator, parseAddress
+
+    for option in ("workers", "vectorized", "tick-rate", "metrics", "record", "replay", "snapshot-cache"):
+        if ('--' + option in sys.argv or getOptionValue(option, None) is not None):
+            logging.warning("--%s is not available together with shards, it is ignored" % option)
+
+    authkey = getOptionValue("shard-authkey", None)
+    if (nrRemoteShards > 0 and authkey is None):
+        logging.error("Remote shards need a --shard-authkey")
+        exit(1)
+    coordinator = ShardCoordinator(parseAddress(getOptionValue("listen", "127.0.0.1:0")),
+            authkey.encode() if authkey is not None else None, getOptionValue("max-lag", 0, int))
+    if (nrRemoteShards > 0):
+        print("Start %d shards with: python swarm_shards.py %s:%d --shard-authkey=KEY" % ((nrRemoteShards,) + coordinator.address))
+    coordinator.launchTime = LAUNCH_TIME
+    coordinator.startLocalShards(nrShards)
+    coordinator.acceptShards(nrShards + nrRemoteShards)
+    coordinator.setup(inputFile, configFile, {
+            "offline": offline,
+            "seed": getOptionValue("seed", None, int),
+            "batched": '--no-batch' not in sys.argv,
+            "deltaOutputs": '--delta-outputs' in sys.argv,
+            "keepAlive": getOptionValue("keep-alive", 0, int),
+            "defineDefaultMotion": '--continuous-motion' not in sys.argv,
+            "deepcopy": '--deepcopy' in sys.argv,
+            "lazyWildcards": '--lazy-wildcards' in sys.argv,
+            "eventDriven": '--event-driven' in sys.argv,
+            "neighbourCapacity": getOptionValue("neighbour-capacity", None, int),
+            "fullClearDistances": '--full-clear' in sys.argv,
+            "startupTimeout": getOptionValue("startup-timeout", 30.0, float),
+            "startupPoll": getOptionValue("startup-poll", 0.5, float),
+            "startupProceed": '--startup-proceed' in sys.argv,
+            "sceneBatch": getOptionValue("scene-batch", None),
+            })
+    coordinator.run(maxSteps)
+    coordinator.close()
+    coordinator.printStats()
+# end runShardedSwarm()
+
+def main():
+    """Main entry point
+
+    usage: lulu_kilobot.py input_file [config_file] [--debug] [--offline] [--seed=N] [--steps=N] [--no-batch] [--workers=N] [--deepcopy]
+        [--lazy-wildcards] [--vectorized] [--tick-rate=HZ] [--metrics[=path]] [--metrics-format=json|csv|prom]
+        [--metrics-interval=S] [--record=path] [--trace-neighbours=N] [--replay=path] [--delta-outputs] [--keep-alive=N]
+        [--continuous-motion] [--snapshot-cache[=dir]] [--event-driven] [--shards=N] [--remote-shards=N] [--max-lag=N]
+        [--listen=host:port] [--shard-authkey=KEY] [--neighbour-capacity=N] [--full-clear] [--startup-timeout=S]
+        [--startup-poll=S] [--startup-proceed] [--scene-batch=OBJECT]
+
+    :--offline: use the in-process KinematicBridge instead of a V-REP connection (no interactive prompts)
+    :--seed: seed of the KinematicBridge random generator and of the random generator used by the simulator
+    :--steps: stop after this number of simulation steps (0 = run until the Pcolony / Pswarm stops)
+    :--no-batch: always use the per robot getState() / setState() bridge calls
+    :--workers: step the Pcolonies of a Pswarm on this number of worker processes (0 = step them in this process). The objects
+        added to the global environment by a worker are visible to the other workers only at the next step (see ParallelSwarm)
+    :--deepcopy: clone the Pcolonies using deepcopy() instead of sharing their alphabet and programs
+    :--lazy-wildcards: expand the wildcard programs at runtime, only for the robots that are actually encountered
+    :--vectorized: store and classify the sensor readings of all robots using NumPy arrays (requires numpy)
+    :--tick-rate: run the controller at a fixed rate (steps / second), overlapping the bridge I/O with the computation
+    :--metrics: time the phases of each step, print a summary at the end and (if a path is given) export the metrics to a file
+    :--metrics-format: format of the exported metrics file (json, csv or prom)
+    :--metrics-interval: minimum time (s) between two exports of the metrics file
+    :--record: record the sensor readings and output states of every step to a trace file
+    :--trace-neighbours: maximum number of distances recorded for each robot and step (default 64)
+    :--replay: replay the sensor readings of a trace file instead of using a simulator (no interactive prompts) and check
+        the output states against the recorded ones
+    :--delta-outputs: send only the motion / led commands that changed since the last command sent to each robot
+        (with --offline / --replay the batched calls are required, so it cannot be combined with --no-batch)
+    :--keep-alive: with --delta-outputs, resend an unchanged command after this number of steps (0 = never)
+    :--continuous-motion: keep executing the last motion / led command instead of stopping between command steps
+    :--snapshot-cache: load the parsed, cloned and wildcard expanded P system from a snapshot (saved in dir, default
+        ~/.cache/lulu_kilobot) if the input files are unchanged, otherwise prepare it and save a new snapshot
+    :--event-driven: service only the robots that can change state (the Pcolonies are stepped one by one)
+    :--shards: split the robots of a Pswarm between this number of local controller processes, each one with its own
+        Pcolonies and its own bridge connection, coordinated by this process. Each shard is a separate arena, so the shards are
+        independent sub-swarms (the robots of different shards never sense each other, they interact only through the global
+        environment). Local shards require --offline
+        (they would all connect to the same default V-REP endpoint)
+    :--remote-shards: also wait for this number of shards started on other hosts with swarm_shards.py host:port (each one
+        connected to the V-REP instance of its host)
+    :--max-lag: with shards, maximum number of steps a shard can be ahead of the slowest one (0 = step-lock)
+    :--listen: address the shard coordinator listens on (default 127.0.0.1 and any free port)
+    :--shard-authkey: authentication key shared with the shards (required by remote shards)
+    :--neighbour-capacity: maximum number of neighbours in the distance history of a robot (default 64, 0 = unbounded)
+    :--full-clear: clear the whole distance history of all robots every clearDistancesStepNr steps, instead of forgetting
+        each neighbour clearDistancesStepNr steps after its last measurement
+    :--startup-timeout: maximum time (s) to wait for the known robot IDs to stabilise before the first step (default 30).
+        The controller stops if they do not stabilise, unless --startup-proceed is given
+    :--startup-poll: time (s) between two requests of the known robot IDs while waiting for them to stabilise (default 0.5).
+        The offline and replay bridges are not polled, their known robot IDs are requested once
+    :--startup-proceed: start with the last received known robot IDs (possibly incomplete or empty) if they do not stabilise
+        before --startup-timeout
+    :--scene-batch: read / command all the V-REP robots with one remote API call per step, using the customization script of
+        this scene object. The script is not part of the Kilobot scene, it has to implement the protocol described in vrep_batch"""
+    formatter = colorlog.ColoredFormatter(
+            "%(log_color)s%(levelname)-8s %(message)s %(reset)s",
+            datefmt=None,
+            reset=True,
+            log_colors={
+                    'DEBUG':    'cyan',
+                    'INFO':     'green',
+                    'WARNING':  'yellow',
+                    'ERROR':    'red',
+                    'CRITICAL': 'red,bg_white',
+            },
+            secondary_log_colors={},
+            style='%'
+    )
+    if ('--debug' in sys.argv):
+        colorlog.basicConfig(stream = sys.stdout, level = logging.DEBUG)
     else:
-        for robot in robots:
-            robot.raw_input_state = bridge.getState(robot.uid)
-            robot.procInputModule()
+        colorlog.basicConfig(stream = sys.stdout, level = logging.INFO) # default log level
 
-    sim_result = pObj.runSimulationStep()
-    # if the simmulation result is other than step finished (i.e. no_more_exec or error)
-    if (sim_result != sim.SimStepResult.finished):
-        # exit the loop
-        logging.warn("Exiting loop")
-        break
+    stream = colorlog.root.handlers[0]
+    stream.setFormatter(formatter);
+
+    # positional arguments (input file path and config file path)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    replayPath = getOptionValue("replay", None)
+    recordPath = getOptionValue("record", None)
+    offline = '--offline' in sys.argv or replayPath is not None
+    maxSteps = getOptionValue("steps", 0, int)
+
+    if (len(args) < 1):
+        logging.error("Expected input file path as parameter")
+        exit(1)
+
+    # the offline and replay bridges advance a robot only when it receives a command through the per robot calls
+    if (offline and '--delta-outputs' in sys.argv and '--no-batch' in sys.argv):
+        logging.error("--delta-outputs needs the batched bridge calls with --offline / --replay (remove --no-batch)")
+        exit(1)
+    if (getOptionValue("scene-batch", None) is not None and (offline or '--no-batch' in sys.argv)):
+        logging.error("--scene-batch is used only with a V-REP connection and the batched bridge calls")
+        exit(1)
+
+    # split the swarm between several controller processes, each one with its own bridge connection
+    nrShards = getOptionValue("shards", 0, int)
+    nrRemoteShards = getOptionValue("remote-shards", 0, int)
+    if (nrShards + nrRemoteShards > 0):
+        if (len(args) < 2):
+            logging.error("Expected config file path as second parameter")
+            exit(1)
+        if (nrShards > 0 and not offline):
+            # every local shard would connect its own VrepBridge to the same default V-REP endpoint
+            logging.error("Local shards need --offline, start one shard per V-REP host with --remote-shards instead")
+            exit(1)
+        runShardedSwarm(args[0], args[1], nrShards, nrRemoteShards, offline, maxSteps)
+        return
+
+    # load the prepared P system (parsed, cloned and wildcard expanded) from the startup snapshot
+    snapshotCache = None
+    snapshot = None
+    robots = None
+    if ('--snapshot-cache' in sys.argv or getOptionValue("snapshot-cache", None) is not None):
+        snapshotCache = StartupCache(getOptionValue("snapshot-cache", DEFAULT_CACHE_DIR), args[:2],
+                {"deepcopy": '--deepcopy' in sys.argv, "lazy-wildcards": '--lazy-wildcards' in sys.argv,
+                "full-clear": '--full-clear' in sys.argv, "neighbour-capacity": getOptionValue("neighbour-capacity", None, int)},
+                [__file__, sim.__file__] + [sys.modules[cls.__module__].__file__ for cls in (LazyWildcards, NeighbourIndex, SwarmState)])
+        snapshot = snapshotCache.load()
+    prepareStart = perf_counter()
+
+    if (snapshot is not None):
+        pObj, config, robots = snapshot
+    else:
+        # read Pcolony from file
+        pObj = sim.readInputFile(args[0])
+        config = None
+        # if the p object read from the input file is a Pswarm
+        if (type(pObj) == sim.Pswarm):
+            if (len(args) < 2):
+                logging.error("Expected config file path as second parameter")
+                exit(1)
+
+            config = readConfigFile(args[1])
+            config.neighbourCapacity = getOptionValue("neighbour-capacity", config.neighbourCapacity, int)
+            config.fullClearDistances = '--full-clear' in sys.argv
+    prepareTime = perf_counter() - prepareStart
+
+    if (replayPath is not None):
+        # read the sensor readings from a recorded trace
+        bridge = ReplayBridge(replayPath)
+        maxSteps = bridge.nrSteps if maxSteps == 0 else min(maxSteps, bridge.nrSteps)
+    elif (offline):
+        # simulate the robots in-process
+        bridge = KinematicBridge(seed = getOptionValue("seed", 0, int))
+    else:
+        # make link with v-rep
+        bridge = vrep_bridge.VrepBridge()
+        if (getOptionValue("scene-batch", None) is not None):
+            # all the robots are read / commanded with one remote API call per step
+            bridge = BatchedVrepBridge(bridge, getOptionValue("scene-batch", None))
+
+    # the P system choices are reproducible only if the random generator of the simulator is seeded
+    seed = getOptionValue("seed", None, int)
+    if (seed is None and replayPath is not None):
+        seed = bridge.seed
+    if (seed is None and recordPath is not None):
+        seed = random.randrange(2**32)
+    if (seed is not None):
+        random.seed(seed)
 
     if (type(pObj) == sim.Pcolony):
-        robot.procOutputModule()
-        bridge.setState(robot.uid, robot.output_state["motion"], robot.output_state["led_rgb"])
+        if (robots is None):
+            robots = [Kilobot(0, pObj)]
     else:
-        if (simStepNr >= nextClearStepNr and config.clearDistancesStepNr > 0):
-            # the next distances reinitialization will take place after config.clearDistancesStepNr steps from now
-            nextClearStepNr = simStepNr + config.clearDistancesStepNr
-            logging.warn("CLEARING distances")
+        # spawn n-1 robots because 1 is already in the scene and is copied
+        bridge.spawnRobots(nr = config.nrRobots - 1, spawnType = config.spawnType)
+
+        # the reply objects for all the robots of the swarm are generated only once
+        generateReplySymbols(range(config.nrRobots))
+        if (robots is None):
+            prepareStart = perf_counter()
+            robots = createSwarmRobots(pObj, config, deepcopyClones = '--deepcopy' in sys.argv,
+                    lazyWildcards = '--lazy-wildcards' in sys.argv)
+            prepareTime += perf_counter() - prepareStart
+
+    if (snapshotCache is not None and snapshot is None):
+        logging.info("Startup snapshot miss: P system prepared in %.3f s" % prepareTime)
+        # the snapshot is taken before the robots receive their known robot IDs (they depend on the simulator)
+        snapshotCache.save((pObj, config, robots))
+
+    if (type(pObj) == sim.Pswarm):
+        start = perf_counter()
+        if (offline):
+            # the offline and replay bridges answer at once, and their answer does not change while the robots do not move
+            knownIds, nrPolls = fetchKnownRobotIds(bridge, [robot.uid for robot in robots]), 1
+        else:
+            # the robots need some time to broadcast and receive all neighbour IDs
+            logging.info("Waiting for the neighbour IDs broadcast (start the simulation in V-REP and press Run in KilobotController)")
+            try:
+                knownIds, nrPolls = waitForKnownRobotIds(bridge, [robot.uid for robot in robots],
+                        getOptionValue("startup-timeout", 30.0, float), getOptionValue("startup-poll", 0.5, float),
+                        proceedOnTimeout = '--startup-proceed' in sys.argv)
+            except TimeoutError as error:
+                logging.error("%s, use --startup-proceed to start with the last received IDs" % error)
+                exit(1)
+        waitTime = perf_counter() - start
+        start = perf_counter()
+        loadKnownRobotIds(bridge, robots, knownIds)
+        logging.info("Known robot IDs stable after %d polls (%.3f s), loaded in %.3f s" % (nrPolls, waitTime, perf_counter() - start))
+
+    # swarm level I/O layer (batched sensor reads / actuator writes if supported by the bridge)
+    deltaOutputs = '--delta-outputs' in sys.argv
+    swarmIO = SwarmIO(bridge, robots, batched = '--no-batch' not in sys.argv, deltaOutputs = deltaOutputs,
+            keepAlive = getOptionValue("keep-alive", 0, int))
+    defineDefaultMotion = '--continuous-motion' not in sys.argv
+
+    # step the Pcolonies of the swarm on a pool of worker processes
+    nrWorkers = getOptionValue("workers", 0, int)
+    if (type(pObj) == sim.Pswarm and nrWorkers > 0):
+        parallelSwarm = ParallelSwarm(pObj, robots, config.robotColony, nrWorkers, defineDefaultMotion = defineDefaultMotion, seed = seed)
+    else:
+        parallelSwarm = None
+
+    # store and classify the sensor readings of all robots at swarm level
+    sensorArrays = None
+    if ('--vectorized' in sys.argv):
+        if (parallelSwarm is not None):
+            logging.warning("--vectorized is not available together with --workers, the readings are processed per robot")
+        else:
+            # numpy is needed only by the vectorized sensor processing
+            from swarm_sensors import SwarmSensorArrays
+            sensorArrays = SwarmSensorArrays(len(robots), 0 if config is None or config.fullClearDistances else config.clearDistancesStepNr,
+                    0 if config is None else config.neighbourCapacity)
             for robot in robots:
-                # clear the distance history every n cycles to prevent old entries from affecting the response of the
-                # algorithms that depend on distance
-                robot.distances = robot.distances_prev = {}
-        # end if clearStep
-
-        # process output module for all robots
-        for robot in robots:
-            robot.procOutputModule()
-            bridge.setState(robot.uid, robot.output_state["motion"], robot.output_state["led_rgb"])
-
-    simStepNr += 1
-# end while
-
-# show remove clone confirmation only when simulating Pswarms
-if (type(pObj) == sim.Pswarm):
-    confirmRemoveRobots = input("Remove cloned robots from scene ? (y/n)")
-    if (confirmRemoveRobots in ('y', 'Y')):
-        bridge.removeRobots()
+                robot.sensorView = sensorArrays.view(robot.uid)
+
+    # time the phases of each step
+    metrics = None
+    if ('--metrics' in sys.argv or getOptionValue("metrics", None) is not None):
+        metrics = StepMetrics(getOptionValue("metrics", None), getOptionValue("metrics-format", "json"),
+                getOptionValue("metrics-interval", 10.0, float))
+
+    controller = SwarmController(pObj, robots, swarmIO, config if type(pObj) == sim.Pswarm else None, parallelSwarm, sensorArrays, metrics)
+    controller.defineDefaultMotion = defineDefaultMotion
+    controller.launchTime = LAUNCH_TIME
+    if ('--event-driven' in sys.argv):
+        if (parallelSwarm is not None):
+            logging.warning("--event-driven is not available together with --workers, all the robots are stepped")
+        else:
+            controller.scheduler = EventScheduler(pObj, robots)
+    if (recordPath is not None):
+        controller.recorder = TraceRecorder(recordPath, robots, getOptionValue("trace-neighbours", 64, int), seed)
+
+    tickRate = getOptionValue("tick-rate", 0.0, float)
+    if (tickRate > 0):
+        # fixed rate loop that overlaps the bridge I/O with the P system computation
+        controlLoop = AsyncControlLoop(controller, tickRate, maxSteps)
+        asyncio.run(controlLoop.run())
+        controlLoop.printStats()
+    else:
+        while (maxSteps == 0 or controller.simStepNr < maxSteps):
+            print("\n")
+
+            sim_result = controller.step()
+            # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+            if (sim_result != sim.SimStepResult.finished):
+                # exit the loop
+                logging.warning("Exiting loop")
+                break
+        # end while
+
+    controller.close()
+    if (deltaOutputs):
+        swarmIO.printStats()
+    if (controller.scheduler is not None):
+        controller.scheduler.printStats()
+    if (metrics is not None):
+        metrics.printSummary()
+    if (controller.recorder is not None):
+        controller.recorder.close()
+    if (replayPath is not None):
+        bridge.printStats()
+        bridge.close()
+
+    # show remove clone confirmation only when simulating Pswarms
+    if (type(pObj) == sim.Pswarm and not offline):
+        confirmRemoveRobots = input("Remove cloned robots from scene ? (y/n)")
+        if (confirmRemoveRobots in ('y', 'Y')):
+            bridge.removeRobots()
+# end main()
+
+##########################################################################
+#   MAIN
+if (__name__ == "__main__"):
+    main()
@@ -0,0 +1,186 @@
+import heapq
+
+class NeighbourIndex():
+
+    """Incrementally updated index of the distances from the neighbour robots.
+    Keeps the current and previous distance of every neighbour, a heap used to find the closest neighbour, the number of
+    neighbours that are closer than the distance threshold and the list of neighbours in the order in which they were
+    first measured (used for round robin iteration).
+    The history can be bounded: a neighbour that was not measured during the last maxAge updates is forgotten, and when
+    capacity neighbours are known a new neighbour replaces the least recently measured one (the farthest one among the
+    equally old)."""
+
+    __slots__ = ("distances", "distances_prev", "order", "rank", "heap", "threshold", "nrSmall", "capacity", "maxAge",
+            "lastSeen", "stepNr", "nextExpiry", "nextRank", "nrRefreshed")
+
+    def __init__(self, threshold = 55, capacity = 0, maxAge = 0):
+        """
+        :threshold: distance threshold used to classify a distance as small (<= threshold) or big
+        :capacity: maximum number of neighbours (0 = unbounded)
+        :maxAge: number of updates after which a neighbour that was not measured again is forgotten (0 = never)"""
+        self.distances = {} # dictionary of the most recent distance measurements = {robot_uid: distance}
+        self.distances_prev = {} # dictionary of previous distance measurements = {robot_uid: distance}
+        self.order = [] # list of neighbour uids in the order of their first measurement
+        self.rank = {} # dictionary {robot_uid: order of the first measurement}, used to break distance ties like min() does
+        self.heap = [] # heap of (distance, rank, robot_uid), entries are valid only if they match distances[] and rank[]
+        self.threshold = threshold
+        self.nrSmall = 0 # nr of neighbours with distance <= threshold
+        self.capacity = capacity
+        self.maxAge = maxAge
+        self.lastSeen = {} # dictionary {robot_uid: nr of the update that last measured the robot}
+        self.stepNr = 0 # nr of updates
+        self.nextExpiry = 0 # no neighbour can expire before this update
+        self.nextRank = 0 # rank of the next new neighbour
+        self.nrRefreshed = 0 # nr of neighbours measured by the last update
+    # end __init__()
+
+    def update(self, measurements):
+        """Store new distance measurements
+
+        :measurements: dictionary {robot_uid: distance} of new measurements"""
+        distances = self.distances
+        distances_prev = self.distances_prev
+        rank = self.rank
+        heap = self.heap
+        lastSeen = self.lastSeen
+        threshold = self.threshold
+        nrSmall = self.nrSmall
+        self.stepNr = stepNr = self.stepNr + 1
+        newNeighbours = None
+        for uid, d in measurements.items():
+            old = distances.get(uid)
+            # if I already have a distance from this robot
+            if (old is not None):
+                lastSeen[uid] = stepNr
+                # update previous distances
+                distances_prev[uid] = old
+                if (old == d):
+                    continue
+                # store the new distance
+                distances[uid] = d
+                nrSmall += (d <= threshold) - (old <= threshold)
+                heapq.heappush(heap, (d, rank[uid], uid))
+            # if this is the first time I receive a measurement from this robot (added after the expiry of the old neighbours)
+            elif (newNeighbours is None):
+                newNeighbours = [(uid, d)]
+            else:
+                newNeighbours.append((uid, d))
+        self.nrSmall = nrSmall
+        self.nrRefreshed = len(measurements) - (len(newNeighbours) if newNeighbours is not None else 0)
+
+        if (self.maxAge > 0 and stepNr >= self.nextExpiry):
+            self.expire()
+        if (newNeighbours is not None):
+            for uid, d in newNeighbours:
+                self.add(uid, d)
+
+        # drop the outdated heap entries when they outnumber the valid ones
+        if (len(self.heap) > 2 * len(distances) + 16):
+            self.heap = [(d, rank[uid], uid) for uid, d in distances.items()]
+            heapq.heapify(self.heap)
+    # end update()
+
+    def add(self, uid, d):
+        """Add a new neighbour (replacing the least recently measured one if the capacity is reached)"""
+        distances = self.distances
+        if (self.capacity > 0 and len(distances) >= self.capacity):
+            lastSeen = self.lastSeen
+            victim = min(distances, key = lambda other: (lastSeen[other], -distances[other]))
+            victimRefreshed = lastSeen[victim] == self.stepNr
+            # all the known neighbours were measured now and are closer
+            if (victimRefreshed and distances[victim] <= d):
+                return
+            self.forget(victim)
+            self.nrRefreshed -= victimRefreshed
+        distances[uid] = self.distances_prev[uid] = d
+        self.lastSeen[uid] = self.stepNr
+        self.rank[uid] = self.nextRank
+        self.nextRank += 1
+        self.order.append(uid)
+        self.nrSmall += (d <= self.threshold)
+        self.nrRefreshed += 1
+        heapq.heappush(self.heap, (d, self.rank[uid], uid))
+    # end add()
+
+    def forget(self, uid):
+        """Remove a neighbour"""
+        d = self.distances.pop(uid)
+        del self.distances_prev[uid]
+        del self.lastSeen[uid]
+        del self.rank[uid]
+        self.order.remove(uid)
+        self.nrSmall -= (d <= self.threshold)
+    # end forget()
+
+    def expire(self):
+        """Forget the neighbours that were not measured during the last maxAge updates"""
+        stepNr = self.stepNr
+        oldest = stepNr
+        expired = []
+        for uid, seen in self.lastSeen.items():
+            if (stepNr - seen > self.maxAge):
+                expired.append(uid)
+            elif (seen < oldest):
+                oldest = seen
+        for uid in expired:
+            self.forget(uid)
+        self.nextExpiry = oldest + self.maxAge + 1
+    # end expire()
+
+    def isSettled(self):
+        """Return True if repeating the last update would not change the index (no neighbour is waiting to expire)"""
+        return self.maxAge == 0 or self.nrRefreshed == len(self.distances)
+    # end isSettled()
+
+    def setThreshold(self, threshold):
+        """Change the distance threshold and recount the neighbours that are closer than it"""
+        self.threshold = threshold
+        self.nrSmall = sum(1 for d in self.distances.values() if d <= threshold)
+    # end setThreshold()
+
+    def anySmall(self, threshold):
+        """Return True if at least one neighbour is closer than (or at) threshold"""
+        if (threshold != self.threshold):
+            self.setThreshold(threshold)
+        return self.nrSmall > 0
+    # end anySmall()
+
+    def minNeighbour(self):
+        """Return the uid of the closest neighbour (the first measured one in case of a tie) or None if there are no neighbours"""
+        while (self.heap):
+            d, rank, uid = self.heap[0]
+            if (self.distances.get(uid) == d and self.rank[uid] == rank):
+                return uid
+            # outdated entry
+            heapq.heappop(self.heap)
+        return None
+    # end minNeighbour()
+
+    def isSmall(self, uid, threshold):
+        """Return True if the distance from robot uid is known and small (<= threshold)"""
+        d = self.distances.get(uid)
+        return d is not None and d <= threshold
+    # end isSmall()
+
+    def variation(self, uid):
+        """Return the variation of the distance from robot uid (-1 decreasing / 0 constant or unknown / +1 increasing)"""
+        d = self.distances.get(uid)
+        if (d is None):
+            return 0
+        return (d > self.distances_prev[uid]) - (d < self.distances_prev[uid])
+    # end variation()
+
+    def clear(self):
+        """Forget all neighbours"""
+        self.distances = {}
+        self.distances_prev = {}
+        self.order = []
+        self.rank = {}
+        self.heap = []
+        self.nrSmall = 0
+        self.lastSeen = {}
+        self.nextExpiry = 0
+        self.nextRank = 0
+        self.nrRefreshed = 0
+    # end clear()
+# end class NeighbourIndex
@@ -0,0 +1,248 @@
+import logging
+import multiprocessing
+import random
+import collections
+from lulu_pcol_sim import sim
+
+def combineSimResults(results):
+    """Combine the step results of several Pcolonies into a single Pswarm step result
+
+    :results: iterable of sim.SimStepResult values (one for each Pcolony)
+    :returns: SimStepResult.error if any Pcolony failed, SimStepResult.finished if at least one Pcolony executed a step,
+        SimStepResult.no_more_executables otherwise"""
+    combined = sim.SimStepResult.no_more_executables
+    for result in results:
+        if (result == sim.SimStepResult.error):
+            return sim.SimStepResult.error
+        if (result == sim.SimStepResult.finished):
+            combined = sim.SimStepResult.finished
+    return combined
+# end combineSimResults()
+
+def envDelta(before, after):
+    """Return the changes made to a multiset
+
+    :before: collections.Counter before the change
+    :after: collections.Counter after the change
+    :returns: dictionary {object: multiplicity_difference} that contains only the changed objects"""
+    delta = {}
+    for obj in set(before) | set(after):
+        difference = after[obj] - before[obj]
+        if (difference != 0):
+            delta[obj] = difference
+    return delta
+# end envDelta()
+
+def mergeEnvDelta(env, delta):
+    """Add the changes made by a shard to a multiset, unless they consume objects that are no longer present (because another
+    shard consumed them during the same step)
+
+    :env: collections.Counter that receives the changes
+    :delta: dictionary {object: multiplicity_difference} returned by envDelta()
+    :returns: True if the changes were merged, False if they conflict with env (env is not modified)"""
+    for obj, difference in delta.items():
+        if (difference < 0 and env[obj] + difference < 0):
+            return False
+    for obj, difference in delta.items():
+        env[obj] += difference
+    return True
+# end mergeEnvDelta()
+
+def consumesObjects(delta):
+    """Return True if global_env changes (returned by envDelta()) consume objects. Only such changes can conflict with the
+    changes of other shards, so only they wait for the decision of the main process / coordinator"""
+    return any(difference < 0 for difference in delta.values())
+# end consumesObjects()
+
+def saveColonyState(colonies):
+    """Return a copy of the mutable state of Pcolonies (environment and agent multisets) and of the random generator, used to
+    execute a Pcolony step again
+
+    :colonies: list of Pcolony objects"""
+    # the multisets are copied as plain dictionaries (much faster than Counter.copy()), restoreColonyState() updates them in place
+    return (random.getstate(), [(colony, dict(colony.env), [(agent, dict(agent.obj)) for agent in colony.agents.values()])
+        for colony in colonies])
+# end saveColonyState()
+
+def restoreColonyState(state):
+    """Restore the state saved by saveColonyState()"""
+    randomState, colonies = state
+    random.setstate(randomState)
+    # the multisets are restored in place, they can be referenced by other objects
+    for colony, env, agents in colonies:
+        colony.env.clear()
+        colony.env.update(env)
+        for agent, obj in agents:
+            agent.obj.clear()
+            agent.obj.update(obj)
+# end restoreColonyState()
+
+def shardWorker(conn, pObj, robots, colonyNames, shardSeed, defineDefaultMotion):
+    """Main loop of a worker process. The Pcolonies of the shard robots are kept resident in this process (inherited at fork)
+    and only the per step inputs / outputs are exchanged with the main process
+
+    :conn: multiprocessing.Connection used to communicate with the main process
+    :pObj: the Pswarm (forked copy)
+    :robots: list of Kilobot objects served by this worker
+    :colonyNames: list of Pcolony names (colonyNames[i] is used by robots[i])
+    :shardSeed: seed of the random generator of this shard (drawn by the main process)
+
+    Messages received from the main process:
+        ("step", inputs, globalEnv, clearDistances, paramLightThreshold, paramDistanceThreshold) execute a control step
+        ("accept",) / ("retry", globalEnv) decision on global_env changes that consume objects
+        None stop the worker
+    Messages sent to the main process:
+        (results, delta) global_env changes that consume objects, the worker waits for the decision of the main process
+        (outputs, results, delta) end of the control step (the output module is executed only on accepted changes)"""
+    # the random generator is reseeded from the OS in a forked child, the seed has to come from the main process
+    random.seed(shardSeed)
+    colonies = [pObj.colonies[name] for name in colonyNames]
+
+    while (True):
+        message = conn.recv()
+        # None is used as a stop request
+        if (message is None):
+            break
+        inputs, globalEnv, clearDistances, paramLightThreshold, paramDistanceThreshold = message[1:]
+        for robot in robots:
+            robot.raw_input_state = inputs[robot.uid]
+            robot.procInputModule(paramLightThreshold, paramDistanceThreshold)
+        savedState = saveColonyState(colonies)
+
+        while (True):
+            # every shard starts from the same global environment and reports the changes it made
+            pObj.global_env = collections.Counter(globalEnv)
+            results = {name: pObj.colonies[name].runSimulationStep() for name in colonyNames}
+            delta = envDelta(globalEnv, pObj.global_env)
+            if (not consumesObjects(delta)):
+                break
+            conn.send((results, delta))
+            reply = conn.recv()
+            if (reply[0] == "accept"):
+                break
+            # "retry": the global_env changes conflicted with the ones of a previous shard, the simulation step is executed
+            # again, starting from the global environment that contains the changes of the previous shards
+            globalEnv = reply[1]
+            restoreColonyState(savedState)
+
+        # the robots are modified only by the accepted simulation step
+        for robot in robots:
+            if (clearDistances):
+                robot.clearDistances()
+            robot.procOutputModule(defineDefaultMotion)
+
+        outputs = {robot.uid: (robot.motion, robot.led_rgb) for robot in robots}
+        conn.send((outputs, results, delta))
+    conn.close()
+# end shardWorker()
+
+class ParallelSwarm():
+
+    """Steps the Pcolonies of a Pswarm in parallel, using a pool of worker processes.
+    The robots list is split into contiguous shards and each worker keeps the Pcolonies of its shard resident.
+    Every step, the main process sends the raw input state of the robots and the swarm global_env, and receives the output
+    states and the global_env changes. The changes are merged in shard order, so the result does not depend on the order
+    in which the workers finish.
+
+    Limitations compared with Pswarm.runSimulationStep(), which steps the Pcolonies one after the other on the same global_env:
+    all the shards start a step from the same global_env, so the objects added to global_env by a shard are visible to the
+    other shards only at the next step. If a shard consumes objects that an earlier shard (in shard order) already consumed
+    during the same step (its changes would make a multiplicity negative), the Pcolonies of the shard are restored to their
+    state before the simulation step and the step is executed again on the global_env that contains the changes of the
+    earlier shards. Pswarms whose Pcolonies exchange objects through global_env can therefore behave differently with
+    --workers (see nrConflicts)."""
+
+    def __init__(self, pObj, robots, robotColony, nrWorkers, defineDefaultMotion = True, seed = None):
+        """
+        :pObj: the Pswarm whose Pcolonies are stepped
+        :robots: list of Kilobot objects (indexed by robot uid)
+        :robotColony: list of Pcolony names (robotColony[uid] is the Pcolony used by robot uid)
+        :nrWorkers: number of worker processes
+        :seed: seed from which the seeds of the workers are drawn (None = draw them from the random generator of this process)"""
+        self.pObj = pObj
+        self.robots = robots
+        self.nrWorkers = max(1, min(nrWorkers, len(robots)))
+        self.connections = [] # list of multiprocessing.Connection (one for each worker)
+        self.processes = [] # list of multiprocessing.Process (one for each worker)
+        self.shards = [] # list of robot lists (one for each worker)
+        self.nrConflicts = 0 # nr of shard steps that were executed again because of conflicting global_env changes
+
+        # fork is needed because the workers inherit the already built Pcolonies
+        context = multiprocessing.get_context("fork")
+        shardSize = (len(robots) + self.nrWorkers - 1) // self.nrWorkers
+        # give each shard a distinct, but reproducible, random sequence
+        seeds = random.Random(seed) if seed is not None else random
+        shardSeeds = [seeds.getrandbits(64) for shardNr in range(self.nrWorkers)]
+        for shardNr in range(self.nrWorkers):
+            shard = robots[shardNr * shardSize : (shardNr + 1) * shardSize]
+            parentConn, childConn = context.Pipe()
+            process = context.Process(target = shardWorker, args = (childConn, pObj, shard, [robotColony[robot.uid] for robot in shard],
+                shardSeeds[shardNr], defineDefaultMotion), daemon = True)
+            process.start()
+            childConn.close()
+            self.shards.append(shard)
+            self.connections.append(parentConn)
+            self.processes.append(process)
+        logging.info("ParallelSwarm started %d workers (%d robots / worker)" % (self.nrWorkers, shardSize))
+    # end __init__()
+
+    def step(self, clearDistances = False, paramLightThreshold = 20, paramDistanceThreshold = 55):
+        """Execute one control step for all robots: process the input module, step the Pcolonies and process the output module.
+        The raw input states are taken from Kilobot.raw_input_state and the results are stored in Kilobot.output_state
+
+        :clearDistances: clear the distance history of all robots before processing the output module
+        :paramLightThreshold: passed to Kilobot.procInputModule()
+        :paramDistanceThreshold: passed to Kilobot.procInputModule()
+        :returns: the combined sim.SimStepResult of all Pcolonies"""
+        globalEnv = collections.Counter(self.pObj.global_env)
+        for conn, shard in zip(self.connections, self.shards):
+            conn.send(("step", {robot.uid: robot.raw_input_state for robot in shard}, globalEnv, clearDistances, paramLightThreshold,
+                paramDistanceThreshold))
+
+        allResults = []
+        mergedEnv = collections.Counter(globalEnv)
+        for shardNr, (conn, shard) in enumerate(zip(self.connections, self.shards)):
+            merged = False
+            retried = False
+            message = conn.recv()
+            # the shard waits for a decision on global_env changes that consume objects
+            while (len(message) == 2):
+                results, delta = message
+                # merge the global_env changes in shard order
+                if (mergeEnvDelta(mergedEnv, delta)):
+                    merged = True
+                    conn.send(("accept",))
+                elif (retried):
+                    raise RuntimeError("Shard %d consumed global_env objects that are not present: %s" % (shardNr, delta))
+                else:
+                    # the shard consumed objects that were consumed by an earlier shard, its step is executed again
+                    logging.debug("Shard %d: conflicting global_env changes %s, executing the step again" % (shardNr, delta))
+                    self.nrConflicts += 1
+                    retried = True
+                    conn.send(("retry", +mergedEnv))
+                message = conn.recv()
+            outputs, results, delta = message
+            # changes that only add objects never conflict
+            if (not merged):
+                mergeEnvDelta(mergedEnv, delta)
+            for robot in shard:
+                robot.motion, robot.led_rgb = outputs[robot.uid]
+            self.pObj.simResult.update(results)
+            allResults.extend(results.values())
+        # drop objects whose multiplicity reached 0
+        self.pObj.global_env = +mergedEnv
+
+        return combineSimResults(allResults)
+    # end step()
+
+    def close(self):
+        """Stop all worker processes"""
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for process in self.processes:
+            process.join()
+        if (self.nrConflicts > 0):
+            logging.info("ParallelSwarm: %d shard steps were executed again because of conflicting global_env changes" % self.nrConflicts)
+    # end close()
+# end class ParallelSwarm
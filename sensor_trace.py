@@ -0,0 +1,213 @@
+import json
+import logging
+import mmap
+import struct
+from swarm_state import motionCodes
+
+# trace file layout:
+#   MAGIC, header length (uint32), json header (padded with spaces to a multiple of 8 bytes)
+#   fixed size step records, one robot record for each robot (in the order of header["uids"])
+#   robot record = ROBOT_HEADER (light, motion, led r, g, b, nr of distances) + maxNeighbours x DISTANCE (uid, distance)
+MAGIC = b"LKTRACE1"
+HEADER_LENGTH = struct.Struct("<I")
+ROBOT_HEADER = struct.Struct("<iBBBBH")
+DISTANCE_SIZE = struct.calcsize("<Ii")
+
+class TraceRecorder():
+
+    """Append only recorder of the sensor readings and actuator commands of all robots, one fixed size record per step.
+    Distances are stored as integers (mm), like the ones measured by the Kilobot distance sensor. If a robot has more than
+    maxNeighbours neighbours, only the closest maxNeighbours distances are recorded."""
+
+    def __init__(self, path, robots, maxNeighbours = 64, seed = None):
+        """
+        :path: path of the trace file (overwritten if it exists)
+        :robots: list of Kilobot objects (their known_robots must already be loaded)
+        :maxNeighbours: maximum number of distances recorded for each robot and step
+        :seed: seed of the random generator used by the simulator (needed to replay the same P system choices)"""
+        self.uids = [robot.uid for robot in robots]
+        self.maxNeighbours = maxNeighbours
+        self.robotRecordSize = ROBOT_HEADER.size + maxNeighbours * DISTANCE_SIZE
+        self.record = bytearray(self.robotRecordSize * len(robots)) # reused buffer of one step record
+        self.distanceStructs = {} # dictionary {nr_distances: struct.Struct of nr_distances (uid, distance) pairs}
+        self.motionCode = {motion: code for code, motion in enumerate(motionCodes())}
+        self.nrSteps = 0
+        self.nrTruncated = 0 # nr of robot records that did not fit all the distances
+
+        header = json.dumps({
+                "nrRobots": len(robots),
+                "maxNeighbours": maxNeighbours,
+                "uids": self.uids,
+                "knownRobots": {str(robot.uid): list(robot.known_robots) for robot in robots},
+                "seed": seed,
+                }).encode()
+        header += b" " * (-(len(MAGIC) + HEADER_LENGTH.size + len(header)) % 8)
+        self.file_out = open(path, "wb")
+        self.file_out.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+    # end __init__()
+
+    def writeStep(self, robots):
+        """Append the raw input state and output state of all robots (in the same order as at construction time)"""
+        record = self.record
+        offset = 0
+        for robot in robots:
+            distances = robot.raw_input_state["distances"]
+            if (len(distances) > self.maxNeighbours):
+                if (self.nrTruncated == 0):
+                    logging.warning("Robot %d has %d neighbours, only the closest %d are recorded" % (robot.uid, len(distances), self.maxNeighbours))
+                self.nrTruncated += 1
+                distances = dict(sorted(distances.items(), key = lambda item: item[1])[:self.maxNeighbours])
+
+            nr = len(distances)
+            distanceStruct = self.distanceStructs.get(nr)
+            if (distanceStruct is None):
+                distanceStruct = self.distanceStructs[nr] = struct.Struct("<" + "Ii" * nr)
+            motion, led_rgb = robot.motion, robot.led_rgb
+            ROBOT_HEADER.pack_into(record, offset, int(robot.raw_input_state["light"]), self.motionCode[motion],
+                    led_rgb[0], led_rgb[1], led_rgb[2], nr)
+            pairs = []
+            for uid, d in distances.items():
+                pairs.append(uid)
+                pairs.append(int(round(d)))
+            distanceStruct.pack_into(record, offset + ROBOT_HEADER.size, *pairs)
+            offset += self.robotRecordSize
+        self.file_out.write(record)
+        self.nrSteps += 1
+    # end writeStep()
+
+    def close(self):
+        """Flush and close the trace file"""
+        self.file_out.close()
+        logging.info("Recorded %d steps (%d truncated robot records)" % (self.nrSteps, self.nrTruncated))
+    # end close()
+# end class TraceRecorder
+
+class ReplayBridge():
+
+    """Bridge that replays a trace file written by TraceRecorder, with the same interface as vrep_bridge.VrepBridge.
+    The trace is memory mapped, so only the pages of the steps that are replayed are read from disk.
+    Each robot reads (getState) and writes (setState) the records in step order. The output states received through setState()
+    are compared with the recorded ones."""
+
+    def __init__(self, path):
+        """
+        :path: path of a trace file written by TraceRecorder"""
+        self.file_in = open(path, "rb")
+        self.trace = mmap.mmap(self.file_in.fileno(), 0, access = mmap.ACCESS_READ)
+        if (self.trace[:len(MAGIC)] != MAGIC):
+            raise ValueError("%s is not a trace file" % path)
+        headerLength = HEADER_LENGTH.unpack_from(self.trace, len(MAGIC))[0]
+        self.dataOffset = len(MAGIC) + HEADER_LENGTH.size + headerLength
+        header = json.loads(self.trace[len(MAGIC) + HEADER_LENGTH.size:self.dataOffset].decode())
+
+        self.nrRobots = header["nrRobots"]
+        self.maxNeighbours = header["maxNeighbours"]
+        self.seed = header["seed"]
+        self.knownRobots = {int(uid): known for uid, known in header["knownRobots"].items()}
+        self.robotOffset = {uid: index * (ROBOT_HEADER.size + self.maxNeighbours * DISTANCE_SIZE) for index, uid in enumerate(header["uids"])}
+        self.recordSize = self.nrRobots * (ROBOT_HEADER.size + self.maxNeighbours * DISTANCE_SIZE)
+        # an incomplete last record (interrupted recording) is ignored
+        self.nrSteps = (len(self.trace) - self.dataOffset) // self.recordSize if self.recordSize else 0
+
+        self.distanceStructs = {} # dictionary {nr_distances: struct.Struct of nr_distances (uid, distance) pairs}
+        self.motions = motionCodes()
+        self.readStep = {uid: 0 for uid in self.robotOffset} # dictionary {robot_uid: next step read by getState()}
+        self.writeStep = {uid: 0 for uid in self.robotOffset} # dictionary {robot_uid: next step checked by setState()}
+        self.lastOutput = {} # dictionary {robot_uid: (motion, led_rgb)} of the last output state received by setStates()
+        self.nrChecked = 0 # nr of output states compared with the trace
+        self.nrMismatches = 0 # nr of output states different from the recorded ones
+        logging.info("Replaying %d steps of %d robots from %s" % (self.nrSteps, self.nrRobots, path))
+    # end __init__()
+
+    def spawnRobots(self, nr = 1, spawnType = None):
+        """Check that the swarm has the same number of robots as the recorded one (the robots are not spawned)"""
+        if (nr + 1 != self.nrRobots):
+            raise ValueError("The trace contains %d robots, the swarm has %d" % (self.nrRobots, nr + 1))
+    # end spawnRobots()
+
+    def removeRobots(self):
+        """There are no spawned robots to remove"""
+        pass
+    # end removeRobots()
+
+    def getKnownRobotIds(self, uid):
+        """Return the recorded list of robot IDs known (friend) to robot uid"""
+        return list(self.knownRobots[uid])
+    # end getKnownRobotIds()
+
+    def getAllKnownRobotIds(self, uids):
+        """Batched variant of getKnownRobotIds()
+
+        :returns: dictionary {robot_uid: list of robot IDs}"""
+        return {uid: list(self.knownRobots[uid]) for uid in uids}
+    # end getAllKnownRobotIds()
+
+    def robotRecord(self, uid, steps):
+        """Return the offset of the next record of robot uid (from steps[uid]) and advance steps[uid]"""
+        step = steps[uid]
+        if (step >= self.nrSteps):
+            raise EOFError("The trace contains only %d steps" % self.nrSteps)
+        steps[uid] = step + 1
+        return self.dataOffset + step * self.recordSize + self.robotOffset[uid]
+    # end robotRecord()
+
+    def getState(self, uid):
+        """Return the next recorded raw input state of robot uid
+
+        :returns: dictionary {"distances": {robot_uid: distance}, "light": light_intensity}"""
+        offset = self.robotRecord(uid, self.readStep)
+        light, motion, r, g, b, nr = ROBOT_HEADER.unpack_from(self.trace, offset)
+        distanceStruct = self.distanceStructs.get(nr)
+        if (distanceStruct is None):
+            distanceStruct = self.distanceStructs[nr] = struct.Struct("<" + "Ii" * nr)
+        pairs = distanceStruct.unpack_from(self.trace, offset + ROBOT_HEADER.size)
+        return {"distances": dict(zip(pairs[0::2], pairs[1::2])), "light": light}
+    # end getState()
+
+    def getStates(self, uids):
+        """Batched variant of getState()
+
+        :returns: dictionary {robot_uid: raw_input_state}"""
+        return {uid: self.getState(uid) for uid in uids}
+    # end getStates()
+
+    def setState(self, uid, motion, led_rgb):
+        """Compare an output state with the next recorded output state of robot uid.
+        Only robot uid is advanced to its next step, so when commands are sent only to some of the robots (delta encoded outputs)
+        setStates() must be used instead"""
+        step = self.writeStep[uid]
+        offset = self.robotRecord(uid, self.writeStep)
+        light, motionCode, r, g, b, nr = ROBOT_HEADER.unpack_from(self.trace, offset)
+        self.nrChecked += 1
+        if (motion != self.motions[motionCode] or list(led_rgb) != [r, g, b]):
+            if (self.nrMismatches == 0):
+                logging.warning("Step %d robot %d: output (%s, %s) differs from the recorded (%s, %s)" % (step, uid, motion,
+                    led_rgb, self.motions[motionCode], [r, g, b]))
+            self.nrMismatches += 1
+    # end setState()
+
+    def setStates(self, outputs):
+        """Batched variant of setState(). The robots that are not present in outputs (delta encoded outputs) are checked
+        against their last received output state
+
+        :outputs: dictionary {robot_uid: (motion, led_rgb)}"""
+        self.lastOutput.update(outputs)
+        for uid in self.robotOffset:
+            if (uid in self.lastOutput):
+                self.setState(uid, *self.lastOutput[uid])
+            else:
+                # skip the record of a robot that has not received any command yet
+                self.robotRecord(uid, self.writeStep)
+    # end setStates()
+
+    def printStats(self):
+        """Print the result of the comparison with the recorded output states"""
+        print("\nReplay: %d output states checked, %d mismatches" % (self.nrChecked, self.nrMismatches))
+    # end printStats()
+
+    def close(self):
+        """Unmap and close the trace file"""
+        self.trace.close()
+        self.file_in.close()
+    # end close()
+# end class ReplayBridge
@@ -0,0 +1,68 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+SNAPSHOT_VERSION = 1 # increase when the structure of the snapshot changes
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lulu_kilobot")
+
+class StartupCache():
+
+    """On disk snapshot of the prepared P system (parsed input and config, cloned and wildcard expanded Pcolonies).
+    Each combination of input files and startup options has its own snapshot file. The snapshot is valid only if the
+    content of the input files, the startup options and the source files that build the snapshot are unchanged (content
+    hash key); a stale snapshot is replaced at the next save()."""
+
+    def __init__(self, directory, inputFiles, options, sourceFiles):
+        """
+        :directory: directory that stores the snapshot files
+        :inputFiles: list of paths of the input and config files
+        :options: dictionary of the startup options that change the prepared P system
+        :sourceFiles: list of paths of the source files that build the prepared P system"""
+        self.directory = directory
+        slot = hashlib.sha256(repr(([os.path.abspath(path) for path in inputFiles], sorted(options.items()))).encode())
+        self.path = os.path.join(directory, "snapshot_%s.pickle" % slot.hexdigest()[:16])
+
+        key = hashlib.sha256(("%d %s" % (SNAPSHOT_VERSION, sorted(options.items()))).encode())
+        for path in list(inputFiles) + list(sourceFiles):
+            with open(path, "rb") as file_in:
+                key.update(hashlib.sha256(file_in.read()).digest())
+        self.key = key.hexdigest()
+    # end __init__()
+
+    def load(self):
+        """Load the snapshot if it exists and is valid
+
+        :returns: the snapshot object saved by save() or None (cache miss)"""
+        start = time.perf_counter()
+        try:
+            with open(self.path, "rb") as file_in:
+                # the key is stored first, so that a stale snapshot is rejected without loading it
+                if (pickle.load(file_in) != self.key):
+                    logging.info("Startup snapshot %s is stale" % self.path)
+                    return None
+                snapshot = pickle.load(file_in)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            logging.warning("Startup snapshot %s could not be loaded (%s)" % (self.path, e))
+            return None
+        logging.info("Startup snapshot hit: loaded %s in %.3f s" % (self.path, time.perf_counter() - start))
+        return snapshot
+    # end load()
+
+    def save(self, snapshot):
+        """Save a snapshot (the file is replaced atomically)
+
+        :snapshot: the object that is saved"""
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok = True)
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "wb") as file_out:
+            pickle.dump(self.key, file_out, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(snapshot, file_out, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, self.path)
+        logging.info("Startup snapshot saved to %s in %.3f s" % (self.path, time.perf_counter() - start))
+    # end save()
+# end class StartupCache
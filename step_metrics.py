@@ -0,0 +1,197 @@
+import bisect
+import json
+import os
+import time
+
+# upper bounds (seconds) of the histogram buckets: 1 us .. 100 s, 10 buckets per decade
+BUCKET_BOUNDS = [10 ** (exponent / 10.0) for exponent in range(-60, 21)]
+
+class Histogram():
+
+    """Histogram of durations with fixed logarithmic buckets (constant memory, O(log B) per sample)"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1) # the last bucket holds the values above BUCKET_BOUNDS[-1]
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    # end __init__()
+
+    def add(self, value):
+        """Add a duration (seconds) to the histogram"""
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if (value > self.max):
+            self.max = value
+    # end add()
+
+    def percentile(self, p):
+        """Return an estimate of the p-th percentile (the upper bound of the bucket that contains it)
+
+        :p: percentile between 0 and 100"""
+        if (self.count == 0):
+            return 0.0
+        rank = p / 100.0 * self.count
+        cumulative = 0
+        for index, nr in enumerate(self.buckets):
+            cumulative += nr
+            if (cumulative >= rank):
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+    # end percentile()
+
+    def summary(self):
+        """Return a dictionary with the count, mean, p50, p95, p99 and max values"""
+        return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50),
+                "p95": self.percentile(95),
+                "p99": self.percentile(99),
+                "max": self.max,
+                }
+    # end summary()
+# end class Histogram
+
+class MetricsRecorder():
+
+    """Records phase durations measured on another thread (ex the I/O thread of AsyncControlLoop). StepMetrics is not thread
+    safe, so the records are added to it later by the thread that owns it (replay())."""
+
+    def __init__(self):
+        self.records = [] # list of (phase_name, robot_uid or None, duration)
+    # end __init__()
+
+    def add(self, phase, duration):
+        """Record the duration of a phase executed once per step"""
+        self.records.append((phase, None, duration))
+    # end add()
+
+    def addRobot(self, phase, uid, duration):
+        """Record the duration of a phase executed for one robot"""
+        self.records.append((phase, uid, duration))
+    # end addRobot()
+
+    def replay(self, metrics):
+        """Add the recorded durations to a StepMetrics (in the order in which they were recorded)"""
+        for phase, uid, duration in self.records:
+            if (uid is None):
+                metrics.add(phase, duration)
+            else:
+                metrics.addRobot(phase, uid, duration)
+    # end replay()
+# end class MetricsRecorder
+
+class StepMetrics():
+
+    """Timing of the phases of the control steps.
+    Each phase (ex getState, procInputModule, runSimulationStep) has a per step histogram (time spent in the phase during
+    one step, for the whole swarm) and, for the phases that are executed for each robot, a per robot histogram (swarm wide)
+    and the total time of each robot. The metrics are exported periodically to a json, csv or Prometheus text file."""
+
+    def __init__(self, path = None, format = "json", interval = 10.0):
+        """
+        :path: the file the metrics are exported to (None = no export)
+        :format: export format (json, csv or prom)
+        :interval: minimum time (s) between two exports"""
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.stepPhases = {} # dictionary {phase_name: Histogram of the per step durations}
+        self.robotPhases = {} # dictionary {phase_name: Histogram of the per robot durations}
+        self.robotTotals = {} # dictionary {phase_name: {robot_uid: total_duration}}
+        self.current = {} # dictionary {phase_name: duration accumulated during the current step}
+        self.nrSteps = 0
+        self.lastExport = time.monotonic()
+    # end __init__()
+
+    def addRobot(self, phase, uid, duration):
+        """Record the duration of a phase executed for one robot (also accumulated to the per step duration)"""
+        histogram = self.robotPhases.get(phase)
+        if (histogram is None):
+            histogram = self.robotPhases[phase] = Histogram()
+            self.robotTotals[phase] = {}
+        histogram.add(duration)
+        totals = self.robotTotals[phase]
+        totals[uid] = totals.get(uid, 0.0) + duration
+        self.current[phase] = self.current.get(phase, 0.0) + duration
+    # end addRobot()
+
+    def add(self, phase, duration):
+        """Record the duration of a phase executed once per step (accumulated to the per step duration)"""
+        self.current[phase] = self.current.get(phase, 0.0) + duration
+    # end add()
+
+    def endStep(self):
+        """Close the current step: the accumulated phase durations are added to the per step histograms"""
+        for phase, duration in self.current.items():
+            histogram = self.stepPhases.get(phase)
+            if (histogram is None):
+                histogram = self.stepPhases[phase] = Histogram()
+            histogram.add(duration)
+        self.current = {}
+        self.nrSteps += 1
+
+        if (self.path is not None and time.monotonic() - self.lastExport >= self.interval):
+            self.export()
+    # end endStep()
+
+    def export(self):
+        """Write the current metrics to self.path (the file is replaced atomically)"""
+        self.lastExport = time.monotonic()
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as file_out:
+            if (self.format == "csv"):
+                self.writeCsv(file_out)
+            elif (self.format == "prom"):
+                self.writePrometheus(file_out)
+            else:
+                self.writeJson(file_out)
+        os.replace(tmpPath, self.path)
+    # end export()
+
+    def rows(self):
+        """Return a list of (scope, phase, summary) for all histograms (scope is 'step' or 'robot')"""
+        return [("step", phase, histogram.summary()) for phase, histogram in sorted(self.stepPhases.items())] + \
+                [("robot", phase, histogram.summary()) for phase, histogram in sorted(self.robotPhases.items())]
+    # end rows()
+
+    def writeJson(self, file_out):
+        """Write the metrics as a json document"""
+        result = {"steps": self.nrSteps, "step": {}, "robot": {}, "robot_totals": {}}
+        for scope, phase, summary in self.rows():
+            result[scope][phase] = summary
+        for phase, totals in self.robotTotals.items():
+            result["robot_totals"][phase] = {str(uid): total for uid, total in sorted(totals.items())}
+        json.dump(result, file_out, indent = 2)
+    # end writeJson()
+
+    def writeCsv(self, file_out):
+        """Write the metrics as a csv table (one row for each histogram)"""
+        file_out.write("scope,phase,count,mean,p50,p95,p99,max\n")
+        for scope, phase, summary in self.rows():
+            file_out.write("%s,%s,%d,%.9f,%.9f,%.9f,%.9f,%.9f\n" % (scope, phase, summary["count"], summary["mean"],
+                summary["p50"], summary["p95"], summary["p99"], summary["max"]))
+    # end writeCsv()
+
+    def writePrometheus(self, file_out):
+        """Write the metrics in the Prometheus text exposition format"""
+        file_out.write("# TYPE lulu_kilobot_steps_total counter\nlulu_kilobot_steps_total %d\n" % self.nrSteps)
+        file_out.write("# TYPE lulu_kilobot_phase_seconds summary\n")
+        for scope, phase, summary in self.rows():
+            labels = 'scope="%s",phase="%s"' % (scope, phase)
+            for quantile in ("p50", "p95", "p99"):
+                file_out.write('lulu_kilobot_phase_seconds{%s,quantile="0.%s"} %.9f\n' % (labels, quantile[1:], summary[quantile]))
+            file_out.write("lulu_kilobot_phase_seconds_sum{%s} %.9f\n" % (labels, summary["mean"] * summary["count"]))
+            file_out.write("lulu_kilobot_phase_seconds_count{%s} %d\n" % (labels, summary["count"]))
+    # end writePrometheus()
+
+    def printSummary(self):
+        """Print the per step and per robot summaries"""
+        print("\n%-6s %-20s %8s %10s %10s %10s %10s" % ("scope", "phase", "count", "p50 (ms)", "p95 (ms)", "p99 (ms)", "max (ms)"))
+        for scope, phase, summary in self.rows():
+            print("%-6s %-20s %8d %10.3f %10.3f %10.3f %10.3f" % (scope, phase, summary["count"], summary["p50"] * 1000,
+                summary["p95"] * 1000, summary["p99"] * 1000, summary["max"] * 1000))
+    # end printSummary()
+# end class StepMetrics
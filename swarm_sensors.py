@@ -0,0 +1,305 @@
+import numpy as np
+
+class SwarmSensorArrays():
+
+    """Swarm level storage and classification of the sensor readings, using NumPy arrays.
+    Every robot has a row of neighbour slots (row = receiving robot, slot = one known neighbour): the uid of the neighbour,
+    its current and previous distance and the order of its first measurement, together with a mask of the used slots, and
+    the light intensities are stored in vectors of length N. The rows grow when a robot knows more neighbours than it has
+    slots (at most capacity slots if the history is bounded), so the arrays and the work of each step grow with the number of
+    known neighbours (N x slots) and not with the square of the swarm size.
+    classify() computes the small / big, increasing / decreasing / constant classification of every robot in a few array
+    operations, and each Kilobot reads the result through a SensorView (that implements the same queries as NeighbourIndex).
+    The history is bounded like in NeighbourIndex: a neighbour that was not measured during the last maxAge updates is
+    forgotten, and when capacity neighbours are known a new neighbour replaces the least recently measured one (the farthest
+    one among the equally old)."""
+
+    def __init__(self, nrRobots, maxAge = 0, capacity = 0, nrSlots = 8):
+        """
+        :nrRobots: the number of robots of the swarm (robot uids are 0 .. nrRobots-1)
+        :maxAge: number of updates after which a neighbour that was not measured again is forgotten (0 = never)
+        :capacity: maximum number of neighbours of each robot (0 = unbounded)
+        :nrSlots: initial number of neighbour slots of each robot (used only if capacity is 0)"""
+        self.nrRobots = nrRobots
+        self.maxAge = maxAge
+        self.capacity = capacity
+        self.stepNr = 0 # nr of updates
+        nrSlots = capacity if capacity > 0 else nrSlots
+        self.neighbour = np.full((nrRobots, nrSlots), -1, dtype = np.int64) # uid of the neighbour of each slot
+        self.distances = np.zeros((nrRobots, nrSlots)) # most recent distance measurements
+        self.distances_prev = np.zeros((nrRobots, nrSlots)) # previous distance measurements
+        self.known = np.zeros((nrRobots, nrSlots), dtype = bool) # True if the slot holds a known neighbour
+        # nr of the update that measured the neighbour of each slot (needed only to expire or replace neighbours)
+        self.lastSeen = np.zeros((nrRobots, nrSlots), dtype = np.int64) if maxAge > 0 or capacity > 0 else None
+        self.rank = np.zeros((nrRobots, nrSlots), dtype = np.int64) # order of the first measurement of the neighbour of each slot
+        self.nextRank = np.zeros(nrRobots, dtype = np.int64) # rank of the next new neighbour of each robot
+        self.light = np.full(nrRobots, -1.0) # current light intensity (-1 = no measurement yet)
+        self.light_prev = np.full(nrRobots, -1.0) # previous light intensity
+
+        # classification results (computed by classify())
+        self.small = np.zeros((nrRobots, nrSlots), dtype = bool) # True if the distance is small (<= threshold)
+        self.variation = np.zeros((nrRobots, nrSlots), dtype = np.int8) # -1 decreasing / 0 constant / +1 increasing
+        self.anySmall = np.zeros(nrRobots, dtype = bool) # True if at least one neighbour is close
+        self.minUid = np.full(nrRobots, -1, dtype = np.int64) # uid of the closest neighbour (-1 if there are no neighbours)
+        self.lightSmall = np.zeros(nrRobots, dtype = bool) # True if the light intensity is low (<= threshold)
+        self.lightVariation = np.zeros(nrRobots, dtype = np.int8) # -1 decreasing / 0 constant / +1 increasing
+        self.distanceThreshold = None # distance threshold used by the last classify()
+    # end __init__()
+
+    def findSlots(self, rows, cols):
+        """Return the slots of neighbours cols of robots rows (-1 if the neighbour is not known)
+
+        :rows: the robots
+        :cols: the uids of the neighbours"""
+        match = self.known[rows] & (self.neighbour[rows] == cols[:, np.newaxis])
+        return np.where(match.any(axis = 1), match.argmax(axis = 1), -1)
+    # end findSlots()
+
+    def growSlots(self, nrSlots):
+        """Increase the number of neighbour slots of every robot to nrSlots (only if the history is unbounded)"""
+        extra = nrSlots - self.known.shape[1]
+        self.neighbour = np.pad(self.neighbour, ((0, 0), (0, extra)), constant_values = -1)
+        self.distances = np.pad(self.distances, ((0, 0), (0, extra)))
+        self.distances_prev = np.pad(self.distances_prev, ((0, 0), (0, extra)))
+        self.known = np.pad(self.known, ((0, 0), (0, extra)))
+        if (self.lastSeen is not None):
+            self.lastSeen = np.pad(self.lastSeen, ((0, 0), (0, extra)))
+        self.rank = np.pad(self.rank, ((0, 0), (0, extra)))
+        self.small = np.pad(self.small, ((0, 0), (0, extra)))
+        self.variation = np.pad(self.variation, ((0, 0), (0, extra)))
+    # end growSlots()
+
+    def update(self, robots):
+        """Store the raw input state (Kilobot.raw_input_state) of all robots
+
+        :robots: list of Kilobot objects"""
+        rows, cols, values = [], [], []
+        uids, lights = [], []
+        for robot in robots:
+            measurements = robot.raw_input_state["distances"]
+            rows.extend([robot.uid] * len(measurements))
+            cols.extend(measurements.keys())
+            values.extend(measurements.values())
+            uids.append(robot.uid)
+            lights.append(robot.raw_input_state["light"])
+
+        rows = np.array(rows, dtype = np.int64)
+        cols = np.array(cols, dtype = np.int64)
+        values = np.array(values, dtype = float)
+        # ignore measurements from robots that are not part of the swarm
+        valid = cols < self.nrRobots
+        rows, cols, values = rows[valid], cols[valid], values[valid]
+
+        # the neighbours that are already known: the current distance becomes the previous one
+        slots = self.findSlots(rows, cols)
+        known = slots >= 0
+        oldRows, oldSlots = rows[known], slots[known]
+        self.distances_prev[oldRows, oldSlots] = self.distances[oldRows, oldSlots]
+        self.distances[oldRows, oldSlots] = values[known]
+        self.stepNr += 1
+        if (self.lastSeen is not None):
+            self.lastSeen[oldRows, oldSlots] = self.stepNr
+        if (self.maxAge > 0):
+            # forget the neighbours that were not measured during the last maxAge updates
+            self.known &= (self.stepNr - self.lastSeen) <= self.maxAge
+
+        # the new neighbours (added after the expiry of the old ones, like NeighbourIndex does)
+        new = ~known
+        if (new.any()):
+            self.addNeighbours(rows[new], cols[new], values[new])
+
+        uids = np.array(uids, dtype = np.int64)
+        lights = np.array(lights, dtype = float)
+        # the previous light intensity of a first measurement is the measurement itself
+        self.light_prev[uids] = np.where(self.light[uids] != -1, self.light[uids], lights)
+        self.light[uids] = lights
+    # end update()
+
+    def addNeighbours(self, rows, cols, values):
+        """Store the first measurements of new neighbours. Each new neighbour gets the next rank of its robot, in the order of
+        the measurements (the measurements of a robot are contiguous), and a free slot of its robot
+
+        :rows: the robots that measured the new neighbours
+        :cols: the uids of the new neighbours
+        :values: the measured distances"""
+        robotRows, nrNew = np.unique(rows, return_counts = True)
+        nrKnown = self.known[robotRows].sum(axis = 1)
+        if (self.capacity > 0):
+            # the robots whose new neighbours do not all fit are processed one measurement at a time
+            full = robotRows[nrKnown + nrNew > self.capacity]
+            if (len(full) > 0):
+                bounded = np.isin(rows, full)
+                for row, col, value in zip(rows[bounded].tolist(), cols[bounded].tolist(), values[bounded].tolist()):
+                    self.replaceNeighbour(row, col, value)
+                rows, cols, values = rows[~bounded], cols[~bounded], values[~bounded]
+                if (len(rows) == 0):
+                    return
+                robotRows, nrNew = np.unique(rows, return_counts = True)
+        elif ((nrKnown + nrNew).max() > self.known.shape[1]):
+            self.growSlots(max(2 * self.known.shape[1], int((nrKnown + nrNew).max())))
+
+        # position of each measurement among the new measurements of the same robot
+        first = np.ones(len(rows), dtype = bool)
+        first[1:] = rows[1:] != rows[:-1]
+        starts = np.flatnonzero(first)
+        offsets = np.arange(len(rows)) - starts[np.cumsum(first) - 1]
+
+        # the n-th new neighbour of a robot takes its n-th free slot (the free slots come first in the stable sort)
+        freeSlots = np.argsort(self.known[robotRows], axis = 1, kind = "stable")
+        slots = freeSlots[np.searchsorted(robotRows, rows), offsets]
+
+        # the previous distance of a first measurement is the measurement itself
+        self.neighbour[rows, slots] = cols
+        self.distances[rows, slots] = values
+        self.distances_prev[rows, slots] = values
+        self.known[rows, slots] = True
+        if (self.lastSeen is not None):
+            self.lastSeen[rows, slots] = self.stepNr
+        self.rank[rows, slots] = self.nextRank[rows] + offsets
+        np.add.at(self.nextRank, rows, 1)
+    # end addNeighbours()
+
+    def replaceNeighbour(self, row, col, value):
+        """Store the first measurement of a new neighbour of a robot that can know at most capacity neighbours. If the
+        capacity is reached, the new neighbour replaces the least recently measured one (the farthest one among the equally
+        old, the first measured one among the equally far), unless all the known neighbours were measured now and are closer
+
+        :row: the robot that measured the new neighbour
+        :col: the uid of the new neighbour
+        :value: the measured distance"""
+        knownSlots = np.flatnonzero(self.known[row])
+        if (len(knownSlots) >= self.capacity):
+            victim = knownSlots[np.lexsort((self.rank[row, knownSlots], -self.distances[row, knownSlots],
+                self.lastSeen[row, knownSlots]))[0]]
+            if (self.lastSeen[row, victim] == self.stepNr and self.distances[row, victim] <= value):
+                return
+            self.known[row, victim] = False
+        slot = np.flatnonzero(~self.known[row])[0]
+        self.neighbour[row, slot] = col
+        self.distances[row, slot] = self.distances_prev[row, slot] = value
+        self.known[row, slot] = True
+        self.lastSeen[row, slot] = self.stepNr
+        self.rank[row, slot] = self.nextRank[row]
+        self.nextRank[row] += 1
+    # end replaceNeighbour()
+
+    def classify(self, paramLightThreshold = 20, paramDistanceThreshold = 55):
+        """Classify the stored readings of all robots
+
+        :paramLightThreshold: light threshold value used to classify a light sensor reading as low or high
+        :paramDistanceThreshold: distance threshold value used to classify a distance from a robot as small or big"""
+        self.distanceThreshold = paramDistanceThreshold
+        known = self.known
+        self.small = known & (self.distances <= paramDistanceThreshold)
+        self.variation = np.where(known, np.sign(self.distances - self.distances_prev), 0).astype(np.int8)
+        self.anySmall = self.small.any(axis = 1)
+
+        # the closest neighbour, the first measured one in case of a tie (like NeighbourIndex)
+        masked = np.where(known, self.distances, np.inf)
+        closest = known & (masked == masked.min(axis = 1, keepdims = True))
+        firstClosest = np.where(closest, self.rank, np.iinfo(np.int64).max).argmin(axis = 1)
+        self.minUid = np.where(known.any(axis = 1), self.neighbour[np.arange(self.nrRobots), firstClosest], -1)
+
+        self.lightSmall = self.light <= paramLightThreshold
+        self.lightVariation = np.sign(self.light - self.light_prev).astype(np.int8)
+    # end classify()
+
+    def clear(self, uid):
+        """Forget all the neighbours of robot uid"""
+        self.known[uid, :] = False
+        self.nextRank[uid] = 0
+    # end clear()
+
+    def view(self, uid):
+        """Return the SensorView of robot uid"""
+        return SensorView(self, uid)
+    # end view()
+# end class SwarmSensorArrays
+
+class SensorView():
+
+    """Read only view of the classification results of one robot, with the same query interface as NeighbourIndex.
+    Neighbours are ordered by the time of their first measurement, like in NeighbourIndex."""
+
+    def __init__(self, arrays, uid):
+        self.arrays = arrays
+        self.uid = uid
+    # end __init__()
+
+    def orderedSlots(self):
+        """Return the used slots of the robot in the order of the first measurement of their neighbours"""
+        slots = np.flatnonzero(self.arrays.known[self.uid])
+        return slots[np.argsort(self.arrays.rank[self.uid, slots], kind = "stable")]
+
+    def slot(self, uid):
+        """Return the slot of neighbour uid (None if it is not known)"""
+        slots = np.flatnonzero(self.arrays.known[self.uid] & (self.arrays.neighbour[self.uid] == uid))
+        return slots[0] if len(slots) > 0 else None
+
+    @property
+    def distances(self):
+        """Dictionary of the most recent distance measurements = {robot_uid: distance}"""
+        slots = self.orderedSlots()
+        return dict(zip(self.arrays.neighbour[self.uid, slots].tolist(), self.arrays.distances[self.uid, slots].tolist()))
+
+    @property
+    def distances_prev(self):
+        """Dictionary of previous distance measurements = {robot_uid: distance}"""
+        slots = self.orderedSlots()
+        return dict(zip(self.arrays.neighbour[self.uid, slots].tolist(), self.arrays.distances_prev[self.uid, slots].tolist()))
+
+    @property
+    def order(self):
+        """List of neighbour uids in the order of their first measurement"""
+        return self.arrays.neighbour[self.uid, self.orderedSlots()].tolist()
+
+    @property
+    def light(self):
+        """Current light intensity"""
+        return float(self.arrays.light[self.uid])
+
+    @property
+    def light_prev(self):
+        """Previous light intensity"""
+        return float(self.arrays.light_prev[self.uid])
+
+    @property
+    def lightSmall(self):
+        """True if the light intensity is low"""
+        return bool(self.arrays.lightSmall[self.uid])
+
+    @property
+    def lightVariation(self):
+        """Light intensity variation (-1 decreasing / 0 constant / +1 increasing)"""
+        return int(self.arrays.lightVariation[self.uid])
+
+    def checkThreshold(self, threshold):
+        """Check that the queries use the threshold that was used by SwarmSensorArrays.classify()"""
+        if (threshold != self.arrays.distanceThreshold):
+            raise ValueError("SensorView queried with threshold %s, but the readings were classified with %s" % (threshold, self.arrays.distanceThreshold))
+
+    def anySmall(self, threshold):
+        """Return True if at least one neighbour is closer than (or at) threshold"""
+        self.checkThreshold(threshold)
+        return bool(self.arrays.anySmall[self.uid])
+
+    def minNeighbour(self):
+        """Return the uid of the closest neighbour (the first measured one in case of a tie) or None if there are no neighbours"""
+        uid = int(self.arrays.minUid[self.uid])
+        return uid if uid >= 0 else None
+
+    def isSmall(self, uid, threshold):
+        """Return True if the distance from robot uid is known and small"""
+        self.checkThreshold(threshold)
+        slot = self.slot(uid)
+        return slot is not None and bool(self.arrays.small[self.uid, slot])
+
+    def variation(self, uid):
+        """Return the variation of the distance from robot uid (-1 decreasing / 0 constant or unknown / +1 increasing)"""
+        slot = self.slot(uid)
+        return int(self.arrays.variation[self.uid, slot]) if slot is not None else 0
+
+    def clear(self):
+        """Forget all neighbours"""
+        self.arrays.clear(self.uid)
+# end class SensorView
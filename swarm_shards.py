@@ -0,0 +1,529 @@
+import os
+import sys
+import random
+import socket
+import logging
+import collections
+import contextlib
+import multiprocessing
+from multiprocessing.connection import Listener, Client, wait
+from time import perf_counter
+from lulu_pcol_sim import sim
+from vrep_bridge import vrep_bridge
+from kinematic_bridge import KinematicBridge
+from vrep_batch import BatchedVrepBridge
+from event_scheduler import EventScheduler
+from parallel_swarm import combineSimResults, envDelta, mergeEnvDelta, consumesObjects, saveColonyState, restoreColonyState
+import lulu_kilobot
+
+def parseAddress(text):
+    """Convert a host:port string into a (host, port) address
+
+    :text: the address (ex 127.0.0.1:6000, the host can be omitted)
+    :returns: tuple (host, port)"""
+    host, port = text.rsplit(":", 1) if ":" in text else ("", text)
+    return (host or "127.0.0.1", int(port))
+# end parseAddress()
+
+def setNoDelay(conn):
+    """Disable the Nagle algorithm on the socket of a multiprocessing connection, the shards and the coordinator exchange
+    small messages in both directions"""
+    with socket.socket(fileno = os.dup(conn.fileno())) as sock:
+        if (sock.family in (socket.AF_INET, socket.AF_INET6)):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+# end setNoDelay()
+
+class ShardBridge():
+
+    """Bridge adapter used by a shard: the robots of the shard keep their swarm uids, while the robots of the bridge
+    connection owned by the shard are numbered from 0 (like the robots of any V-REP scene).
+    The robot uids of the distance readings and of the known robot IDs are translated to swarm uids. The scene of a shard
+    contains only the robots of the shard, so the robots of different shards never sense each other (any other uid reported
+    by the bridge is dropped)."""
+
+    def __init__(self, bridge, uids):
+        """
+        :bridge: the bridge connection owned by the shard (vrep_bridge.VrepBridge or compatible)
+        :uids: list of the swarm uids of the shard robots (uids[i] is robot i of the bridge)"""
+        self.bridge = bridge
+        self.uids = list(uids) # list of swarm uids, indexed by bridge uid
+        self.bridgeUid = {uid: i for i, uid in enumerate(self.uids)} # dictionary {swarm_uid: bridge_uid}
+    # end __init__()
+
+    def spawnRobots(self, nr = 1, spawnType = vrep_bridge.SpawnType.ox_plus):
+        """Spawn the robots of the shard in the scene of its bridge"""
+        self.bridge.spawnRobots(nr = nr, spawnType = spawnType)
+    # end spawnRobots()
+
+    def removeRobots(self):
+        """Remove the spawned robots from the scene of the bridge"""
+        self.bridge.removeRobots()
+    # end removeRobots()
+
+    def getKnownRobotIds(self, uid):
+        """Return the swarm uids of the robots known (friend) to robot uid"""
+        return [self.uids[other] for other in self.bridge.getKnownRobotIds(self.bridgeUid[uid]) if other < len(self.uids)]
+    # end getKnownRobotIds()
+
+    def getAllKnownRobotIds(self, uids):
+        """Batched variant of getKnownRobotIds()
+
+        :returns: dictionary {robot_uid: list of robot uids}"""
+        knownIds = lulu_kilobot.fetchKnownRobotIds(self.bridge, [self.bridgeUid[uid] for uid in uids])
+        return {self.uids[bridgeUid]: [self.uids[other] for other in known if other < len(self.uids)]
+                for bridgeUid, known in knownIds.items()}
+    # end getAllKnownRobotIds()
+
+    def swarmState(self, state):
+        """Translate the distance readings of a raw input state to swarm uids"""
+        uids = self.uids
+        state["distances"] = {uids[other]: distance for other, distance in state["distances"].items() if other < len(uids)}
+        return state
+    # end swarmState()
+
+    def getState(self, uid):
+        """Return the raw input state of robot uid"""
+        return self.swarmState(self.bridge.getState(self.bridgeUid[uid]))
+    # end getState()
+
+    def getStates(self, uids):
+        """Batched variant of getState() (uses the per robot calls if the bridge does not implement the batched ones)
+
+        :returns: dictionary {robot_uid: raw_input_state}"""
+        bridgeUids = [self.bridgeUid[uid] for uid in uids]
+        if (hasattr(self.bridge, "getStates")):
+            states = self.bridge.getStates(bridgeUids)
+        else:
+            states = {bridgeUid: self.bridge.getState(bridgeUid) for bridgeUid in bridgeUids}
+        return {self.uids[bridgeUid]: self.swarmState(state) for bridgeUid, state in states.items()}
+    # end getStates()
+
+    def setState(self, uid, motion, led_rgb):
+        """Apply a motion and led command to robot uid"""
+        self.bridge.setState(self.bridgeUid[uid], motion, led_rgb)
+    # end setState()
+
+    def setStates(self, outputs):
+        """Batched variant of setState()
+
+        :outputs: dictionary {robot_uid: (motion, led_rgb)}"""
+        if (hasattr(self.bridge, "setStates")):
+            self.bridge.setStates({self.bridgeUid[uid]: output for uid, output in outputs.items()})
+        else:
+            for uid, (motion, led_rgb) in outputs.items():
+                self.bridge.setState(self.bridgeUid[uid], motion, led_rgb)
+    # end setStates()
+# end class ShardBridge
+
+class ShardArbiter():
+
+    """SwarmController.stepArbiter of a shard: reports the global_env changes of the P system step to the coordinator before
+    the output module is processed and the outputs are written. If the changes consume objects, the shard waits for the
+    decision of the coordinator: if it rejects the changes (the shard consumed objects that another shard already consumed),
+    the Pcolonies are restored to their state before the step and the step is executed again on the global_env sent by the
+    coordinator."""
+
+    def __init__(self, conn, pObj):
+        """
+        :conn: multiprocessing.connection.Connection used to communicate with the coordinator
+        :pObj: the Pswarm of the shard"""
+        self.conn = conn
+        self.pObj = pObj
+        self.stepStart = None # perf_counter() value of the start of the current step
+        self.nrRetries = 0 # nr of P system steps that were executed again
+    # end __init__()
+
+    def __call__(self, stepFunction):
+        """Execute the P system step function until the coordinator accepts its global_env changes
+
+        :returns: the result of stepFunction"""
+        pObj = self.pObj
+        globalEnv = collections.Counter(pObj.global_env)
+        savedState = saveColonyState(list(pObj.colonies.values()))
+        while (True):
+            sim_result = stepFunction()
+            # report only the changes, so that the coordinator can merge the changes made by all shards
+            delta = envDelta(globalEnv, pObj.global_env)
+            self.conn.send(("step", sim_result, delta, perf_counter() - self.stepStart))
+            # changes that only add objects are always accepted
+            if (not consumesObjects(delta)):
+                return sim_result
+            command, mergedEnv = self.conn.recv()
+            if (command == "accept"):
+                return sim_result
+            # "retry": the step is executed again, starting from the global environment that contains the changes of the
+            # shards that were merged before this one
+            self.nrRetries += 1
+            restoreColonyState(savedState)
+            globalEnv = collections.Counter(mergedEnv)
+            pObj.global_env = collections.Counter(mergedEnv)
+    # end __call__()
+# end class ShardArbiter
+
+def serveShard(conn):
+    """Main loop of a shard: build the Pcolonies of the shard robots, connect to its own bridge and execute the control
+    steps requested by the coordinator
+
+    :conn: multiprocessing.connection.Connection used to communicate with the coordinator"""
+    setup = conn.recv()
+    startupStart = perf_counter()
+    shardNr, uids, options = setup["shardNr"], setup["uids"], setup["options"]
+    if (options["seed"] is not None):
+        # give each shard a distinct, but reproducible, random sequence
+        random.seed(options["seed"] + shardNr)
+
+    pObj = sim.readInputFile(setup["inputFile"])
+    if (type(pObj) != sim.Pswarm):
+        raise ValueError("Only a Pswarm can be split into shards")
+    config = lulu_kilobot.readConfigFile(setup["configFile"])
+    if (setup["nrRobots"] is not None):
+        config = lulu_kilobot.scaleConfig(config, setup["nrRobots"])
+    if (options["neighbourCapacity"] is not None):
+        config.neighbourCapacity = options["neighbourCapacity"]
+    config.fullClearDistances = options["fullClearDistances"]
+    # the robots of the other shards can also appear in the requests of the shard robots
+    lulu_kilobot.generateReplySymbols(range(config.nrRobots))
+    robots = lulu_kilobot.createSwarmRobots(pObj, config, deepcopyClones = options["deepcopy"],
+            lazyWildcards = options["lazyWildcards"], uids = uids)
+
+    if (options["offline"]):
+        bridge = ShardBridge(KinematicBridge(seed = (options["seed"] or 0) + shardNr), uids)
+    else:
+        bridge = ShardBridge(BatchedVrepBridge(vrep_bridge.VrepBridge(), options["sceneBatch"]), uids)
+    # spawn n-1 robots because 1 is already in the scene and is copied
+    bridge.spawnRobots(nr = len(uids) - 1, spawnType = config.spawnType)
+    if (options["offline"]):
+        # the KinematicBridge answers at once, and its answer does not change while the robots do not move
+        knownIds, nrPolls = lulu_kilobot.fetchKnownRobotIds(bridge, uids), 1
+    else:
+        # the robots need some time to broadcast and receive all neighbour IDs
+        knownIds, nrPolls = lulu_kilobot.waitForKnownRobotIds(bridge, uids, options["startupTimeout"], options["startupPoll"],
+                proceedOnTimeout = options["startupProceed"])
+    lulu_kilobot.loadKnownRobotIds(bridge, robots, knownIds)
+
+    swarmIO = lulu_kilobot.SwarmIO(bridge, robots, batched = options["batched"], deltaOutputs = options["deltaOutputs"],
+            keepAlive = options["keepAlive"])
+    controller = lulu_kilobot.SwarmController(pObj, robots, swarmIO, config)
+    controller.defineDefaultMotion = options["defineDefaultMotion"]
+    if (options["eventDriven"]):
+        controller.scheduler = EventScheduler(pObj, robots)
+    arbiter = controller.stepArbiter = ShardArbiter(conn, pObj)
+    conn.send((collections.Counter(pObj.global_env), perf_counter() - startupStart))
+    logging.info("Shard %d ready with %d robots (uids %d - %d), known robot IDs stable after %d polls" % (shardNr, len(robots),
+        uids[0], uids[-1], nrPolls))
+
+    lastEnv = None
+    waitTime = 0.0
+    while (True):
+        start = perf_counter()
+        command, globalEnv = conn.recv()
+        waitTime += perf_counter() - start
+        if (command == "stop"):
+            break
+        arbiter.stepStart = perf_counter()
+        # the robots of a quiescent Pcolony have to be serviced again if another shard changed the global environment
+        if (controller.scheduler is not None and globalEnv != lastEnv):
+            controller.scheduler.envChanged = True
+        pObj.global_env = collections.Counter(globalEnv)
+        # the global_env changes are reported (and arbitrated) by the arbiter, before the outputs are written
+        controller.step()
+        lastEnv = collections.Counter(pObj.global_env)
+
+    controller.close()
+    if (swarmIO.deltaOutputs):
+        swarmIO.printStats()
+    if (controller.scheduler is not None):
+        controller.scheduler.printStats()
+    conn.send({"waitTime": waitTime, "nrCollisions": getattr(bridge.bridge, "nrCollisions", None), "nrRetries": arbiter.nrRetries})
+# end serveShard()
+
+def runShard(address, authkey, quiet = False):
+    """Connect to a ShardCoordinator and serve one shard of the swarm until the coordinator stops it
+
+    :address: (host, port) address of the coordinator
+    :authkey: authentication key (bytes) shared with the coordinator
+    :quiet: discard the standard output of the shard (robot - Pcolony association table, statistics)"""
+    conn = Client(address, authkey = authkey)
+    setNoDelay(conn)
+    try:
+        if (quiet):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                serveShard(conn)
+        else:
+            serveShard(conn)
+    finally:
+        conn.close()
+# end runShard()
+
+class ShardCoordinator():
+
+    """Splits a Pswarm into shards that are served by several controller processes (local processes or processes started
+    on other hosts), each one with its own Pcolonies and its own bridge connection (a separate scene).
+    The shards are separate arenas: the robots of a shard sense and avoid only the robots of the same shard, so n shards run
+    n independent sub-swarms that interact only through the global environment (no distance readings are exchanged across
+    the shard boundaries, the result differs from one swarm of the same size). The local shards use the offline KinematicBridge (they cannot share the
+    default V-REP endpoint), a remote shard connects to the V-REP instance of its host.
+    The coordinator owns the swarm global_env: every step it sends the global_env to the shards and merges the changes they
+    report, in shard order. A shard reports its changes after its P system step, before it writes its outputs; if the changes
+    consume objects that were already consumed by the changes merged before (a multiplicity would become negative), they are
+    rejected and the shard executes its P system step again on the merged global_env (see ShardArbiter and nrConflicts).
+    With maxLag = 0 the shards are kept in step-lock (every shard executes step k starting from the same global_env).
+    With maxLag > 0 the shards are loosely synchronized: a shard starts its next step as soon as its changes are merged,
+    with the current global_env, as long as it is less than maxLag steps ahead of the slowest shard (the result then depends
+    on the timing of the shards)."""
+
+    def __init__(self, address = ("127.0.0.1", 0), authkey = None, maxLag = 0):
+        """
+        :address: (host, port) address the coordinator listens on (port 0 = any free port)
+        :authkey: authentication key (bytes) shared with the shards (None = random key, usable only by local shards)
+        :maxLag: maximum number of steps a shard can be ahead of the slowest shard (0 = step-lock)"""
+        self.authkey = authkey if authkey is not None else os.urandom(16)
+        self.listener = Listener(address, authkey = self.authkey)
+        self.address = self.listener.address
+        self.maxLag = maxLag
+        self.processes = [] # list of multiprocessing.Process of the local shards
+        self.connections = [] # list of multiprocessing.connection.Connection (one for each shard, in shard order)
+        self.shardUids = [] # list of lists of robot uids (one for each shard)
+        self.globalEnv = collections.Counter() # the global environment of the swarm
+        self.nrConflicts = 0 # nr of shard steps that were executed again because of conflicting global_env changes
+        self.nrSteps = 0 # nr of steps executed by the swarm (by the most advanced shard if the shards are loosely synchronized)
+        self.shardSteps = [] # nr of steps executed by each shard
+        self.busyTime = [] # time (s) spent by each shard executing steps
+        self.startupTime = [] # time (s) needed by each shard to build its Pcolonies and connect to its bridge
+        self.shardStats = [] # statistics reported by each shard when it is stopped
+        self.duration = 0.0 # duration (s) of run()
+        self.launchTime = None # perf_counter() value of the launch, used to report the launch to first step time (None = no report)
+        self.firstStepTime = None # time (s) from the launch to the end of the first step of all shards
+        logging.info("ShardCoordinator listening on %s:%d" % self.address)
+    # end __init__()
+
+    def startLocalShards(self, nrShards, quiet = False):
+        """Start shard processes on this machine (they connect to the coordinator like remote shards)
+
+        :nrShards: number of shard processes
+        :quiet: discard the standard output of the shards"""
+        # fork is used (like for ParallelSwarm) so that the shards use the same modules as this process
+        context = multiprocessing.get_context("fork")
+        for i in range(nrShards):
+            process = context.Process(target = runShard, args = (self.address, self.authkey, quiet), daemon = True)
+            process.start()
+            self.processes.append(process)
+    # end startLocalShards()
+
+    def acceptShards(self, nrShards):
+        """Wait for nrShards shards to connect (the shard numbers are given in connection order)"""
+        while (len(self.connections) < nrShards):
+            self.connections.append(self.listener.accept())
+            setNoDelay(self.connections[-1])
+            logging.info("Shard %d connected from %s" % (len(self.connections) - 1, self.listener.last_accepted))
+    # end acceptShards()
+
+    def setup(self, inputFile, configFile, options, nrRobots = None):
+        """Split the robots of the swarm into contiguous shards of (almost) equal size and wait for all shards to build their
+        Pcolonies. The input files must be available at the same paths on all the hosts of the shards
+
+        :inputFile: path of the Pswarm input file
+        :configFile: path of the config file
+        :options: dictionary of shard options (see main())
+        :nrRobots: scale the swarm to this number of robots using scaleConfig() (None = use the number from the config file)"""
+        # only the number of robots is needed, the Pcolonies are built by the shards
+        config = lulu_kilobot.readConfigFile(configFile)
+        if (nrRobots is not None):
+            config = lulu_kilobot.scaleConfig(config, nrRobots)
+        nrShards = len(self.connections)
+        if (config.nrRobots < nrShards):
+            raise ValueError("The swarm has %d robots, it cannot be split into %d shards" % (config.nrRobots, nrShards))
+        bounds = [config.nrRobots * shardNr // nrShards for shardNr in range(nrShards + 1)]
+        self.shardUids = [list(range(bounds[shardNr], bounds[shardNr + 1])) for shardNr in range(nrShards)]
+
+        for shardNr, conn in enumerate(self.connections):
+            conn.send({"shardNr": shardNr, "uids": self.shardUids[shardNr], "inputFile": inputFile, "configFile": configFile,
+                "nrRobots": nrRobots, "options": options})
+        for conn in self.connections:
+            globalEnv, startupTime = conn.recv()
+            self.startupTime.append(startupTime)
+        # all the shards read the same initial global environment
+        self.globalEnv = globalEnv
+        self.shardSteps = [0] * nrShards
+        self.busyTime = [0.0] * nrShards
+        logging.info("ShardCoordinator split %d robots into %d shards" % (config.nrRobots, nrShards))
+    # end setup()
+
+    def receiveStep(self, shardNr, retry = True):
+        """Receive the result of a step from a shard and merge its global_env changes. Conflicting changes are rejected and
+        the shard is asked to execute its step again on the merged global_env
+
+        :retry: False = conflicting changes raise a RuntimeError
+        :returns: the sim.SimStepResult of the shard step or None if the shard executes its step again"""
+        conn = self.connections[shardNr]
+        command, sim_result, delta, duration = conn.recv()
+        if (not mergeEnvDelta(self.globalEnv, delta)):
+            if (not retry):
+                raise RuntimeError("Shard %d consumed global_env objects that are not present: %s" % (shardNr, delta))
+            # the shard consumed objects that were consumed by the shards merged before it
+            logging.debug("Shard %d: conflicting global_env changes %s, executing the step again" % (shardNr, delta))
+            self.nrConflicts += 1
+            conn.send(("retry", +self.globalEnv))
+            return None
+        if (consumesObjects(delta)):
+            conn.send(("accept", None))
+        self.shardSteps[shardNr] += 1
+        self.busyTime[shardNr] += duration
+        return sim_result
+    # end receiveStep()
+
+    def runStepLock(self, maxSteps):
+        """Execute steps with all the shards in step-lock
+
+        :returns: the combined sim.SimStepResult of the last step"""
+        sim_result = sim.SimStepResult.finished
+        while (maxSteps == 0 or self.nrSteps < maxSteps):
+            # every shard starts from the same global environment
+            for conn in self.connections:
+                conn.send(("step", self.globalEnv))
+            # the changes are merged in shard order, so the result does not depend on the order in which the shards finish
+            results = []
+            for shardNr in range(len(self.connections)):
+                sim_result = self.receiveStep(shardNr)
+                if (sim_result is None):
+                    # the step executed again starts from the changes of the previous shards, so it cannot conflict again
+                    sim_result = self.receiveStep(shardNr, retry = False)
+                results.append(sim_result)
+            if (self.nrSteps == 0 and self.launchTime is not None):
+                self.firstStepTime = perf_counter() - self.launchTime
+            # drop objects whose multiplicity reached 0
+            self.globalEnv = +self.globalEnv
+            self.nrSteps += 1
+            sim_result = combineSimResults(results)
+            # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+            if (sim_result != sim.SimStepResult.finished):
+                logging.warning("Exiting loop")
+                break
+        return sim_result
+    # end runStepLock()
+
+    def runLoose(self, maxSteps):
+        """Execute steps with the shards loosely synchronized (at most self.maxLag steps ahead of the slowest shard)
+
+        :returns: the combined sim.SimStepResult of the last step of each shard"""
+        nrShards = len(self.connections)
+        shardNrs = {conn: shardNr for shardNr, conn in enumerate(self.connections)}
+        lastResults = [None] * nrShards
+        running = set() # shards that execute a step
+        waiting = set() # shards that wait until they can start their next step
+        finished = set() # shards that executed maxSteps steps
+        sim_result = sim.SimStepResult.finished
+        stop = False
+
+        for conn in self.connections:
+            conn.send(("step", self.globalEnv))
+        running.update(range(nrShards))
+        while (running):
+            for conn in wait([self.connections[shardNr] for shardNr in running]):
+                shardNr = shardNrs[conn]
+                result = self.receiveStep(shardNr)
+                if (result is None):
+                    # the shard executes its step again
+                    continue
+                running.discard(shardNr)
+                lastResults[shardNr] = result
+                if (maxSteps > 0 and self.shardSteps[shardNr] >= maxSteps):
+                    finished.add(shardNr)
+                else:
+                    waiting.add(shardNr)
+            self.globalEnv = +self.globalEnv
+            if (self.firstStepTime is None and self.launchTime is not None and min(self.shardSteps) > 0):
+                self.firstStepTime = perf_counter() - self.launchTime
+
+            if (None not in lastResults):
+                sim_result = combineSimResults(lastResults)
+                # if the simmulation result is other than step finished (i.e. no_more_exec or error)
+                if (sim_result != sim.SimStepResult.finished and not stop):
+                    logging.warning("Exiting loop")
+                    stop = True
+            if (stop):
+                # only wait for the steps that are still running
+                continue
+
+            slowest = min([self.shardSteps[shardNr] for shardNr in range(nrShards) if shardNr not in finished] or [0])
+            for shardNr in sorted(waiting):
+                if (self.shardSteps[shardNr] - slowest < self.maxLag):
+                    waiting.discard(shardNr)
+                    self.connections[shardNr].send(("step", self.globalEnv))
+                    running.add(shardNr)
+        self.nrSteps = max(self.shardSteps)
+        return sim_result
+    # end runLoose()
+
+    def run(self, maxSteps = 0):
+        """Execute the control steps of the swarm
+
+        :maxSteps: stop after this number of steps (0 = run until the Pswarm stops)
+        :returns: the combined sim.SimStepResult of the last step"""
+        start = perf_counter()
+        if (self.maxLag > 0):
+            sim_result = self.runLoose(maxSteps)
+        else:
+            sim_result = self.runStepLock(maxSteps)
+        self.duration = perf_counter() - start
+        return sim_result
+    # end run()
+
+    def close(self):
+        """Stop the shards, collect their statistics and stop listening"""
+        for conn in self.connections:
+            conn.send(("stop", None))
+        for conn in self.connections:
+            self.shardStats.append(conn.recv())
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.listener.close()
+        if (self.nrConflicts > 0):
+            logging.info("ShardCoordinator: %d shard steps were executed again because of conflicting global_env changes" % self.nrConflicts)
+    # end close()
+
+    def summary(self):
+        """Return the throughput of the last run()
+
+        :returns: dictionary {"nrShards", "nrRobots", "nrSteps", "duration", "robotStepsPerSecond", "utilization"}"""
+        robotSteps = sum(steps * len(uids) for steps, uids in zip(self.shardSteps, self.shardUids))
+        return {
+                "nrShards": len(self.connections),
+                "nrRobots": sum(len(uids) for uids in self.shardUids),
+                "nrSteps": self.nrSteps,
+                "duration": self.duration,
+                "robotStepsPerSecond": robotSteps / self.duration if self.duration > 0 else 0.0,
+                # fraction of the run time spent by the shards executing steps (the rest is spent waiting)
+                "utilization": sum(self.busyTime) / (len(self.connections) * self.duration) if self.duration > 0 else 0.0,
+                }
+    # end summary()
+
+    def printStats(self):
+        """Print the throughput of the swarm and the load of each shard"""
+        summary = self.summary()
+        print("\nShardCoordinator: %d shards (%s), %d robots, %d steps in %.3f s, %.1f robot steps / s, shard utilization %.1f%%" % (
+            summary["nrShards"], "max lag %d" % self.maxLag if self.maxLag > 0 else "step-lock", summary["nrRobots"],
+            summary["nrSteps"], summary["duration"], summary["robotStepsPerSecond"], 100.0 * summary["utilization"]))
+        if (self.firstStepTime is not None):
+            print("Launch to first step: %.3f s" % self.firstStepTime)
+        for shardNr, uids in enumerate(self.shardUids):
+            stats = self.shardStats[shardNr] if shardNr < len(self.shardStats) else {}
+            print("shard %d: %d robots, %d steps, startup %.3f s, busy %.3f s, waiting %.3f s%s" % (shardNr, len(uids),
+                self.shardSteps[shardNr], self.startupTime[shardNr], self.busyTime[shardNr], stats.get("waitTime", 0.0),
+                ", %d collisions" % stats["nrCollisions"] if stats.get("nrCollisions") is not None else ""))
+    # end printStats()
+# end class ShardCoordinator
+
+##########################################################################
+#   MAIN
+if (__name__ == "__main__"):
+    # usage: swarm_shards.py host:port --shard-authkey=KEY [--debug]
+    # serve one shard of a swarm started with lulu_kilobot.py --remote-shards=N --listen=host:port --shard-authkey=KEY
+    logging.basicConfig(stream = sys.stdout, level = logging.DEBUG if '--debug' in sys.argv else logging.INFO)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    authkey = lulu_kilobot.getOptionValue("shard-authkey", None)
+    if (len(args) < 1 or authkey is None):
+        logging.error("Expected the coordinator address (host:port) and --shard-authkey=KEY")
+        exit(1)
+    runShard(parseAddress(args[0]), authkey.encode())
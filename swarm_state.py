@@ -0,0 +1,98 @@
+from array import array
+from collections.abc import MutableMapping
+from operator import attrgetter
+from vrep_bridge import vrep_bridge # for Motion
+from neighbour_index import NeighbourIndex
+
+def motionCodes():
+    """Return the list of motions, indexed by their numeric code"""
+    return [vrep_bridge.Motion.stop, vrep_bridge.Motion.forward, vrep_bridge.Motion.left, vrep_bridge.Motion.right]
+# end motionCodes()
+
+class SwarmState():
+
+    """Structure of arrays that stores the state of all the robots of a swarm, indexed by robot index (robot uid).
+    Numeric values (light intensities, neighbour index, motion and led codes) are stored in preallocated typed arrays and
+    object references in preallocated lists, so a robot costs a few array slots instead of several dictionaries and lists.
+    Kilobot objects are views over one index of a SwarmState.
+    Limitation: the variable size data is still stored per robot. raw_input_state holds the dictionaries returned by the
+    bridge, known_robots one list per robot and the distance history one NeighbourIndex per robot (its dictionaries and
+    heap use more memory than the two distance dictionaries of the original Kilobot, see benchmarks/bench_swarm_state.py).
+    The array layout of the distance history is SwarmSensorArrays, used with --vectorized."""
+
+    def __init__(self, nrRobots, neighbourCapacity = 0, neighbourMaxAge = 0):
+        """
+        :nrRobots: the number of robots of the swarm
+        :neighbourCapacity: maximum number of neighbours in the distance history of a robot (0 = unbounded)
+        :neighbourMaxAge: number of steps after which a neighbour that was not measured again is forgotten (0 = never)"""
+        self.nrRobots = nrRobots
+        self.colony = [None] * nrRobots # references to the Pcolony used to control each robot
+        self.raw_input_state = [{} for i in range(nrRobots)] # dictionaries of raw sensor values
+        self.motion = bytearray(nrRobots) # motion codes (index in motions[])
+        self.led_rgb = bytearray(3 * nrRobots) # [r, g, b] values of all robots (values between 0-2)
+        self.neighbours = [NeighbourIndex(capacity = neighbourCapacity, maxAge = neighbourMaxAge) for i in range(nrRobots)] # indexes of the most recent and previous distances
+        self.sensorView = [None] * nrRobots # SensorView objects (None if the readings are processed per robot)
+        self.light = array('d', [-1.0]) * nrRobots # current light intensities
+        self.light_prev = array('d', [-1.0]) * nrRobots # previous light intensities
+        self.known_robots = [[] for i in range(nrRobots)] # lists of known (friend) robot IDs
+        self.neighbour_index = array('q', [0]) * nrRobots # current positions on neighbour_ids[]
+        self.lazyWildcards = [None] * nrRobots # LazyWildcards objects (None if not used)
+        # direct references to the input / output module agents of the Pcolonies (None if the agent is not defined)
+        self.lightSensorAgent = [None] * nrRobots # light_sensor agents
+        self.msgDistanceAgent = [None] * nrRobots # msg_distance agents
+        self.motionAgent = [None] * nrRobots # motion agents
+        self.ledAgent = [None] * nrRobots # led_rgb agents
+
+        self.motions = motionCodes() # list of motions, indexed by motion code
+        self.motionCode = {motion: code for code, motion in enumerate(self.motions)} # dictionary {motion: motion code}
+    # end __init__()
+# end class SwarmState
+
+def stateAttribute(name, doc):
+    """Return a property that maps a Kilobot attribute to the element of the SwarmState array with the same name
+
+    :name: name of the attribute and of the SwarmState array
+    :doc: documentation of the attribute"""
+    getArray = attrgetter(name)
+
+    def getValue(robot):
+        return getArray(robot.state)[robot.index]
+
+    def setValue(robot, value):
+        getArray(robot.state)[robot.index] = value
+
+    return property(getValue, setValue, doc = doc)
+# end stateAttribute()
+
+class OutputStateView(MutableMapping):
+
+    """Dictionary interface ({"motion": motion, "led_rgb": [r, g, b]}) over the output state stored in a SwarmState"""
+
+    __slots__ = ("robot",)
+    keyNames = ("motion", "led_rgb")
+
+    def __init__(self, robot):
+        self.robot = robot
+
+    def __getitem__(self, key):
+        if (key not in self.keyNames):
+            raise KeyError(key)
+        return getattr(self.robot, key)
+
+    def __setitem__(self, key, value):
+        if (key not in self.keyNames):
+            raise KeyError(key)
+        setattr(self.robot, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("The output state keys cannot be deleted")
+
+    def __iter__(self):
+        return iter(self.keyNames)
+
+    def __len__(self):
+        return len(self.keyNames)
+
+    def __repr__(self):
+        return repr(dict(self))
+# end class OutputStateView
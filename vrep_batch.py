@@ -0,0 +1,122 @@
+import logging
+from swarm_state import motionCodes
+
+# batched I/O protocol that has to be served by the customization script of a scene object (BatchedVrepBridge.scriptObject),
+# called with simxCallScriptFunction():
+#   getStates(ints = [uid, ...])
+#       -> ints = for each uid [light, nr of distances, neighbour uid, ...], floats = the distances (in the same order)
+#   setStates(ints = for each robot [uid, motion code (index in motionCodes()), r, g, b])
+#   getAllKnownRobotIds(ints = [uid, ...]) -> ints = for each uid [nr of known robot IDs, robot ID, ...]
+# every call is a single remote API round trip for the whole swarm.
+# The Kilobot scene used by vrep_bridge does not provide such a script and none is shipped with this package, so the
+# batched calls are used only if the scene object is given explicitly (--scene-batch=OBJECT). Without it, every step still
+# costs one getState() and one setState() round trip per robot.
+GET_STATES, SET_STATES, GET_ALL_KNOWN_ROBOT_IDS = "getStates", "setStates", "getAllKnownRobotIds"
+
+class BatchedVrepBridge():
+
+    """Adapter that gives a vrep_bridge.VrepBridge the batched getStates() / setStates() calls used by SwarmIO and the
+    getAllKnownRobotIds() call used while waiting for the neighbour IDs broadcast.
+    The sensor readings of all the robots are requested with one simxCallScriptFunction() call and all the motion / led commands
+    are sent with another one, instead of one blocking remote API round trip per robot and call. This requires a scene object
+    whose customization script implements the protocol described at the top of this module (not provided by the Kilobot
+    scene). Without a scriptObject, the batched calls are served by the per robot calls of the bridge.
+    All the other calls (spawnRobots, removeRobots, getKnownRobotIds, getState, setState) are forwarded to the bridge."""
+
+    def __init__(self, bridge, scriptObject = None, clientID = None):
+        """
+        :bridge: the vrep_bridge.VrepBridge connected to the scene
+        :scriptObject: name of the scene object whose customization script serves the batched calls (None = use the per robot
+            calls of the bridge)
+        :clientID: remote API client id of the connection (None = the clientID of the bridge)
+        :raises IOError: if the scriptObject does not serve the batched calls"""
+        self.bridge = bridge
+        self.scriptObject = scriptObject
+        self.clientID = getattr(bridge, "clientID", None) if clientID is None else clientID
+        self.motionCode = {motion: code for code, motion in enumerate(motionCodes())}
+        self.vrep = None # the V-REP remote API module (None = the batched calls are not used)
+        if (scriptObject is not None):
+            from vrep_bridge import vrep
+            self.vrep = vrep
+            # the scene is probed with an empty request
+            if (self.clientID is None or self.callScript(GET_STATES, []) is None):
+                raise IOError("The scene object %s does not serve the batched %s function" % (scriptObject, GET_STATES))
+            logging.info("Using the batched %s / %s / %s functions of %s" % (GET_STATES, SET_STATES, GET_ALL_KNOWN_ROBOT_IDS,
+                scriptObject))
+        self.remoteBatch = self.vrep is not None # True if the batched calls are served by the scene
+    # end __init__()
+
+    def __getattr__(self, name):
+        # the calls that are not batched are forwarded to the bridge
+        if (name == "bridge"):
+            raise AttributeError(name)
+        return getattr(self.bridge, name)
+
+    def callScript(self, function, ints, floats = ()):
+        """Call a function of the customization script of scriptObject (one blocking round trip)
+
+        :returns: (output ints, output floats) or None if the call failed"""
+        vrep = self.vrep
+        returnCode, outInts, outFloats, outStrings, outBuffer = vrep.simxCallScriptFunction(self.clientID, self.scriptObject,
+                vrep.sim_scripttype_customizationscript, function, list(ints), list(floats), [], bytearray(), vrep.simx_opmode_blocking)
+        if (returnCode != vrep.simx_return_ok):
+            return None
+        return outInts, outFloats
+    # end callScript()
+
+    def getStates(self, uids):
+        """Batched variant of getState()
+
+        :returns: dictionary {robot_uid: raw_input_state}"""
+        if (not self.remoteBatch):
+            return {uid: self.bridge.getState(uid) for uid in uids}
+        result = self.callScript(GET_STATES, uids)
+        if (result is None):
+            raise IOError("The batched %s call failed" % GET_STATES)
+        ints, floats = result
+        states = {}
+        position = 0 # position in ints
+        distancePosition = 0 # position in floats
+        for uid in uids:
+            light, nrDistances = ints[position], ints[position + 1]
+            neighbours = ints[position + 2:position + 2 + nrDistances]
+            states[uid] = {"distances": dict(zip(neighbours, floats[distancePosition:distancePosition + nrDistances])), "light": light}
+            position += 2 + nrDistances
+            distancePosition += nrDistances
+        return states
+    # end getStates()
+
+    def getAllKnownRobotIds(self, uids):
+        """Batched variant of getKnownRobotIds()
+
+        :returns: dictionary {robot_uid: list of robot IDs}"""
+        if (not self.remoteBatch):
+            return {uid: self.bridge.getKnownRobotIds(uid) for uid in uids}
+        result = self.callScript(GET_ALL_KNOWN_ROBOT_IDS, uids)
+        if (result is None):
+            raise IOError("The batched %s call failed" % GET_ALL_KNOWN_ROBOT_IDS)
+        ints = result[0]
+        knownIds = {}
+        position = 0 # position in ints
+        for uid in uids:
+            nrKnown = ints[position]
+            knownIds[uid] = list(ints[position + 1:position + 1 + nrKnown])
+            position += 1 + nrKnown
+        return knownIds
+    # end getAllKnownRobotIds()
+
+    def setStates(self, outputs):
+        """Batched variant of setState()
+
+        :outputs: dictionary {robot_uid: (motion, led_rgb)}"""
+        if (not self.remoteBatch):
+            for uid, (motion, led_rgb) in outputs.items():
+                self.bridge.setState(uid, motion, led_rgb)
+            return
+        ints = []
+        for uid, (motion, led_rgb) in outputs.items():
+            ints.extend((uid, self.motionCode[motion], led_rgb[0], led_rgb[1], led_rgb[2]))
+        if (self.callScript(SET_STATES, ints) is None):
+            raise IOError("The batched %s call failed" % SET_STATES)
+    # end setStates()
+# end class BatchedVrepBridge